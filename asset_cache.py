@@ -0,0 +1,174 @@
+import os
+import json
+import hashlib
+
+# Manifest file kept next to the generated assets
+MANIFEST_NAME = '.asset_cache.json'
+MANIFEST_VERSION = 1
+
+def file_digest(path, chunk_size=1 << 20):
+    """
+    Return the SHA-256 hex digest of a file's content.
+    """
+    h = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(chunk_size), b''):
+            h.update(chunk)
+    return h.hexdigest()
+
+def bytes_digest(data):
+    """
+    Return the SHA-256 hex digest of an in-memory buffer.
+    """
+    return hashlib.sha256(data).hexdigest()
+
+def file_signature(path, digest=None):
+    """
+    Describe a file by size, mtime and content hash.
+    """
+    st = os.stat(path)
+    return {
+        'size': st.st_size,
+        'mtime_ns': st.st_mtime_ns,
+        'sha256': digest or file_digest(path),
+    }
+
+def atomic_write_bytes(path, data):
+    """
+    Write data to path through a temp file and os.replace.
+    """
+    tmp_path = f"{path}.tmp{os.getpid()}"
+    try:
+        with open(tmp_path, 'wb') as f:
+            f.write(data)
+        os.replace(tmp_path, path)
+    finally:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+
+class AssetManifest:
+    """
+    Persistent record of source hashes, build parameters and output hashes.
+
+    Entries are keyed by a caller-chosen name (usually the source path
+    relative to the manifest). An entry is fresh when the parameters are
+    identical, the source content is unchanged and every recorded output
+    is still on disk with the recorded size.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.base_dir = os.path.dirname(os.path.abspath(path))
+        self.entries = {}
+        self.dirty = False
+        if os.path.exists(path):
+            try:
+                with open(path, 'r', encoding='utf-8') as f:
+                    data = json.load(f)
+                if data.get('version') == MANIFEST_VERSION:
+                    self.entries = data.get('entries', {})
+            except (OSError, ValueError) as e:
+                print(f"Ignoring unreadable cache {path}: {e}")
+
+    @classmethod
+    def for_directory(cls, directory):
+        return cls(os.path.join(directory, MANIFEST_NAME))
+
+    def key_for(self, path):
+        """
+        Default entry key: the path relative to the manifest directory.
+        """
+        return self._rel(path)
+
+    def _rel(self, path):
+        return os.path.relpath(os.path.abspath(path), self.base_dir).replace(os.sep, '/')
+
+    def _abs(self, rel):
+        return os.path.join(self.base_dir, *rel.split('/'))
+
+    def is_fresh(self, key, source_path, params):
+        """
+        Check whether the entry for key can be reused without rebuilding.
+        Only hashes the source when its size or mtime moved.
+        """
+        entry = self.entries.get(key)
+        if entry is None or entry.get('params') != _jsonable(params):
+            return False
+        try:
+            st = os.stat(source_path)
+        except OSError:
+            return False
+        source = entry['source']
+        if st.st_size != source['size']:
+            return False
+        if st.st_mtime_ns != source['mtime_ns']:
+            # Touched but maybe not edited: compare content before rebuilding
+            if file_digest(source_path) != source['sha256']:
+                return False
+            source['mtime_ns'] = st.st_mtime_ns
+            self.dirty = True
+        for rel, output in entry['outputs'].items():
+            try:
+                if os.path.getsize(self._abs(rel)) != output['size']:
+                    return False
+            except OSError:
+                return False
+        return True
+
+    def record(self, key, source_path, params, outputs, source_digest=None, data=None):
+        """
+        Store a successful build. outputs maps output path -> sha256 (or None to hash it);
+        data is any extra JSON-serializable result to keep with the entry.
+        """
+        entry = self.entries[key] = {
+            'source': file_signature(source_path, source_digest),
+            'params': _jsonable(params),
+            'outputs': {
+                self._rel(out_path): {
+                    'size': os.path.getsize(out_path),
+                    'sha256': digest or file_digest(out_path),
+                }
+                for out_path, digest in outputs.items()
+            },
+        }
+        if data is not None:
+            entry['data'] = data
+        self.dirty = True
+
+    def get(self, key):
+        return self.entries.get(key)
+
+    def output_paths(self):
+        """
+        Absolute paths of every output recorded in the manifest.
+        """
+        return {self._abs(rel) for entry in self.entries.values() for rel in entry['outputs']}
+
+    def forget(self, key):
+        if self.entries.pop(key, None) is not None:
+            self.dirty = True
+
+    def prune(self, keep_keys):
+        """
+        Drop entries whose source no longer exists.
+        Returns the absolute output paths those entries had recorded.
+        """
+        stale_outputs = []
+        for key in list(self.entries):
+            if key not in keep_keys:
+                stale_outputs.extend(self._abs(rel) for rel in self.entries[key]['outputs'])
+                self.forget(key)
+        return stale_outputs
+
+    def save(self):
+        if not self.dirty:
+            return
+        os.makedirs(self.base_dir, exist_ok=True)
+        data = json.dumps({'version': MANIFEST_VERSION, 'entries': self.entries},
+                          ensure_ascii=False, indent=1, sort_keys=True)
+        atomic_write_bytes(self.path, data.encode('utf-8'))
+        self.dirty = False
+
+def _jsonable(value):
+    # Tuples become lists after a JSON round-trip; normalize before comparing
+    return json.loads(json.dumps(value))
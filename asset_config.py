@@ -0,0 +1,245 @@
+import os
+import json
+
+# Repository root; every relative path below is resolved against it
+ROOT_DIR = os.path.dirname(os.path.abspath(__file__))
+
+# Static files served by the game (Vite public dir)
+PUBLIC_DIR = os.path.join(ROOT_DIR, 'game', 'public')
+
+# Normalization profiles, merged over normalize_images.DEFAULT_PARAMS.
+#   target_size - box the image is fitted into (never upscaled past it)
+#   background  - RGB colour transparency is flattened onto; None keeps
+#                 alpha and writes RGBA with transparent padding
+#   resample    - PIL.Image.Resampling name used for the final resize
+#   trim        - crop transparent (or uniform, corner-coloured) margins
+#                 first; the value is the per-channel tolerance
+#   pad         - centre on a target_size canvas (False = tight fit)
+# Avatars are shown as circles of at most 160 px (320 px at 2x); faces fill
+# the ~320 px character preview. Both keep their framing, while items are
+# trimmed so the object fills its box.
+NORMALIZE_PROFILES = {
+    'default': {},
+    'avatars': {'target_size': [320, 320]},
+    'faces': {'background': None},
+    'clothes': {'background': None, 'trim': 8},
+    'gifts': {'target_size': [256, 256], 'background': None, 'trim': 8},
+    'teamicons': {'background': None, 'trim': 8, 'pad': False},
+}
+
+# Source directories for the asset pipeline.
+#   source  - where new originals are dropped
+#   output  - where the normalized PNG is written (same dir = replace originals)
+#   suffix  - appended to the output file stem (gifts keep "_normalized",
+#             the game references /gifts/*_normalized.png)
+#   profile - NORMALIZE_PROFILES entry to use (default: 'default')
+PIPELINE_DIRECTORIES = [
+    {'source': 'clothes/accessory', 'output': 'clothes/accessory', 'profile': 'clothes'},
+    {'source': 'clothes/bot', 'output': 'clothes/bot', 'profile': 'clothes'},
+    {'source': 'clothes/shoe', 'output': 'clothes/shoe', 'profile': 'clothes'},
+    {'source': 'clothes/top', 'output': 'clothes/top', 'profile': 'clothes'},
+    {'source': 'clothes/base', 'output': 'clothes/base', 'profile': 'clothes'},
+    {'source': 'avatars/nptnorm', 'output': 'avatars/normalized', 'profile': 'avatars'},
+    {'source': 'faces/notnorm', 'output': 'faces/normalized', 'profile': 'faces'},
+    {'source': 'gifts', 'output': 'gifts', 'suffix': '_normalized', 'profile': 'gifts'},
+]
+
+def resolve(path):
+    """
+    Resolve a config path relative to the repository root.
+    """
+    if os.path.isabs(path):
+        return os.path.normpath(path)
+    return os.path.normpath(os.path.join(ROOT_DIR, *path.replace('\\', '/').split('/')))
+
+def load_directories(config_path=None):
+    """
+    Return the pipeline directory entries with absolute paths.
+    A JSON file with the same list shape can replace the defaults.
+    """
+    entries = PIPELINE_DIRECTORIES
+    if config_path:
+        with open(config_path, 'r', encoding='utf-8') as f:
+            entries = json.load(f)
+    directories = []
+    for entry in entries:
+        entry = dict(entry)
+        entry['source'] = resolve(entry['source'])
+        entry['output'] = resolve(entry.get('output', entry['source']))
+        entry.setdefault('suffix', '')
+        entry.setdefault('profile', 'default')
+        if entry['profile'] not in NORMALIZE_PROFILES:
+            raise ValueError(f"Unknown normalization profile {entry['profile']!r} for {entry['source']}")
+        directories.append(entry)
+    return directories
+
+# Responsive variants: directories under PUBLIC_DIR, width ladder and formats.
+# AVIF is only produced when the installed Pillow can encode it.
+VARIANT_DIRECTORIES = [
+    'avatars',
+    'avatars/normalized',
+    'faces',
+    'clothes/accessory',
+    'clothes/bot',
+    'clothes/shoe',
+    'clothes/top',
+    'gifts',
+    'shop',
+    'teamicons',
+]
+VARIANT_WIDTHS = [64, 128, 256, 512]
+VARIANT_FORMATS = ['webp', 'avif']
+VARIANT_MANIFEST = os.path.join(PUBLIC_DIR, 'asset-variants.json')
+VARIANT_CACHE = os.path.join(ROOT_DIR, 'game', '.asset_cache.variants.json')
+
+# Sprite atlases: one set per category, packed from PUBLIC_DIR sources.
+#   sprite_box - downscale members to fit this box first (None = keep size)
+ATLAS_DIR = os.path.join(PUBLIC_DIR, 'atlases')
+ATLAS_CATEGORIES = [
+    {'name': 'teamicons', 'source': 'teamicons', 'sprite_box': None},
+    {'name': 'clothes-top', 'source': 'clothes/top', 'sprite_box': 256},
+    {'name': 'clothes-bot', 'source': 'clothes/bot', 'sprite_box': 256},
+    {'name': 'clothes-shoe', 'source': 'clothes/shoe', 'sprite_box': 256},
+    {'name': 'clothes-accessory', 'source': 'clothes/accessory', 'sprite_box': 256},
+]
+ATLAS_MAX_SIZE = 2048
+ATLAS_PADDING = 2
+
+# Trees scanned by the perceptual-hash duplicate finder
+DEDUP_ROOTS = [
+    'avatars',
+    'faces',
+    'clothes',
+    'gifts',
+    'game/public/avatars',
+    'game/public/faces',
+    'game/public/clothes',
+    'game/public/gifts',
+    'game/public/teamicons',
+]
+# Untouched masters (e.g. the team icon masters): reported if scanned, but
+# never hardlinked to or from another copy
+DEDUP_MASTERS = ['teamicons']
+DEDUP_INDEX = os.path.join(ROOT_DIR, '.asset_cache.phash.json')
+
+# Team icons: untouched masters -> derived sizes served by the game.
+# The first size keeps the plain file name, others get an @<size> suffix.
+ICON_MASTERS_DIR = os.path.join(ROOT_DIR, 'teamicons')
+ICON_OUTPUT_DIR = os.path.join(PUBLIC_DIR, 'teamicons')
+ICON_SIZES = [256]
+ICON_CACHE = os.path.join(ROOT_DIR, 'game', '.asset_cache.teamicons.json')
+
+# Source tree -> game/public destination, used by sync_assets.py
+SYNC_MAPPINGS = [
+    ('faces/normalized', 'faces'),
+    ('faces/normalized', 'faces/normalized'),
+    ('avatars/normalized', 'avatars/normalized'),
+    ('avatars/normalized', 'avatars'),
+    ('clothes', 'clothes'),
+    ('gifts', 'gifts'),
+    ('ost', 'ost'),
+]
+# Where asset references are looked for
+REFERENCE_ROOTS = ['game/src', 'game/index.html']
+
+# Short sound effects packed into one audio sprite by build_sfx_sprite.py
+SFX_DIR = os.path.join(PUBLIC_DIR, 'sounds')
+SFX_SPRITE = os.path.join(SFX_DIR, 'sfx-sprite.wav')
+SFX_MANIFEST = os.path.join(SFX_DIR, 'sfx-sprite.json')
+SFX_SAMPLE_RATE = 22050
+SFX_CHANNELS = 1
+SFX_GAP_MS = 100
+SFX_CACHE = os.path.join(ROOT_DIR, 'game', '.asset_cache.sfx.json')
+
+# Files removed by delete_old_images_v2.py are moved here, one folder per batch
+CLEANUP_TRASH = os.path.join(ROOT_DIR, '.asset_trash')
+
+# watch_assets.py: quiet time before a burst of file events is processed, and
+# the scan interval when inotify is unavailable (seconds)
+WATCH_DEBOUNCE = 0.3
+WATCH_POLL_INTERVAL = 1.0
+
+# Outfit cards (render_character.py): the "faces" are full-body chibi figures,
+# so a card shows the figure on the left and each garment in its own box on
+# the right, with accessories in a row underneath. Boxes are
+# (left, top, width, height) fractions of the canvas.
+COMPOSITE_CATALOG = os.path.join(ROOT_DIR, 'game', 'src', 'data', 'clothes.ts')
+COMPOSITE_FACES_DIR = os.path.join(PUBLIC_DIR, 'faces')
+COMPOSITE_LAYOUT = {
+    'figure': [(0.00, 0.02, 0.64, 0.64)],
+    'top': [(0.66, 0.02, 0.32, 0.21)],
+    'bottom': [(0.66, 0.24, 0.32, 0.21)],
+    'shoes': [(0.66, 0.46, 0.32, 0.20)],
+    'accessory': [(0.01 + 0.198 * i, 0.72, 0.18, 0.18) for i in range(5)],
+}
+COMPOSITE_CACHE_DIR = os.path.join(ROOT_DIR, 'game', '.composite_cache')
+COMPOSITE_LRU_SIZE = 128
+
+# Content-hashed copies (fingerprint_assets.py): coffee.png -> coffee.<hash>.png
+# next to the original, plus the logical -> hashed map and a TS lookup module.
+FINGERPRINT_LENGTH = 8
+FINGERPRINT_MANIFEST = os.path.join(PUBLIC_DIR, 'asset-manifest.json')
+FINGERPRINT_MODULE = os.path.join(ROOT_DIR, 'game', 'src', 'utils', 'assetManifest.ts')
+FINGERPRINT_CACHE = os.path.join(ROOT_DIR, 'game', '.asset_cache.fingerprint.json')
+
+# Low-quality placeholders (build_placeholders.py): a BlurHash with
+# PLACEHOLDER_COMPONENTS along the longer side, computed from a
+# PLACEHOLDER_SAMPLE px downscale. PLACEHOLDER_THUMB > 0 also embeds a
+# base64 WebP thumbnail of that size.
+PLACEHOLDER_DIRECTORIES = VARIANT_DIRECTORIES
+PLACEHOLDER_COMPONENTS = 4
+PLACEHOLDER_SAMPLE = 32
+PLACEHOLDER_THUMB = 0
+PLACEHOLDER_MANIFEST = os.path.join(PUBLIC_DIR, 'asset-placeholders.json')
+PLACEHOLDER_MODULE = os.path.join(ROOT_DIR, 'game', 'src', 'utils', 'assetPlaceholders.ts')
+PLACEHOLDER_CACHE = os.path.join(ROOT_DIR, 'game', '.asset_cache.placeholders.json')
+
+# verify_assets.py: expected geometry per public path pattern ("*" stays
+# inside one directory). Each rule lists the allowed (size, mode) pairs;
+# size None accepts any dimensions. Unmatched files only need to be valid.
+# The first pair is what the current NORMALIZE_PROFILES produce; the rest
+# are outputs of the old one-size pipeline that are still valid to ship.
+VERIFY_RULES = [
+    ('clothes/*/*.png', [((512, 512), 'RGBA'), ((512, 512), 'RGB')]),
+    ('gifts/*.png', [((256, 256), 'RGBA'), ((512, 512), 'RGB')]),
+    ('avatars/*.png', [((320, 320), 'RGB'), ((512, 512), 'RGB'), ((256, 256), 'RGBA')]),
+    ('avatars/normalized/*.png', [((320, 320), 'RGB'), ((512, 512), 'RGB'), ((256, 256), 'RGBA')]),
+    ('faces/*.png', [((512, 512), 'RGBA'), ((512, 512), 'RGB'), ((256, 256), 'RGBA')]),
+    ('faces/normalized/*.png', [((512, 512), 'RGBA'), ((512, 512), 'RGB'), ((256, 256), 'RGBA')]),
+    ('teamicons/*.png', [(None, 'RGBA')]),
+    ('figma/*.png', [((1024, 1024), 'RGB')]),
+    ('shop/*.png', [((1024, 1024), 'RGB')]),
+]
+# Files that passed a full decode, so later runs can stop at the headers
+VERIFY_CACHE = os.path.join(ROOT_DIR, 'game', '.asset_cache.verify.json')
+
+# Resumable batch imports (batch_normalize.py): one folder per job with the
+# sharded source list and per-shard completion journals
+BATCH_JOBS_DIR = os.path.join(ROOT_DIR, '.batch_jobs')
+BATCH_SHARD_SIZE = 1000
+
+# Local asset server (serve_assets.py). Text assets get .gz siblings ahead of
+# time when they compress below SERVE_GZIP_RATIO of their size; files under
+# SERVE_GZIP_MIN_SIZE bytes are always sent as they are.
+SERVE_HOST = '127.0.0.1'
+SERVE_PORT = 8090
+SERVE_PRECOMPRESS = ('.svg', '.json', '.txt', '.js', '.css', '.html', '.xml')
+SERVE_GZIP_MIN_SIZE = 256
+SERVE_GZIP_RATIO = 0.9
+
+# Soundtrack index (build_soundtrack.py): per-track frame index with a seek
+# table every SOUNDTRACK_SEEK_INTERVAL seconds and frame-aligned segments the
+# player can fetch by Range. The first segment is short so music starts after
+# a few dozen KB. SOUNDTRACK_LOW_BITRATE (kbit/s) copies go to ost/_variants
+# when ffmpeg is on PATH.
+SOUNDTRACK_DIR = os.path.join(PUBLIC_DIR, 'ost')
+SOUNDTRACK_SEEK_INTERVAL = 1.0
+SOUNDTRACK_SEGMENT_SECONDS = 10.0
+SOUNDTRACK_FIRST_SEGMENT_SECONDS = 3.0
+SOUNDTRACK_LOW_BITRATE = 64
+# Volume levelling (measured with ffmpeg's EBU R128 filter) only attenuates,
+# and never by more than this so one quiet track cannot mute the rest
+SOUNDTRACK_MAX_CUT_DB = 6.0
+SOUNDTRACK_MANIFEST = os.path.join(PUBLIC_DIR, 'asset-soundtrack.json')
+SOUNDTRACK_MODULE = os.path.join(ROOT_DIR, 'game', 'src', 'utils', 'soundtrack.ts')
+SOUNDTRACK_CACHE = os.path.join(ROOT_DIR, 'game', '.asset_cache.soundtrack.json')
@@ -0,0 +1,241 @@
+import os
+import json
+import contextlib
+import cProfile
+import math
+import tempfile
+import time
+
+# Set by enable(); inherited by worker processes through the environment.
+# Holds the JSON-lines file every process appends its per-file records to.
+ENV_VAR = 'ASSET_METRICS_FILE'
+
+_path = os.environ.get(ENV_VAR)
+_current = None
+_out = None
+
+class _Null:
+    """
+    Shared do-nothing context manager: what stage() returns while disabled.
+    """
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+_NULL = _Null()
+
+class _Stage:
+    __slots__ = ('record', 'name', 'start')
+
+    def __init__(self, record, name):
+        self.record = record
+        self.name = name
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        stages = self.record['stages']
+        stages[self.name] = stages.get(self.name, 0.0) + time.perf_counter() - self.start
+        return False
+
+def enable(path=None):
+    """
+    Start collecting per-file records into the JSON-lines file path
+    (a temporary file when None). Must run before worker pools are created.
+    Returns the path.
+    """
+    global _path
+    if path is None:
+        fd, path = tempfile.mkstemp(prefix='asset_metrics_', suffix='.jsonl')
+        os.close(fd)
+    else:
+        open(path, 'w').close()
+    _path = os.environ[ENV_VAR] = os.path.abspath(path)
+    return _path
+
+def disable():
+    global _path, _out
+    _path = None
+    os.environ.pop(ENV_VAR, None)
+    if _out is not None:
+        _out.close()
+        _out = None
+
+def enabled():
+    return _path is not None
+
+def begin(tool, path):
+    """
+    Open the record for one file; stage() and count() add to it until end().
+    """
+    global _current
+    if _path is None:
+        return
+    _current = {'tool': tool, 'path': path, 'stages': {}, 'start': time.perf_counter()}
+
+def stage(name):
+    """
+    Time a block as one stage of the current file. Costs one global
+    lookup and returns a shared no-op context while metrics are off.
+    """
+    if _current is None:
+        return _NULL
+    return _Stage(_current, name)
+
+def count(**values):
+    """
+    Add byte/pixel counters (in_bytes=, out_bytes=, in_pixels=, ...) to the current file.
+    """
+    if _current is None:
+        return
+    for key, value in values.items():
+        _current[key] = _current.get(key, 0) + value
+
+def end(error=None):
+    """
+    Close the current record and append it as one JSON line.
+    """
+    global _current, _out
+    if _current is None:
+        return
+    record = _current
+    _current = None
+    record['total'] = time.perf_counter() - record.pop('start')
+    if error is not None:
+        record['error'] = error
+    if _out is None:
+        # Line-buffered append: each record reaches the file in one write
+        _out = open(_path, 'a', encoding='utf-8', buffering=1)
+    _out.write(json.dumps(record, ensure_ascii=False) + '\n')
+
+def load(path):
+    with open(path, 'r', encoding='utf-8') as f:
+        return [json.loads(line) for line in f if line.strip()]
+
+def _percentile(values, q):
+    return values[min(len(values) - 1, int(math.ceil(q * len(values))) - 1)]
+
+def histogram(seconds):
+    """
+    Count samples per power-of-two millisecond bucket: {'<1ms': n, '<2ms': n, ...}.
+    """
+    buckets = {}
+    for value in seconds:
+        bound = 1 << max(0, math.ceil(math.log2(max(value * 1000, 1e-9))))
+        buckets[bound] = buckets.get(bound, 0) + 1
+    return {f"<{bound}ms": buckets[bound] for bound in sorted(buckets)}
+
+def summarize(records):
+    """
+    Aggregate per-file records into per-tool, per-stage statistics.
+    """
+    tools = {}
+    for record in records:
+        tool = tools.setdefault(record['tool'], {'files': 0, 'errors': 0, 'stages': {}, 'counters': {}})
+        tool['files'] += 1
+        tool['errors'] += 'error' in record
+        for name, seconds in record['stages'].items():
+            tool['stages'].setdefault(name, []).append(seconds)
+        tool['stages'].setdefault('total', []).append(record['total'])
+        for key, value in record.items():
+            if key.endswith(('_bytes', '_pixels')):
+                tool['counters'][key] = tool['counters'].get(key, 0) + value
+
+    summary = {}
+    for name, tool in tools.items():
+        stages = {}
+        total = sum(tool['stages']['total'])
+        for stage_name, values in tool['stages'].items():
+            values.sort()
+            stages[stage_name] = {
+                'count': len(values),
+                'seconds': round(sum(values), 4),
+                'share': round(sum(values) / total, 3) if total else None,
+                'p50_ms': round(_percentile(values, 0.5) * 1000, 2),
+                'p90_ms': round(_percentile(values, 0.9) * 1000, 2),
+                'p99_ms': round(_percentile(values, 0.99) * 1000, 2),
+                'max_ms': round(values[-1] * 1000, 2),
+                'histogram': histogram(values),
+            }
+        summary[name] = {'files': tool['files'], 'errors': tool['errors'], 'stages': stages,
+                         'counters': tool['counters']}
+    return summary
+
+def print_summary(summary):
+    for name, tool in summary.items():
+        print(f"\n{name}: {tool['files']} files, {tool['errors']} errors")
+        print(f"  {'stage':<10} {'total s':>8} {'share':>6} {'p50 ms':>8} {'p90 ms':>8} {'p99 ms':>8} {'max ms':>8}")
+        for stage_name, s in sorted(tool['stages'].items(), key=lambda kv: -kv[1]['seconds']):
+            share = f"{s['share'] * 100:.0f}%" if s['share'] is not None else '-'
+            print(f"  {stage_name:<10} {s['seconds']:>8.3f} {share:>6} {s['p50_ms']:>8} "
+                  f"{s['p90_ms']:>8} {s['p99_ms']:>8} {s['max_ms']:>8}")
+        for key, value in sorted(tool['counters'].items()):
+            unit = f"{value / 1024 / 1024:.1f} MB" if key.endswith('_bytes') else f"{value / 1e6:.1f} Mpx"
+            print(f"  {key}: {unit}")
+
+@contextlib.contextmanager
+def profiled(path):
+    """
+    cProfile the block (this process only) and dump the stats to path when
+    given; a None path profiles nothing.
+    """
+    if path is None:
+        yield
+        return
+    profile = cProfile.Profile()
+    profile.enable()
+    try:
+        yield
+    finally:
+        profile.disable()
+        profile.dump_stats(path)
+        print(f"Profile written: {path} (view with: python -m pstats {path})")
+
+@contextlib.contextmanager
+def collecting(jsonl_path=None, summary_path=None, profile_path=None):
+    """
+    Enable metrics around a run, then print (and optionally save) the summary.
+    Records are kept in jsonl_path when given, else in a temporary file.
+    """
+    path = enable(jsonl_path)
+    try:
+        with profiled(profile_path):
+            yield
+    finally:
+        disable()
+        summary = summarize(load(path))
+        print_summary(summary)
+        if summary_path:
+            with open(summary_path, 'w', encoding='utf-8') as f:
+                json.dump(summary, f, ensure_ascii=False, indent=1)
+            print(f"Metrics summary written: {summary_path}")
+        if jsonl_path is None:
+            os.remove(path)
+
+def add_arguments(parser):
+    """
+    The --metrics/--metrics-log/--profile options shared by the asset scripts.
+    """
+    parser.add_argument('--metrics', action='store_true',
+                        help="time every stage per file and print histograms at the end")
+    parser.add_argument('--metrics-log', help="also keep the per-file records in this JSON-lines file")
+    parser.add_argument('--metrics-summary', help="write the aggregated metrics to this JSON file")
+    parser.add_argument('--profile', help="cProfile the run into this file (forces --jobs 1)")
+
+def from_args(args):
+    """
+    Context manager for a run configured by add_arguments(); a no-op when
+    no metrics option was given.
+    """
+    if getattr(args, 'profile', None) and getattr(args, 'jobs', 1) != 1:
+        # cProfile only sees the process it runs in
+        print("Profiling: running with --jobs 1")
+        args.jobs = 1
+    if not (args.metrics or args.metrics_log or args.metrics_summary or args.profile):
+        return contextlib.nullcontext()
+    return collecting(args.metrics_log, args.metrics_summary, args.profile)
@@ -0,0 +1,24 @@
+import re
+from asset_config import FINGERPRINT_LENGTH
+
+# Files whose text can mention public asset paths
+SOURCE_EXTENSIONS = ('.ts', '.tsx', '.js', '.jsx', '.css', '.html', '.json')
+
+# Top-level public folders an asset path can start with
+ASSET_ROOTS = ('avatars', 'faces', 'clothes', 'gifts', 'teamicons', 'sounds', 'ost', 'shop', 'figma')
+
+# A quoted string, or a template literal (whose ${...} may hold quotes), that starts with /<asset root>/
+_ROOTS = '|'.join(ASSET_ROOTS)
+ASSET_LITERAL = re.compile(r"""(['"])(/(?:%s)/[^'"`\n]*)\1|`(/(?:%s)/(?:[^`$\n]|\$\{[^}]*\})*)`""" % (_ROOTS, _ROOTS))
+
+# Content-hashed copies written by fingerprint_assets.py: name.<hex>.ext
+FINGERPRINTED = re.compile(r"\.([0-9a-f]{%d})(\.[^./]+)$" % FINGERPRINT_LENGTH)
+
+# Precompressed siblings written by serve_assets.py: name.svg -> name.svg.gz
+PRECOMPRESSED = '.gz'
+
+def logical_path(path):
+    """
+    Strip the content hash from a fingerprinted path; other paths are returned as is.
+    """
+    return FINGERPRINTED.sub(r"\2", path)
@@ -0,0 +1,197 @@
+import os
+import argparse
+import sys
+from asset_cache import AssetManifest
+from asset_config import load_directories
+from normalize_images import DEFAULT_PARAMS, SUPPORTED_FORMATS, _normalize, iter_results, profile_params
+
+# Legacy marker written by normalize_images.py before the rename scripts ran
+LEGACY_SUFFIX = '_normalized'
+
+def _logical_stem(name):
+    stem = os.path.splitext(name)[0]
+    if stem.endswith(LEGACY_SUFFIX):
+        return stem[:-len(LEGACY_SUFFIX)], True
+    return stem, False
+
+def plan_directory(entry, params=None):
+    """
+    Scan one configured directory once and decide what to do per image.
+
+    Returns a list of actions (kind, source, final, extra) where kind is
+    'normalize' (encode source into final), 'rename' (a legacy
+    *_normalized file that only needs its final name) or 'keep' (final
+    is already the only copy and gets re-checked in place). extra lists
+    leftover files to delete once final is written (in-place dirs only).
+    """
+    if params is None:
+        params = DEFAULT_PARAMS
+    source_dir = entry['source']
+    output_dir = entry['output']
+    suffix = entry['suffix']
+    in_place = os.path.normcase(source_dir) == os.path.normcase(output_dir)
+
+    groups = {}
+    with os.scandir(source_dir) as it:
+        for dirent in it:
+            if not dirent.is_file() or not dirent.name.lower().endswith(SUPPORTED_FORMATS):
+                continue
+            stem = os.path.splitext(dirent.name)[0]
+            if suffix and stem.endswith(suffix):
+                # Already carries the configured suffix: this is a final output
+                stem, legacy = stem[:-len(suffix)], False
+            else:
+                stem, legacy = _logical_stem(dirent.name)
+            group = groups.setdefault(stem, {'originals': [], 'legacy': []})
+            group['legacy' if legacy else 'originals'].append(dirent)
+
+    actions = []
+    for stem in sorted(groups):
+        final = os.path.join(output_dir, f"{stem}{suffix}.png")
+        originals = [d for d in groups[stem]['originals'] if d.path != final]
+        legacy = [d.path for d in groups[stem]['legacy'] if d.path != final]
+        has_final = in_place and any(d.path == final for d in groups[stem]['originals'])
+        if originals:
+            # Newest original wins when the same stem exists in several formats
+            originals.sort(key=lambda d: d.stat().st_mtime_ns, reverse=True)
+            source = originals[0].path
+            extra = [d.path for d in originals[1:]] + legacy if in_place else []
+            actions.append(('normalize', source, final, extra))
+        elif legacy and in_place:
+            actions.append(('rename', legacy[0], final, legacy[1:]))
+        elif legacy:
+            actions.append(('normalize', legacy[0], final, []))
+        elif has_final:
+            actions.append(('keep', final, final, []))
+    return actions
+
+def _pipeline_task(task):
+    """
+    Process-pool worker: normalize straight to the final name.
+    """
+    source, final, params = task
+    try:
+        return None, _normalize(source, final, **params)
+    except Exception as e:
+        return str(e), None
+
+def run_pipeline(directories, jobs=1, use_cache=True, dry_run=False, params=None, only=None, written=None):
+    """
+    Normalize, replace originals and drop legacy suffixes in a single pass.
+    Each directory uses its configured profile; params (e.g. optimize,
+    low_memory) override every profile.
+    only limits the run to actions whose source path is in that set;
+    final paths that were (re)written are appended to the written list.
+    Returns the list of (source, error) failures.
+    """
+    failures = []
+    work = []
+    manifests = {}
+    skipped = 0
+    for entry in directories:
+        if not os.path.isdir(entry['source']):
+            print(f"Directory does not exist: {entry['source']}")
+            continue
+        print(f"Processing directory: {entry['source']}")
+        os.makedirs(entry['output'], exist_ok=True)
+        manifest = manifests[entry['output']] = AssetManifest.for_directory(entry['output'])
+        entry_params = profile_params(entry.get('profile', 'default'), params)
+        actions = plan_directory(entry, entry_params)
+        if only is not None:
+            actions = [a for a in actions if a[1] in only]
+        elif use_cache:
+            manifest.prune({manifest.key_for(final) for _, _, final, _ in actions})
+        for kind, source, final, extra in actions:
+            key = manifest.key_for(final)
+            if kind == 'rename':
+                print(f"Rename: {source} -> {final}")
+                if not dry_run:
+                    os.replace(source, final)
+                    _remove(extra)
+                    manifest.record(key, final, entry_params, {final: None})
+                    if written is not None:
+                        written.append(final)
+                continue
+            if use_cache and manifest.is_fresh(key, source, entry_params):
+                skipped += 1
+                if not dry_run:
+                    _remove(extra)
+                continue
+            work.append((manifest, key, kind, source, final, extra, entry_params))
+
+    if skipped:
+        print(f"Up to date: {skipped} image(s)")
+    if dry_run:
+        for _, _, kind, source, final, extra, entry_params in work:
+            print(f"Would normalize ({entry_params['target_size'][0]}px): {source} -> {final}")
+            for path in extra:
+                print(f"Would delete: {path}")
+        return failures
+
+    tasks = [(source, final, entry_params) for _, _, _, source, final, _, entry_params in work]
+    results = iter_results(_pipeline_task, tasks, jobs)
+    try:
+        for (manifest, key, kind, source, final, extra, entry_params), (error, digests) in zip(work, results):
+            if error is not None:
+                print(f"Error processing {source}: {error}")
+                failures.append((source, error))
+                continue
+            print(f"Normalized: {source} -> {final}")
+            if written is not None:
+                written.append(final)
+            source_digest, output_digest = digests
+            in_place = os.path.dirname(source) == os.path.dirname(final)
+            if in_place and source != final:
+                # The original is replaced by its normalized copy
+                _remove([source] + extra)
+            else:
+                _remove(extra)
+            if in_place:
+                # Final is the only copy left; it becomes the source of the next run
+                manifest.record(key, final, entry_params, {final: output_digest}, output_digest)
+            else:
+                manifest.record(key, source, entry_params, {final: output_digest}, source_digest)
+    finally:
+        if use_cache:
+            for manifest in manifests.values():
+                manifest.save()
+    return failures
+
+def _remove(paths):
+    for path in paths:
+        try:
+            os.remove(path)
+            print(f"Deleted: {path}")
+        except FileNotFoundError:
+            pass
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Normalize asset directories in one pass (normalize + delete originals + rename)")
+    parser.add_argument('--config', help="JSON file with the directory list (default: asset_config.py)")
+    parser.add_argument('-j', '--jobs', type=int, default=os.cpu_count() or 1,
+                        help="worker processes to use (1 = serial, default: all cores)")
+    parser.add_argument('--force', action='store_true', help="ignore the build cache")
+    parser.add_argument('--dry-run', action='store_true', help="print the plan without touching files")
+    parser.add_argument('--optimize', action='store_true',
+                        help="run the optimize_png stage (palette reduction, best zlib strategy)")
+    parser.add_argument('--low-memory', action='store_true',
+                        help="decode large sources at reduced scale and flatten at target size")
+    args = parser.parse_args()
+
+    params = {}
+    if args.optimize:
+        params['optimize'] = True
+    if args.low_memory:
+        params['low_memory'] = True
+    failures = run_pipeline(load_directories(args.config), args.jobs,
+                            use_cache=not args.force, dry_run=args.dry_run, params=params)
+    if failures:
+        print(f"\n{len(failures)} image(s) failed:")
+        for source, error in failures:
+            print(f"  - {source}: {error}")
+        sys.exit(1)
+    print("\nPipeline completed.")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,189 @@
+import io
+import os
+import json
+import argparse
+import sys
+from PIL import Image, features
+from asset_cache import AssetManifest, atomic_write_bytes, bytes_digest
+from asset_config import (PUBLIC_DIR, VARIANT_CACHE, VARIANT_DIRECTORIES, VARIANT_FORMATS,
+                          VARIANT_MANIFEST, VARIANT_WIDTHS)
+from normalize_images import iter_results
+from asset_paths import FINGERPRINTED
+
+# Generated files live next to their source in this subdirectory
+VARIANTS_DIRNAME = '_variants'
+
+# Encoder settings per output format
+FORMAT_OPTIONS = {
+    'webp': {'format': 'WEBP', 'quality': 80, 'method': 4},
+    'avif': {'format': 'AVIF', 'quality': 50, 'speed': 6},
+    'png': {'format': 'PNG', 'optimize': True},
+}
+
+def available_formats(formats):
+    """
+    Drop formats the installed Pillow cannot encode (AVIF needs Pillow 11.2+ or a plugin).
+    """
+    usable = []
+    for fmt in formats:
+        try:
+            supported = fmt == 'png' or features.check(fmt)
+        except ValueError:
+            supported = False
+        if supported:
+            usable.append(fmt)
+        else:
+            print(f"Skipping {fmt}: not supported by this Pillow build")
+    return usable
+
+def variant_path(source_path, width, fmt):
+    directory, filename = os.path.split(source_path)
+    stem = os.path.splitext(filename)[0]
+    return os.path.join(directory, VARIANTS_DIRNAME, f"{stem}-{width}.{fmt}")
+
+def _url(path):
+    return '/' + os.path.relpath(path, PUBLIC_DIR).replace(os.sep, '/')
+
+def _build_variants(task):
+    """
+    Process-pool worker: decode one image once and encode the whole ladder.
+    Returns (source, error, size, outputs) with outputs as [(width, fmt, path, sha256)].
+    """
+    source_path, widths, formats = task
+    try:
+        with Image.open(source_path) as img:
+            img.load()
+            size = img.size
+            keep_alpha = img.mode in ('RGBA', 'LA', 'P')
+            img = img.convert('RGBA' if keep_alpha else 'RGB')
+            outputs = []
+            os.makedirs(os.path.join(os.path.dirname(source_path), VARIANTS_DIRNAME), exist_ok=True)
+            # Never upscale: the source width is the top of the ladder
+            ladder = [w for w in widths if w < size[0]] + [size[0]]
+            for width in sorted(set(ladder)):
+                height = max(1, round(size[1] * width / size[0]))
+                resized = img if width == size[0] else img.resize((width, height), Image.LANCZOS)
+                for fmt in formats:
+                    out = io.BytesIO()
+                    options = dict(FORMAT_OPTIONS[fmt])
+                    resized.save(out, options.pop('format'), **options)
+                    path = variant_path(source_path, width, fmt)
+                    atomic_write_bytes(path, out.getvalue())
+                    outputs.append((width, fmt, path, bytes_digest(out.getvalue())))
+    except Exception as e:
+        return source_path, str(e), None, None
+    return source_path, None, size, outputs
+
+def _scan(directories):
+    sources = []
+    for rel_dir in directories:
+        directory = os.path.join(PUBLIC_DIR, *rel_dir.split('/'))
+        if not os.path.isdir(directory):
+            print(f"Directory does not exist: {directory}")
+            continue
+        with os.scandir(directory) as it:
+            sources.extend(sorted(d.path for d in it if d.is_file() and d.name.lower().endswith('.png')
+                                  and not FINGERPRINTED.search(d.name)))
+    return sources
+
+def _prune_stale(directories, keep):
+    """
+    Remove files in the _variants folders that no current build produced,
+    e.g. widths dropped from VARIANT_WIDTHS or formats no longer built.
+    Returns the number of files removed.
+    """
+    keep = {os.path.normcase(os.path.abspath(p)) for p in keep}
+    extensions = tuple(f".{fmt}" for fmt in FORMAT_OPTIONS)
+    removed = 0
+    for rel_dir in directories:
+        variants_dir = os.path.join(PUBLIC_DIR, *rel_dir.split('/'), VARIANTS_DIRNAME)
+        if not os.path.isdir(variants_dir):
+            continue
+        with os.scandir(variants_dir) as it:
+            stale = [d.path for d in it if d.is_file() and d.name.endswith(extensions)
+                     and not FINGERPRINTED.search(d.name)
+                     and os.path.normcase(os.path.abspath(d.path)) not in keep]
+        for path in sorted(stale):
+            os.remove(path)
+            removed += 1
+            print(f"Removed stale variant: {_url(path)}")
+    return removed
+
+def _manifest_entry(size, outputs):
+    entry = {'width': size[0], 'height': size[1], 'srcset': {}, 'variants': {}}
+    for width, fmt, path, _ in outputs:
+        entry['variants'].setdefault(fmt, []).append({'w': width, 'src': _url(path)})
+    for fmt, items in entry['variants'].items():
+        entry['srcset'][fmt] = ', '.join(f"{item['src']} {item['w']}w" for item in items)
+    return entry
+
+def build_variants(directories=None, widths=None, formats=None, jobs=1, use_cache=True):
+    """
+    Generate the size/format ladder for every PNG and write the srcset manifest.
+    Returns the list of (source, error) failures.
+    """
+    directories = directories or VARIANT_DIRECTORIES
+    widths = sorted(widths or VARIANT_WIDTHS)
+    formats = available_formats(formats or VARIANT_FORMATS)
+    params = {'widths': widths, 'formats': formats,
+              'options': {fmt: FORMAT_OPTIONS[fmt] for fmt in formats}}
+
+    cache = AssetManifest(VARIANT_CACHE)
+    sources = _scan(directories)
+    keys = {_url(path): path for path in sources}
+    for path in cache.prune(set(keys)):
+        # Source was deleted or renamed: its variants should not ship any more
+        if os.path.exists(path):
+            os.remove(path)
+
+    existing = {}
+    if os.path.exists(VARIANT_MANIFEST):
+        with open(VARIANT_MANIFEST, 'r', encoding='utf-8') as f:
+            existing = json.load(f)
+
+    manifest = {}
+    tasks = []
+    for key, path in keys.items():
+        if use_cache and key in existing and cache.is_fresh(key, path, params):
+            manifest[key] = existing[key]
+        else:
+            tasks.append((path, widths, formats))
+    print(f"{len(sources) - len(tasks)} up to date, {len(tasks)} to build")
+
+    failures = []
+    try:
+        for source_path, error, size, outputs in iter_results(_build_variants, tasks, jobs):
+            if error is not None:
+                print(f"Error processing {source_path}: {error}")
+                failures.append((source_path, error))
+                continue
+            key = _url(source_path)
+            manifest[key] = _manifest_entry(size, outputs)
+            cache.record(key, source_path, params, {path: digest for _, _, path, digest in outputs})
+            print(f"Variants: {key} ({len(outputs)} files)")
+    finally:
+        cache.save()
+    _prune_stale(directories, cache.output_paths())
+
+    data = json.dumps(dict(sorted(manifest.items())), ensure_ascii=False, indent=1)
+    atomic_write_bytes(VARIANT_MANIFEST, data.encode('utf-8'))
+    print(f"Manifest written: {VARIANT_MANIFEST} ({len(manifest)} assets)")
+    return failures
+
+def main():
+    parser = argparse.ArgumentParser(description="Generate responsive WebP/AVIF variants and a srcset manifest")
+    parser.add_argument('--widths', help=f"comma-separated width ladder (default: {VARIANT_WIDTHS})")
+    parser.add_argument('--formats', help=f"comma-separated formats (default: {VARIANT_FORMATS})")
+    parser.add_argument('-j', '--jobs', type=int, default=os.cpu_count() or 1,
+                        help="worker processes to use (1 = serial, default: all cores)")
+    parser.add_argument('--force', action='store_true', help="rebuild every variant")
+    args = parser.parse_args()
+
+    widths = [int(w) for w in args.widths.split(',')] if args.widths else None
+    formats = args.formats.split(',') if args.formats else None
+    failures = build_variants(widths=widths, formats=formats, jobs=args.jobs, use_cache=not args.force)
+    if failures:
+        sys.exit(1)
+
+if __name__ == "__main__":
+    main()
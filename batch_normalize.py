@@ -0,0 +1,318 @@
+import os
+import json
+import argparse
+import hashlib
+import shutil
+import sys
+import time
+from asset_cache import atomic_write_bytes
+from asset_config import BATCH_JOBS_DIR, BATCH_SHARD_SIZE, resolve
+from normalize_images import SUPPORTED_FORMATS, _normalize, iter_results, profile_params
+
+JOB_VERSION = 1
+
+def job_dir_for(input_dir, output_dir, suffix, profile, jobs_dir=BATCH_JOBS_DIR):
+    """
+    The same import (input, output, suffix, profile) always maps to the same
+    job folder, so re-running the command resumes it.
+    """
+    key = json.dumps([os.path.abspath(input_dir), os.path.abspath(output_dir), suffix, profile])
+    return os.path.join(jobs_dir, hashlib.sha1(key.encode('utf-8')).hexdigest()[:12])
+
+def iter_sources(input_dir, suffix):
+    """
+    Lazily yield image file names in input_dir, skipping our own outputs.
+    """
+    with os.scandir(input_dir) as it:
+        for dirent in it:
+            if not dirent.name.lower().endswith(SUPPORTED_FORMATS):
+                continue
+            if suffix and os.path.splitext(dirent.name)[0].endswith(suffix):
+                continue
+            if dirent.is_file():
+                yield dirent.name
+
+def _shard_path(job_dir, index, ext):
+    return os.path.join(job_dir, 'shards', f"{index:05d}.{ext}")
+
+def plan_job(job_dir, input_dir, output_dir, suffix, profile, params, shard_size):
+    """
+    Stream the directory listing into fixed-size shard files, then write the
+    job state. Only one shard of names (plus the output names seen so far)
+    is held in memory. Sources that would write the same output, such as
+    img.jpg and img.png, raise ValueError before anything is processed.
+    """
+    os.makedirs(os.path.join(job_dir, 'shards'), exist_ok=True)
+    shards = 0
+    planned = 0
+    names = []
+    outputs = {}
+    collisions = []
+
+    def flush():
+        nonlocal shards, names
+        atomic_write_bytes(_shard_path(job_dir, shards, 'txt'), ''.join(n + '\n' for n in names).encode('utf-8'))
+        shards += 1
+        names = []
+
+    for name in iter_sources(input_dir, suffix):
+        output = os.path.normcase(f"{os.path.splitext(name)[0]}{suffix}.png")
+        if output in outputs:
+            collisions.append((outputs[output], name, output))
+            continue
+        outputs[output] = name
+        names.append(name)
+        planned += 1
+        if len(names) == shard_size:
+            flush()
+    if names:
+        flush()
+    if collisions:
+        shutil.rmtree(job_dir)
+        examples = '; '.join(f"{a} and {b} -> {out}" for a, b, out in collisions[:3])
+        raise ValueError(f"{len(collisions)} source(s) would overwrite another one's output ({examples}); "
+                         "rename them or import them separately")
+    state = {
+        'version': JOB_VERSION,
+        'input': os.path.abspath(input_dir),
+        'output': os.path.abspath(output_dir),
+        'suffix': suffix,
+        'profile': profile,
+        'params': params,
+        'shard_size': shard_size,
+        'shards': shards,
+        'planned': planned,
+        'completed_shards': 0,
+        'created': time.strftime('%Y-%m-%dT%H:%M:%S'),
+    }
+    save_state(job_dir, state)
+    return state
+
+def load_state(job_dir):
+    path = os.path.join(job_dir, 'state.json')
+    if not os.path.exists(path):
+        return None
+    with open(path, 'r', encoding='utf-8') as f:
+        state = json.load(f)
+    if state.get('version') != JOB_VERSION:
+        raise ValueError(f"Unsupported job version in {path}; start over with --restart")
+    return state
+
+def save_state(job_dir, state):
+    data = json.dumps(state, ensure_ascii=False, indent=1)
+    atomic_write_bytes(os.path.join(job_dir, 'state.json'), data.encode('utf-8'))
+
+def read_journal(job_dir, index):
+    """
+    {name: 'ok' | 'failed'} for one shard. The journal holds one JSON object
+    per line; a line that does not parse (torn by a crash mid-write) is skipped.
+    """
+    done = {}
+    try:
+        with open(_shard_path(job_dir, index, 'log'), 'r', encoding='utf-8') as f:
+            for line in f:
+                try:
+                    record = json.loads(line)
+                    done[record['name']] = record['status']
+                except (ValueError, TypeError, KeyError):
+                    continue
+    except FileNotFoundError:
+        pass
+    return done
+
+def _journal_line(status, name, error=None):
+    record = {'status': status, 'name': name}
+    if error is not None:
+        record['error'] = error
+    return json.dumps(record, ensure_ascii=False) + '\n'
+
+def _trim_torn_line(path):
+    """
+    Cut a partial last line off the journal so new lines start clean.
+    """
+    try:
+        with open(path, 'rb+') as f:
+            data = f.read()
+            if data and not data.endswith(b'\n'):
+                f.truncate(data.rfind(b'\n') + 1)
+    except FileNotFoundError:
+        pass
+
+def _output_path(state, name):
+    stem = os.path.splitext(name)[0]
+    return os.path.join(state['output'], f"{stem}{state['suffix']}.png")
+
+def _batch_task(task):
+    """
+    Process-pool worker: normalize one file. Returns (name, error or None).
+    """
+    name, source, output, params = task
+    try:
+        _normalize(source, output, **params)
+    except Exception as e:
+        return name, str(e)
+    return name, None
+
+def _finish(state, name, delete_originals):
+    source = os.path.join(state['input'], name)
+    if delete_originals and os.path.normcase(source) != os.path.normcase(_output_path(state, name)):
+        try:
+            os.remove(source)
+        except FileNotFoundError:
+            pass
+
+def run_shard(job_dir, state, index, jobs=1, delete_originals=False, retry_failed=False, verbose=False):
+    """
+    Normalize what is left of one shard, journaling every file as soon as it
+    is written. Returns (ok, failed) counts for this run.
+    """
+    with open(_shard_path(job_dir, index, 'txt'), 'r', encoding='utf-8') as f:
+        names = [line.rstrip('\n') for line in f if line.strip()]
+    done = read_journal(job_dir, index)
+    tasks = []
+    recovered = []
+    missing = []
+    for name in names:
+        status = done.get(name)
+        if status == 'ok' or (status == 'failed' and not retry_failed):
+            if status == 'ok':
+                # The journal line may have landed just before an interrupted delete
+                _finish(state, name, delete_originals)
+            continue
+        source = os.path.join(state['input'], name)
+        output = _output_path(state, name)
+        if os.path.exists(source):
+            tasks.append((name, source, output, state['params']))
+        elif os.path.exists(output):
+            # Written and original removed, but the journal line was lost
+            recovered.append(name)
+        else:
+            missing.append(name)
+
+    ok = failed = 0
+    _trim_torn_line(_shard_path(job_dir, index, 'log'))
+    with open(_shard_path(job_dir, index, 'log'), 'a', encoding='utf-8') as journal:
+        for name in recovered:
+            journal.write(_journal_line('ok', name))
+            ok += 1
+        for name in missing:
+            journal.write(_journal_line('failed', name, 'source disappeared'))
+            failed += 1
+            print(f"Error processing {name}: source disappeared")
+        for name, error in iter_results(_batch_task, tasks, jobs):
+            if error is None:
+                journal.write(_journal_line('ok', name))
+                journal.flush()
+                _finish(state, name, delete_originals)
+                ok += 1
+                if verbose:
+                    print(f"Normalized: {name}")
+            else:
+                journal.write(_journal_line('failed', name, error))
+                journal.flush()
+                failed += 1
+                print(f"Error processing {name}: {error}")
+        os.fsync(journal.fileno())
+    return ok, failed
+
+def run_job(input_dir, output_dir=None, suffix='_normalized', profile='default', overrides=None,
+            shard_size=BATCH_SHARD_SIZE, jobs=1, delete_originals=False, retry_failed=False, restart=False,
+            jobs_dir=BATCH_JOBS_DIR, verbose=False):
+    """
+    Plan (or resume) a batch import and work through its shards in order.
+    Ctrl-C stops after the files already finished; running the same command
+    again continues from there. Returns the job state.
+    """
+    output_dir = output_dir or input_dir
+    params = profile_params(profile, overrides)
+    job_dir = job_dir_for(input_dir, output_dir, suffix, profile, jobs_dir)
+    if restart and os.path.isdir(job_dir):
+        shutil.rmtree(job_dir)
+    state = load_state(job_dir)
+    if state is None:
+        print(f"Planning {input_dir} ...")
+        state = plan_job(job_dir, input_dir, output_dir, suffix, profile, params, shard_size)
+        print(f"Planned {state['planned']} file(s) in {state['shards']} shard(s): {job_dir}")
+    elif state['params'] != json.loads(json.dumps(params)):
+        raise ValueError("Normalization parameters changed since this job was planned; use --restart")
+    elif state['completed_shards'] >= state['shards'] and not retry_failed:
+        print(f"Job already complete (new files need --restart): {job_dir}")
+    else:
+        print(f"Resuming at shard {state['completed_shards'] + 1} of {state['shards']}: {job_dir}")
+    if retry_failed:
+        state['completed_shards'] = 0
+    os.makedirs(state['output'], exist_ok=True)
+
+    start = time.perf_counter()
+    processed = 0
+    try:
+        for index in range(state['completed_shards'], state['shards']):
+            ok, failed = run_shard(job_dir, state, index, jobs, delete_originals, retry_failed, verbose)
+            processed += ok + failed
+            state['completed_shards'] = index + 1
+            save_state(job_dir, state)
+            rate = processed / max(1e-9, time.perf_counter() - start)
+            left = (state['shards'] - index - 1) * state['shard_size']
+            eta = f", ~{left / rate / 60:.1f} min left" if rate and left else ''
+            print(f"Shard {index + 1}/{state['shards']}: {ok} normalized, {failed} failed "
+                  f"({rate:.1f} files/s{eta})")
+    except KeyboardInterrupt:
+        print("\nInterrupted; finished files are journaled, run the same command to resume")
+        raise
+    return state
+
+def job_status(job_dir):
+    """
+    Counts of ok/failed/pending files across the job's journals.
+    """
+    state = load_state(job_dir)
+    if state is None:
+        return None
+    counts = {'ok': 0, 'failed': 0}
+    for index in range(state['shards']):
+        for status in read_journal(job_dir, index).values():
+            counts[status] = counts.get(status, 0) + 1
+    counts['pending'] = state['planned'] - counts['ok'] - counts['failed']
+    return dict(counts, shards=state['shards'], completed_shards=state['completed_shards'])
+
+def main():
+    parser = argparse.ArgumentParser(description="Normalize a huge directory as a resumable, sharded batch job")
+    parser.add_argument('input', help="directory with the originals")
+    parser.add_argument('--output', help="where normalized files go (default: the input directory)")
+    parser.add_argument('--suffix', default='_normalized', help="appended to output file stems")
+    parser.add_argument('--profile', default='default', help="normalization profile from asset_config.py")
+    parser.add_argument('--shard-size', type=int, default=BATCH_SHARD_SIZE, help="files per shard")
+    parser.add_argument('-j', '--jobs', type=int, default=os.cpu_count() or 1,
+                        help="worker processes to use (1 = serial, default: all cores)")
+    parser.add_argument('--delete-originals', action='store_true',
+                        help="remove each original once its normalized file is journaled")
+    parser.add_argument('--retry-failed', action='store_true', help="try failed files again")
+    parser.add_argument('--restart', action='store_true', help="discard the journal and plan again")
+    parser.add_argument('--status', action='store_true', help="only print the job's progress")
+    parser.add_argument('--low-memory', action='store_true',
+                        help="decode large sources at reduced scale and flatten at target size")
+    parser.add_argument('-v', '--verbose', action='store_true', help="print every normalized file")
+    args = parser.parse_args()
+
+    input_dir = resolve(args.input)
+    output_dir = resolve(args.output) if args.output else input_dir
+    if args.status:
+        status = job_status(job_dir_for(input_dir, output_dir, args.suffix, args.profile))
+        if status is None:
+            print("No job for these arguments")
+        else:
+            print(f"Shards {status['completed_shards']}/{status['shards']}: {status['ok']} ok, "
+                  f"{status['failed']} failed, {status['pending']} pending")
+        return
+    overrides = {'low_memory': True} if args.low_memory else None
+    try:
+        run_job(input_dir, output_dir, args.suffix, args.profile, overrides, args.shard_size, args.jobs,
+                args.delete_originals, args.retry_failed, args.restart, verbose=args.verbose)
+    except KeyboardInterrupt:
+        sys.exit(130)
+    except (OSError, ValueError) as e:
+        print(f"Error: {e}")
+        sys.exit(1)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,271 @@
+import os
+import json
+import argparse
+import contextlib
+import multiprocessing
+import platform
+import queue
+import random
+import shutil
+import sys
+import tempfile
+import time
+import traceback
+from PIL import Image, ImageDraw
+import PIL
+
+try:
+    import resource
+except ImportError:  # Windows: no getrusage, peak RSS is reported as null
+    resource = None
+
+# Default mix of (mode, format) pairs; weights are relative
+DEFAULT_MIX = {
+    'RGBA/png': 4,
+    'P/png': 2,
+    'LA/png': 1,
+    'RGB/jpeg': 4,
+    'RGB/webp': 1,
+    'RGBA/webp': 1,
+}
+# Width/height ratios seen in the real corpus: square avatars, tall clothes, wide banners
+ASPECT_RATIOS = [1.0, 1.0, 0.75, 0.5, 1.33, 1.78]
+STAGES = ['normalize', 'delete', 'rename', 'pipeline', 'resize_icons', 'optimize', 'variants']
+
+def _synthetic_image(rng, mode, max_edge):
+    ratio = rng.choice(ASPECT_RATIOS)
+    long_edge = rng.randint(max_edge // 4, max_edge)
+    if ratio >= 1:
+        size = (long_edge, max(1, int(long_edge / ratio)))
+    else:
+        size = (max(1, int(long_edge * ratio)), long_edge)
+    # Gradient background plus a few shapes: compresses like real art, not like noise
+    img = Image.linear_gradient('L').resize(size).convert('RGB')
+    img = Image.merge('RGB', [img.getchannel(0).point(lambda v, k=k: (v * k) % 256) for k in (1, 2, 3)])
+    draw = ImageDraw.Draw(img)
+    for _ in range(rng.randint(3, 12)):
+        x0, y0 = rng.randrange(size[0]), rng.randrange(size[1])
+        x1, y1 = x0 + rng.randrange(1, size[0] // 2 + 2), y0 + rng.randrange(1, size[1] // 2 + 2)
+        color = tuple(rng.randrange(256) for _ in range(3))
+        (draw.ellipse if rng.random() < 0.5 else draw.rectangle)((x0, y0, x1, y1), fill=color)
+    if mode in ('RGBA', 'LA'):
+        alpha = Image.new('L', size, 0)
+        ImageDraw.Draw(alpha).ellipse((size[0] // 8, size[1] // 8, size[0] * 7 // 8, size[1] * 7 // 8), fill=255)
+        img.putalpha(alpha)
+        return img if mode == 'RGBA' else img.convert('LA')
+    if mode == 'P':
+        return img.quantize(64)
+    return img
+
+def generate_corpus(directory, count, seed=1234, mix=None, max_edge=2048):
+    """
+    Write a deterministic synthetic corpus; the same (count, seed, mix,
+    max_edge) always produces the same files.
+    Returns the list of written paths.
+    """
+    mix = mix or DEFAULT_MIX
+    rng = random.Random(seed)
+    kinds = list(mix)
+    weights = [mix[k] for k in kinds]
+    os.makedirs(directory, exist_ok=True)
+    paths = []
+    for index in range(count):
+        mode, fmt = rng.choices(kinds, weights)[0].split('/')
+        img = _synthetic_image(rng, mode, max_edge)
+        ext = {'jpeg': 'jpg'}.get(fmt, fmt)
+        path = os.path.join(directory, f"img{index:05d}.{ext}")
+        if fmt == 'jpeg':
+            img.convert('RGB').save(path, 'JPEG', quality=90)
+        else:
+            img.save(path, fmt.upper())
+        paths.append(path)
+    return paths
+
+def _output_bytes(directory):
+    total = 0
+    for dirpath, _, filenames in os.walk(directory):
+        total += sum(os.path.getsize(os.path.join(dirpath, f)) for f in filenames
+                     if not f.startswith('.'))
+    return total
+
+def _run_stage(stage, work_dir, jobs):
+    """
+    Run one stage inside a fresh process and measure it there.
+    Returns the stats dict.
+    """
+    import normalize_images
+    import delete_old_images_v2
+    import rename_clothes
+
+    # The per-file print lines are part of each script; keep them off the terminal
+    with open(os.devnull, 'w') as sink, contextlib.redirect_stdout(sink):
+        files = sum(1 for f in os.listdir(work_dir) if not f.startswith('.'))
+        start = time.perf_counter()
+        if stage == 'normalize':
+            normalize_images.normalize_images_in_directory(work_dir, jobs=jobs, use_cache=False)
+        elif stage == 'delete':
+            delete_old_images_v2.delete_original_images(work_dir)
+        elif stage == 'rename':
+            rename_clothes.rename_files_remove_normalized(work_dir)
+        elif stage == 'pipeline':
+            import asset_pipeline
+            entry = {'source': work_dir, 'output': work_dir, 'suffix': ''}
+            asset_pipeline.run_pipeline([entry], jobs, use_cache=False)
+        elif stage == 'resize_icons':
+            import resize_icons
+            resize_icons.build_icons(work_dir, os.path.join(work_dir, 'icons'), use_cache=False,
+                                     cache_path=os.path.join(work_dir, '.asset_cache.icons.json'))
+        elif stage == 'optimize':
+            import optimize_png
+            optimize_png.optimize_tree([work_dir], jobs=jobs)
+        elif stage == 'variants':
+            import asset_variants
+            asset_variants.PUBLIC_DIR = work_dir
+            asset_variants.VARIANT_CACHE = os.path.join(work_dir, '.asset_cache.variants.json')
+            asset_variants.VARIANT_MANIFEST = os.path.join(work_dir, '.asset-variants.json')
+            asset_variants.build_variants(['.'], jobs=jobs, use_cache=False)
+        wall = time.perf_counter() - start
+
+    peak_rss = None
+    if resource is not None:
+        # ru_maxrss is KB on Linux, bytes on macOS
+        scale = 1 if sys.platform == 'darwin' else 1024
+        peak_rss = max(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss,
+                       resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss) * scale
+    return {
+        'files': files,
+        'wall_seconds': round(wall, 4),
+        'images_per_second': round(files / wall, 2) if wall > 0 else None,
+        'peak_rss_bytes': peak_rss,
+        'output_bytes': _output_bytes(work_dir),
+    }
+
+def _prepare(stage, corpus_dir, work_dir):
+    """
+    Lay out the input a stage expects (copy time is not measured).
+    """
+    shutil.copytree(corpus_dir, work_dir)
+    if stage in ('delete', 'rename', 'resize_icons', 'optimize', 'variants'):
+        # These stages work on normalized PNGs, not on raw sources
+        import normalize_images
+        with open(os.devnull, 'w') as sink, contextlib.redirect_stdout(sink):
+            normalize_images.normalize_images_in_directory(work_dir, use_cache=False)
+        for name in os.listdir(work_dir):
+            path = os.path.join(work_dir, name)
+            if stage == 'delete' or name.endswith('_normalized.png') or name.startswith('.'):
+                continue
+            os.remove(path)
+        if stage in ('resize_icons', 'optimize', 'variants'):
+            for name in os.listdir(work_dir):
+                if name.endswith('_normalized.png'):
+                    os.replace(os.path.join(work_dir, name),
+                               os.path.join(work_dir, name.replace('_normalized', '')))
+
+def _stage_process(results, stage, work_dir, jobs):
+    """
+    Child-process entry point: run one stage and send back (stats, error).
+    """
+    try:
+        results.put((_run_stage(stage, work_dir, jobs), None))
+    except Exception:
+        results.put((None, traceback.format_exc()))
+
+def _run_isolated(ctx, stage, work_dir, jobs):
+    """
+    Run a stage in a fresh interpreter: peak RSS does not bleed across
+    stages, and the process is not daemonic, so the stage may start its
+    own process pool.
+    """
+    results = ctx.Queue()
+    process = ctx.Process(target=_stage_process, args=(results, stage, work_dir, jobs))
+    process.start()
+    try:
+        while True:
+            try:
+                stats, error = results.get(timeout=1)
+                break
+            except queue.Empty:
+                if not process.is_alive():
+                    raise RuntimeError(f"stage {stage} died with exit code {process.exitcode}")
+    finally:
+        process.join()
+    if error is not None:
+        raise RuntimeError(f"stage {stage} failed:\n{error}")
+    return stats
+
+def run_benchmarks(corpus_dir, stages, jobs, scratch_dir):
+    results = {}
+    ctx = multiprocessing.get_context('spawn')
+    for stage in stages:
+        work_dir = os.path.join(scratch_dir, stage)
+        if os.path.exists(work_dir):
+            shutil.rmtree(work_dir)
+        _prepare(stage, corpus_dir, work_dir)
+        results[stage] = _run_isolated(ctx, stage, work_dir, jobs)
+        shutil.rmtree(work_dir)
+        stats = results[stage]
+        print(f"{stage:>12}: {stats['files']} files in {stats['wall_seconds']:.2f}s "
+              f"({stats['images_per_second']} img/s), peak RSS "
+              f"{(stats['peak_rss_bytes'] or 0) / 1024 / 1024:.0f} MB, output {stats['output_bytes'] / 1024:.0f} KB")
+    return results
+
+def compare(old, new):
+    """
+    Print per-stage deltas between two result files.
+    """
+    for stage, stats in new['stages'].items():
+        before = old['stages'].get(stage)
+        if before is None:
+            print(f"{stage:>12}: new stage")
+            continue
+        parts = []
+        for key in ('wall_seconds', 'peak_rss_bytes', 'output_bytes'):
+            if before.get(key) and stats.get(key) is not None:
+                parts.append(f"{key} {(stats[key] - before[key]) * 100 / before[key]:+.1f}%")
+        print(f"{stage:>12}: " + ', '.join(parts))
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the asset pipeline on a synthetic corpus")
+    parser.add_argument('--count', type=int, default=200, help="number of synthetic images")
+    parser.add_argument('--seed', type=int, default=1234, help="corpus random seed")
+    parser.add_argument('--max-edge', type=int, default=2048, help="largest image edge in pixels")
+    parser.add_argument('--mix', help='JSON object of "MODE/format": weight (default: %s)' % json.dumps(DEFAULT_MIX))
+    parser.add_argument('--stages', default=','.join(STAGES), help="comma-separated stages to run")
+    parser.add_argument('-j', '--jobs', type=int, default=os.cpu_count() or 1,
+                        help="worker processes for stages that support it")
+    parser.add_argument('--corpus', help="reuse/create the corpus in this directory")
+    parser.add_argument('-o', '--output', default='bench_results.json', help="results JSON file")
+    parser.add_argument('--compare', help="previous results JSON to compare against")
+    args = parser.parse_args()
+
+    mix = json.loads(args.mix) if args.mix else DEFAULT_MIX
+    stages = [s for s in args.stages.split(',') if s]
+    with tempfile.TemporaryDirectory(prefix='bench_assets_') as scratch:
+        corpus_dir = args.corpus or os.path.join(scratch, 'corpus')
+        if not (os.path.isdir(corpus_dir) and os.listdir(corpus_dir)):
+            print(f"Generating {args.count} images in {corpus_dir}")
+            generate_corpus(corpus_dir, args.count, args.seed, mix, args.max_edge)
+        results = run_benchmarks(corpus_dir, stages, args.jobs, scratch)
+
+    data = {
+        'meta': {
+            'timestamp': time.strftime('%Y-%m-%dT%H:%M:%S'),
+            'python': platform.python_version(),
+            'pillow': PIL.__version__,
+            'platform': platform.platform(),
+            'cpu_count': os.cpu_count(),
+            'jobs': args.jobs,
+            'corpus': {'count': args.count, 'seed': args.seed, 'max_edge': args.max_edge, 'mix': mix},
+        },
+        'stages': results,
+    }
+    with open(args.output, 'w', encoding='utf-8') as f:
+        json.dump(data, f, indent=1)
+    print(f"Results written: {args.output}")
+
+    if args.compare:
+        with open(args.compare, 'r', encoding='utf-8') as f:
+            compare(json.load(f), data)
+
+if __name__ == "__main__":
+    main()
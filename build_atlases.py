@@ -0,0 +1,169 @@
+import io
+import os
+import json
+import argparse
+import math
+import sys
+from PIL import Image, ImageChops
+from asset_cache import AssetManifest, atomic_write_bytes, bytes_digest
+from asset_config import ATLAS_CATEGORIES, ATLAS_DIR, ATLAS_MAX_SIZE, ATLAS_PADDING, PUBLIC_DIR, ROOT_DIR
+from asset_paths import FINGERPRINTED
+
+def _trim_box(img):
+    """
+    Bounding box of the visible content: non-transparent pixels for images
+    with alpha, pixels that differ from the top-left colour otherwise.
+    """
+    if img.mode == 'RGBA':
+        return img.getchannel('A').getbbox()
+    background = Image.new(img.mode, img.size, img.getpixel((0, 0)))
+    return ImageChops.difference(img, background).getbbox()
+
+def load_sprite(path, sprite_box=None, trim=True):
+    """
+    Open one member image and return (image, metadata) ready for packing.
+    """
+    with Image.open(path) as img:
+        img = img.convert('RGBA' if img.mode in ('RGBA', 'LA', 'P') else 'RGB')
+    if sprite_box:
+        img.thumbnail((sprite_box, sprite_box), Image.LANCZOS)
+    source_w, source_h = img.size
+    box = _trim_box(img) if trim else None
+    if box is None:
+        # Fully blank image or trimming disabled: keep the whole frame
+        box = (0, 0, source_w, source_h)
+    img = img.crop(box)
+    meta = {
+        'sourceSize': {'w': source_w, 'h': source_h},
+        'spriteSourceSize': {'x': box[0], 'y': box[1], 'w': box[2] - box[0], 'h': box[3] - box[1]},
+        'trimmed': box != (0, 0, source_w, source_h),
+    }
+    return img, meta
+
+def pack_shelves(sizes, max_size, padding):
+    """
+    Shelf-pack (w, h) rectangles, tallest first.
+    Returns (placements, atlas_sizes) with placements[i] = (atlas, x, y).
+    Raises ValueError for a rectangle that cannot fit even an empty atlas.
+    """
+    for i, (w, h) in enumerate(sizes):
+        if max(w, h) + 2 * padding > max_size:
+            raise ValueError(f"sprite {i} ({w}x{h}) does not fit a {max_size}px atlas with {padding}px padding")
+    order = sorted(range(len(sizes)), key=lambda i: (-sizes[i][1], -sizes[i][0]))
+    area = sum((w + padding) * (h + padding) for w, h in sizes)
+    widest = max((w for w, _ in sizes), default=1) + 2 * padding
+    # Aim for a roughly square atlas, but never narrower than the widest sprite
+    width = min(max_size, max(widest, 2 ** math.ceil(math.log2(max(1, math.sqrt(area))))))
+
+    placements = [None] * len(sizes)
+    atlas_sizes = []
+    atlas, x, y, shelf_h, used_w = 0, padding, padding, 0, 0
+    for i in order:
+        w, h = sizes[i]
+        if x + w + padding > width:
+            x, y, shelf_h = padding, y + shelf_h + padding, 0
+        if y + h + padding > max_size:
+            atlas_sizes.append((used_w, y))
+            atlas, x, y, shelf_h, used_w = atlas + 1, padding, padding, 0, 0
+        placements[i] = (atlas, x, y)
+        x += w + padding
+        shelf_h = max(shelf_h, h)
+        used_w = max(used_w, x)
+    atlas_sizes.append((used_w, y + shelf_h + padding))
+    return placements, atlas_sizes
+
+def _members(source_dir):
+    with os.scandir(source_dir) as it:
+        return sorted(d.path for d in it if d.is_file() and d.name.lower().endswith('.png')
+                      and not FINGERPRINTED.search(d.name))
+
+def _url(path):
+    return '/' + os.path.relpath(path, PUBLIC_DIR).replace(os.sep, '/')
+
+def build_atlas(category, max_size=ATLAS_MAX_SIZE, padding=ATLAS_PADDING, use_cache=True):
+    """
+    Pack one category into atlas PNG(s) plus a JSON coordinate map.
+    Skipped when no member image changed since the last build.
+    """
+    name = category['name']
+    source_dir = os.path.join(PUBLIC_DIR, *category['source'].split('/'))
+    if not os.path.isdir(source_dir):
+        print(f"Directory does not exist: {source_dir}")
+        return False
+    members = _members(source_dir)
+    params = {'sprite_box': category.get('sprite_box'), 'trim': category.get('trim', True),
+              'max_size': max_size, 'padding': padding}
+    cache = AssetManifest(os.path.join(ROOT_DIR, 'game', f'.asset_cache.atlas-{name}.json'))
+    if (use_cache and set(cache.entries) == {_url(p) for p in members}
+            and all(cache.is_fresh(_url(p), p, params) for p in members)):
+        print(f"Up to date: {name} ({len(members)} sprites)")
+        cache.save()
+        return False
+
+    sprites = [load_sprite(p, params['sprite_box'], params['trim']) for p in members]
+    oversized = [f"{_url(path)} ({img.size[0]}x{img.size[1]})" for path, (img, _) in zip(members, sprites)
+                 if max(img.size) + 2 * padding > max_size]
+    if oversized:
+        raise ValueError(f"larger than a {max_size}px atlas with {padding}px padding: {', '.join(oversized)}; "
+                         "set a sprite_box for the category or raise --max-size")
+    placements, atlas_sizes = pack_shelves([img.size for img, _ in sprites], max_size, padding)
+
+    os.makedirs(ATLAS_DIR, exist_ok=True)
+    canvases = [Image.new('RGBA', size, (0, 0, 0, 0)) for size in atlas_sizes]
+    frames = {}
+    for path, (img, meta), (atlas, x, y) in zip(members, sprites, placements):
+        canvases[atlas].paste(img, (x, y))
+        frames[_url(path)] = dict(meta, atlas=atlas, frame={'x': x, 'y': y, 'w': img.size[0], 'h': img.size[1]})
+
+    outputs = {}
+    atlases = []
+    for index, canvas in enumerate(canvases):
+        if canvas.getchannel('A').getextrema() == (255, 255):
+            canvas = canvas.convert('RGB')
+        out = io.BytesIO()
+        canvas.save(out, 'PNG', optimize=True)
+        atlas_path = os.path.join(ATLAS_DIR, f"{name}-{index}.png")
+        atomic_write_bytes(atlas_path, out.getvalue())
+        outputs[atlas_path] = bytes_digest(out.getvalue())
+        atlases.append({'image': _url(atlas_path), 'size': {'w': canvas.size[0], 'h': canvas.size[1]}})
+
+    # Drop atlas pages left over from a bigger previous build
+    index = len(canvases)
+    while os.path.exists(os.path.join(ATLAS_DIR, f"{name}-{index}.png")):
+        os.remove(os.path.join(ATLAS_DIR, f"{name}-{index}.png"))
+        index += 1
+
+    map_path = os.path.join(ATLAS_DIR, f"{name}.json")
+    data = json.dumps({'atlases': atlases, 'padding': padding, 'sprites': frames},
+                      ensure_ascii=False, indent=1)
+    atomic_write_bytes(map_path, data.encode('utf-8'))
+    outputs[map_path] = None
+
+    cache.entries = {}
+    for path in members:
+        cache.record(_url(path), path, params, outputs)
+    cache.save()
+    print(f"Packed {name}: {len(members)} sprites into {len(canvases)} atlas(es)")
+    return True
+
+def main():
+    parser = argparse.ArgumentParser(description="Pack teamicons and clothes categories into sprite atlases")
+    parser.add_argument('categories', nargs='*', help="category names to build (default: all)")
+    parser.add_argument('--max-size', type=int, default=ATLAS_MAX_SIZE, help="maximum atlas edge in pixels")
+    parser.add_argument('--padding', type=int, default=ATLAS_PADDING, help="transparent gap around each sprite")
+    parser.add_argument('--force', action='store_true', help="rebuild even when nothing changed")
+    args = parser.parse_args()
+
+    selected = [c for c in ATLAS_CATEGORIES if not args.categories or c['name'] in args.categories]
+    failed = False
+    for category in selected:
+        try:
+            build_atlas(category, args.max_size, args.padding, use_cache=not args.force)
+        except Exception as e:
+            print(f"Error packing {category['name']}: {e}")
+            failed = True
+    if failed:
+        sys.exit(1)
+
+if __name__ == "__main__":
+    main()
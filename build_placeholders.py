@@ -0,0 +1,251 @@
+import io
+import os
+import json
+import argparse
+import base64
+import math
+import sys
+from PIL import Image
+from asset_cache import AssetManifest
+from asset_config import (PLACEHOLDER_CACHE, PLACEHOLDER_COMPONENTS, PLACEHOLDER_DIRECTORIES,
+                          PLACEHOLDER_MANIFEST, PLACEHOLDER_MODULE, PLACEHOLDER_SAMPLE, PLACEHOLDER_THUMB,
+                          PUBLIC_DIR)
+from fingerprint_assets import write_if_changed
+from normalize_images import iter_results
+from asset_paths import FINGERPRINTED
+
+try:
+    import numpy as np
+except ImportError:  # Optional: the pure-Python path gives the same hashes, just slower
+    np = None
+
+MODULE_HEADER = "// Auto-generated by build_placeholders.py — do not edit, run it again to regenerate\n"
+
+BASE83 = '0123456789ABCDEFGHIJKLMNOPQRSTUVWXYZabcdefghijklmnopqrstuvwxyz#$%*+,-.:;=?@[]^_{|}~'
+
+# sRGB byte -> linear light, looked up instead of computed per pixel
+_TO_LINEAR = [v / 255 / 12.92 if v / 255 <= 0.04045 else ((v / 255 + 0.055) / 1.055) ** 2.4 for v in range(256)]
+
+def _base83(value, length):
+    return ''.join(BASE83[value // 83 ** (length - i) % 83] for i in range(1, length + 1))
+
+def _to_srgb(value):
+    v = max(0.0, min(1.0, value))
+    if v <= 0.0031308:
+        return int(v * 12.92 * 255 + 0.5)
+    return int((1.055 * v ** (1 / 2.4) - 0.055) * 255 + 0.5)
+
+def _sign_pow(value, exp):
+    return math.copysign(abs(value) ** exp, value)
+
+def _factors_numpy(img, nx, ny):
+    width, height = img.size
+    pixels = np.asarray(_TO_LINEAR)[np.asarray(img, dtype=np.uint8)]
+    cos_x = np.cos(np.pi * np.outer(np.arange(nx), np.arange(width)) / width)
+    cos_y = np.cos(np.pi * np.outer(np.arange(ny), np.arange(height)) / height)
+    # factors[j, i] = sum over y, x of cos_y[j, y] * cos_x[i, x] * pixel[y, x]
+    factors = np.einsum('jy,ix,yxc->jic', cos_y, cos_x, pixels) / (width * height)
+    factors[1:, :] *= 2
+    factors[0, 1:] *= 2
+    return [tuple(factors[j, i]) for j in range(ny) for i in range(nx)]
+
+def _factors_python(img, nx, ny):
+    width, height = img.size
+    data = img.tobytes()
+    cos_x = [[math.cos(math.pi * i * x / width) for x in range(width)] for i in range(nx)]
+    cos_y = [[math.cos(math.pi * j * y / height) for y in range(height)] for j in range(ny)]
+    # Separable: transform every row along x once, then combine the rows along y
+    rows = []
+    for y in range(height):
+        start = y * width * 3
+        row = [tuple(_TO_LINEAR[c] for c in data[o:o + 3]) for o in range(start, start + width * 3, 3)]
+        rows.append([tuple(sum(b * p[c] for b, p in zip(basis, row)) for c in range(3)) for basis in cos_x])
+    factors = []
+    for j in range(ny):
+        for i in range(nx):
+            norm = (1 if i == 0 and j == 0 else 2) / (width * height)
+            factors.append(tuple(norm * sum(cos_y[j][y] * rows[y][i][c] for y in range(height))
+                                 for c in range(3)))
+    return factors
+
+def blurhash(img, nx=4, ny=3):
+    """
+    BlurHash of an RGB image (which should already be small: cost is
+    pixels x components). Uses numpy when it is installed.
+    """
+    factors = (_factors_numpy if np is not None else _factors_python)(img, nx, ny)
+    dc, ac = factors[0], factors[1:]
+    result = _base83((nx - 1) + (ny - 1) * 9, 1)
+    if ac:
+        actual_max = max(abs(v) for factor in ac for v in factor)
+        quantised_max = int(max(0, min(82, math.floor(actual_max * 166 - 0.5))))
+        max_value = (quantised_max + 1) / 166
+        result += _base83(quantised_max, 1)
+    else:
+        max_value = 1
+        result += _base83(0, 1)
+    r, g, b = (_to_srgb(v) for v in dc)
+    result += _base83((r << 16) + (g << 8) + b, 4)
+    for factor in ac:
+        q = [int(max(0, min(18, math.floor(_sign_pow(v / max_value, 0.5) * 9 + 9.5)))) for v in factor]
+        result += _base83(q[0] * 19 * 19 + q[1] * 19 + q[2], 2)
+    return result
+
+def dominant_color(img, colors=5):
+    """
+    Most frequent colour of a small RGB image after quantizing, ignoring the
+    white backdrop the normalized assets sit on unless nothing else is left.
+    """
+    quantized = img.quantize(colors)
+    palette = quantized.getpalette()
+    ranked = sorted(quantized.getcolors(), reverse=True)
+    for _, index in ranked:
+        rgb = tuple(palette[index * 3:index * 3 + 3])
+        if min(rgb) < 235:
+            break
+    else:
+        rgb = tuple(palette[ranked[0][1] * 3:ranked[0][1] * 3 + 3])
+    return '#%02x%02x%02x' % rgb
+
+def components_for(size, components=PLACEHOLDER_COMPONENTS):
+    """
+    Components along (x, y): the longer side gets components, the shorter
+    side proportionally fewer (at least 3, or components if that is less),
+    so tall clothes stay tall and components=1 is still a single colour.
+    """
+    width, height = size
+    short = min(components, max(3, round(components * min(width, height) / max(width, height))))
+    return (components, short) if width >= height else (short, components)
+
+def _placeholder_task(task):
+    """
+    Process-pool worker: decode one image at reduced size and compute its placeholder.
+    Returns (source, entry, error).
+    """
+    path, components, sample, thumb = task
+    try:
+        with Image.open(path) as img:
+            size = img.size
+            # JPEG decodes straight to a fraction of the size
+            img.draft('RGB', (sample, sample))
+            if img.mode in ('RGBA', 'LA', 'P'):
+                # What the player sees: transparency over the white page
+                img = img.convert('RGBA')
+                flat = Image.new('RGB', img.size, (255, 255, 255))
+                flat.paste(img, mask=img.getchannel('A'))
+                img = flat
+            else:
+                img = img.convert('RGB')
+            img.thumbnail((sample, sample), Image.Resampling.BOX)
+        nx, ny = components_for(size, components)
+        entry = {'w': size[0], 'h': size[1], 'blurhash': blurhash(img, nx, ny), 'color': dominant_color(img)}
+        if thumb:
+            small = img.copy()
+            small.thumbnail((thumb, thumb), Image.Resampling.LANCZOS)
+            out = io.BytesIO()
+            small.save(out, 'WEBP', quality=40)
+            entry['thumb'] = 'data:image/webp;base64,' + base64.b64encode(out.getvalue()).decode('ascii')
+    except Exception as e:
+        return path, None, str(e)
+    return path, entry, None
+
+def _url(path):
+    return '/' + os.path.relpath(path, PUBLIC_DIR).replace(os.sep, '/')
+
+def _scan(directories):
+    sources = []
+    for rel_dir in directories:
+        directory = os.path.join(PUBLIC_DIR, *rel_dir.split('/'))
+        if not os.path.isdir(directory):
+            print(f"Directory does not exist: {directory}")
+            continue
+        with os.scandir(directory) as it:
+            sources.extend(sorted(d.path for d in it if d.is_file()
+                                  and d.name.lower().endswith(('.png', '.jpg', '.jpeg', '.webp'))
+                                  and not FINGERPRINTED.search(d.name)))
+    return sources
+
+def render_module(manifest):
+    """
+    TypeScript module with the placeholders, so the UI can paint them
+    before any image request is made.
+    """
+    lines = [MODULE_HEADER,
+             "export interface AssetPlaceholder {\n  w: number;\n  h: number;\n  blurhash: string;\n"
+             "  color: string;\n  thumb?: string;\n}\n\n",
+             "export const PLACEHOLDERS: Record<string, AssetPlaceholder> = {\n"]
+    for url, entry in sorted(manifest.items()):
+        value = json.dumps(entry, ensure_ascii=False, sort_keys=True)
+        lines.append(f"  {json.dumps(url, ensure_ascii=False)}: {value},\n")
+    lines.append("};\n\n")
+    lines.append("export function placeholderFor(path: string): AssetPlaceholder | undefined {\n")
+    lines.append("  return PLACEHOLDERS[path];\n")
+    lines.append("}\n")
+    return ''.join(lines)
+
+def build_placeholders(directories=None, components=PLACEHOLDER_COMPONENTS, sample=PLACEHOLDER_SAMPLE,
+                       thumb=PLACEHOLDER_THUMB, jobs=1, use_cache=True, manifest_path=PLACEHOLDER_MANIFEST,
+                       module_path=PLACEHOLDER_MODULE):
+    """
+    Compute placeholders for every image that changed and write the JSON
+    manifest (and TS module when module_path is set). Returns the failures.
+    """
+    params = {'components': components, 'sample': sample, 'thumb': thumb, 'version': 1}
+    cache = AssetManifest(PLACEHOLDER_CACHE)
+    sources = _scan(directories or PLACEHOLDER_DIRECTORIES)
+    keys = {_url(path): path for path in sources}
+    cache.prune(set(keys))
+
+    manifest = {}
+    tasks = []
+    for key, path in keys.items():
+        entry = cache.get(key)
+        if use_cache and entry is not None and cache.is_fresh(key, path, params):
+            manifest[key] = entry['data']
+        else:
+            tasks.append((path, components, sample, thumb))
+    print(f"{len(sources) - len(tasks)} up to date, {len(tasks)} to compute"
+          + ('' if np is not None else ' (numpy not installed, using pure Python)'))
+
+    failures = []
+    try:
+        for source_path, entry, error in iter_results(_placeholder_task, tasks, jobs):
+            if error is not None:
+                print(f"Error processing {source_path}: {error}")
+                failures.append((source_path, error))
+                continue
+            key = _url(source_path)
+            manifest[key] = entry
+            cache.record(key, source_path, params, {}, data=entry)
+    finally:
+        cache.save()
+
+    if write_if_changed(manifest_path, json.dumps(manifest, ensure_ascii=False, indent=1, sort_keys=True) + '\n'):
+        print(f"Manifest written: {manifest_path} ({len(manifest)} assets)")
+    if module_path and write_if_changed(module_path, render_module(manifest)):
+        print(f"Module written: {module_path}")
+    return failures
+
+def main():
+    parser = argparse.ArgumentParser(description="Compute BlurHash/dominant-colour placeholders for public images")
+    parser.add_argument('--components', type=int, default=PLACEHOLDER_COMPONENTS,
+                        help="BlurHash components along the longer side (1-9)")
+    parser.add_argument('--sample', type=int, default=PLACEHOLDER_SAMPLE, help="downscale to this size before hashing")
+    parser.add_argument('--thumb', type=int, default=PLACEHOLDER_THUMB,
+                        help="also embed a base64 WebP thumbnail of this size (0 = off)")
+    parser.add_argument('--no-module', action='store_true', help="only write the JSON manifest")
+    parser.add_argument('-j', '--jobs', type=int, default=os.cpu_count() or 1,
+                        help="worker processes to use (1 = serial, default: all cores)")
+    parser.add_argument('--force', action='store_true', help="recompute every placeholder")
+    args = parser.parse_args()
+
+    if not 1 <= args.components <= 9:
+        parser.error("--components must be between 1 and 9")
+    failures = build_placeholders(components=args.components, sample=args.sample, thumb=args.thumb,
+                                  jobs=args.jobs, use_cache=not args.force,
+                                  module_path=None if args.no_module else PLACEHOLDER_MODULE)
+    if failures:
+        sys.exit(1)
+
+if __name__ == "__main__":
+    main()
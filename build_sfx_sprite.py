@@ -0,0 +1,161 @@
+import io
+import os
+import json
+import argparse
+import sys
+import wave
+from array import array
+from asset_cache import AssetManifest, atomic_write_bytes, bytes_digest
+from asset_config import (PUBLIC_DIR, SFX_CACHE, SFX_CHANNELS, SFX_DIR, SFX_GAP_MS, SFX_MANIFEST,
+                          SFX_SAMPLE_RATE, SFX_SPRITE)
+
+def read_wav(path):
+    """
+    Decode a PCM WAV file into (mono float samples in -1..1, sample rate).
+    Channels are averaged; 8/16/24/32-bit integer PCM is supported.
+    """
+    with wave.open(path, 'rb') as w:
+        channels, width, rate = w.getnchannels(), w.getsampwidth(), w.getframerate()
+        raw = w.readframes(w.getnframes())
+    if width == 1:
+        # 8-bit WAV is unsigned
+        values = [b - 128 for b in raw]
+        scale = 128.0
+    elif width == 3:
+        values = [int.from_bytes(raw[i:i + 3], 'little', signed=True) for i in range(0, len(raw), 3)]
+        scale = float(1 << 23)
+    else:
+        values = array({2: 'h', 4: 'i'}[width])
+        values.frombytes(raw)
+        if sys.byteorder == 'big':
+            values.byteswap()
+        scale = float(1 << (8 * width - 1))
+    if channels == 1:
+        return [v / scale for v in values], rate
+    mix = scale * channels
+    return [sum(values[i:i + channels]) / mix for i in range(0, len(values), channels)], rate
+
+def resample(samples, src_rate, dst_rate):
+    """
+    Change the sample rate: box-filter averaging when shrinking (a cheap
+    low-pass against aliasing), linear interpolation when growing.
+    """
+    if src_rate == dst_rate or not samples:
+        return list(samples)
+    ratio = src_rate / dst_rate
+    count = max(1, int(len(samples) / ratio))
+    last = len(samples) - 1
+    out = []
+    if ratio > 1:
+        for i in range(count):
+            start = int(i * ratio)
+            end = min(len(samples), max(start + 1, int((i + 1) * ratio)))
+            out.append(sum(samples[start:end]) / (end - start))
+    else:
+        for i in range(count):
+            t = i * ratio
+            j = int(t)
+            k = min(j + 1, last)
+            out.append(samples[j] + (samples[k] - samples[j]) * (t - j))
+    return out
+
+def _pcm16(samples):
+    pcm = array('h', (max(-32768, min(32767, round(s * 32767))) for s in samples))
+    if sys.byteorder == 'big':
+        pcm.byteswap()
+    return pcm
+
+def build_sprite(sounds, sample_rate=SFX_SAMPLE_RATE, channels=SFX_CHANNELS, gap_ms=SFX_GAP_MS):
+    """
+    Concatenate sounds (list of WAV paths) with silence between them.
+    Returns (wav bytes, {file name: {'start', 'duration'}} in seconds).
+    """
+    gap = [0.0] * (sample_rate * gap_ms // 1000)
+    samples = []
+    offsets = {}
+    for path in sounds:
+        data, rate = read_wav(path)
+        data = resample(data, rate, sample_rate)
+        offsets[os.path.basename(path)] = {
+            'start': round(len(samples) / sample_rate, 4),
+            'duration': round(len(data) / sample_rate, 4),
+        }
+        samples.extend(data)
+        samples.extend(gap)
+    pcm = _pcm16(samples)
+    if channels > 1:
+        # Same signal on every channel; mono sources gain nothing from more
+        pcm = array('h', (v for v in pcm for _ in range(channels)))
+
+    out = io.BytesIO()
+    with wave.open(out, 'wb') as w:
+        w.setnchannels(channels)
+        w.setsampwidth(2)
+        w.setframerate(sample_rate)
+        w.writeframes(pcm.tobytes())
+    return out.getvalue(), offsets
+
+def _sounds(sfx_dir, sprite_path):
+    sprite_path = os.path.abspath(sprite_path)
+    with os.scandir(sfx_dir) as it:
+        return sorted(os.path.abspath(d.path) for d in it if d.is_file() and d.name.lower().endswith('.wav')
+                      and os.path.abspath(d.path) != sprite_path)
+
+def _url(path):
+    return '/' + os.path.relpath(path, PUBLIC_DIR).replace(os.sep, '/')
+
+def build_sfx_sprite(sfx_dir=SFX_DIR, sprite_path=SFX_SPRITE, manifest_path=SFX_MANIFEST,
+                     sample_rate=SFX_SAMPLE_RATE, channels=SFX_CHANNELS, gap_ms=SFX_GAP_MS,
+                     use_cache=True, cache_path=SFX_CACHE):
+    """
+    Rebuild the sprite and its offset manifest when any input WAV changed.
+    Returns True when files were written.
+    """
+    sounds = _sounds(sfx_dir, sprite_path)
+    if not sounds:
+        print(f"No WAV files in {sfx_dir}")
+        return False
+    params = {'sample_rate': sample_rate, 'channels': channels, 'gap_ms': gap_ms}
+    cache = AssetManifest(cache_path)
+    keys = {cache.key_for(p) for p in sounds}
+    if (use_cache and set(cache.entries) == keys
+            and all(cache.is_fresh(cache.key_for(p), p, params) for p in sounds)):
+        print(f"Up to date: {sprite_path} ({len(sounds)} sounds)")
+        cache.save()
+        return False
+
+    data, offsets = build_sprite(sounds, sample_rate, channels, gap_ms)
+    atomic_write_bytes(sprite_path, data)
+    manifest = {'src': _url(sprite_path), 'sampleRate': sample_rate, 'channels': channels,
+                'sprites': offsets}
+    atomic_write_bytes(manifest_path, json.dumps(manifest, ensure_ascii=False, indent=1).encode('utf-8'))
+
+    before = sum(os.path.getsize(p) for p in sounds)
+    outputs = {sprite_path: bytes_digest(data), manifest_path: None}
+    cache.entries = {}
+    for path in sounds:
+        cache.record(cache.key_for(path), path, params, outputs)
+    cache.save()
+    print(f"Packed {len(sounds)} sounds: {before / 1024:.0f} KB -> {len(data) / 1024:.0f} KB ({sprite_path})")
+    return True
+
+def main():
+    parser = argparse.ArgumentParser(description="Pack short sound effects into one audio sprite")
+    parser.add_argument('--input', default=SFX_DIR, help="directory with the source WAV files")
+    parser.add_argument('--output', default=SFX_SPRITE, help="sprite WAV to write")
+    parser.add_argument('--manifest', default=SFX_MANIFEST, help="offset manifest JSON to write")
+    parser.add_argument('--rate', type=int, default=SFX_SAMPLE_RATE, help="sprite sample rate in Hz")
+    parser.add_argument('--channels', type=int, choices=(1, 2), default=SFX_CHANNELS, help="sprite channels")
+    parser.add_argument('--gap', type=int, default=SFX_GAP_MS, help="silence between effects in ms")
+    parser.add_argument('--force', action='store_true', help="rebuild even when no input changed")
+    args = parser.parse_args()
+
+    try:
+        build_sfx_sprite(args.input, os.path.abspath(args.output), args.manifest, args.rate,
+                         args.channels, args.gap, use_cache=not args.force)
+    except (OSError, wave.Error, EOFError) as e:
+        print(f"Error building sprite: {e}")
+        sys.exit(1)
+
+if __name__ == "__main__":
+    main()
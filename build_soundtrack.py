@@ -0,0 +1,345 @@
+import os
+import re
+import json
+import argparse
+import math
+import shutil
+import subprocess
+import sys
+from asset_cache import AssetManifest
+from asset_config import (PUBLIC_DIR, SOUNDTRACK_CACHE, SOUNDTRACK_DIR, SOUNDTRACK_FIRST_SEGMENT_SECONDS,
+                          SOUNDTRACK_LOW_BITRATE, SOUNDTRACK_MANIFEST, SOUNDTRACK_MAX_CUT_DB, SOUNDTRACK_MODULE,
+                          SOUNDTRACK_SEEK_INTERVAL, SOUNDTRACK_SEGMENT_SECONDS)
+from asset_variants import VARIANTS_DIRNAME
+from fingerprint_assets import write_if_changed
+from normalize_images import iter_results
+from asset_paths import FINGERPRINTED
+from verify_assets import id3v2_size, mp3_frames
+
+MODULE_HEADER = "// Auto-generated by build_soundtrack.py — do not edit, run it again to regenerate\n"
+
+# Layer III side information after the header (and CRC): (MPEG-1, mono) -> bytes
+SIDE_INFO_SIZES = {(True, False): 32, (True, True): 17, (False, False): 17, (False, True): 9}
+# Encoders that write the LAME extension after the Xing/Info fields (ffmpeg via libmp3lame)
+LAME_ENCODERS = (b'LAME', b'Lavc', b'Lavf', b'L3.9')
+
+def _side_info(data, offset, header):
+    """
+    (side information as an int, its width in bits, offset just after it)
+    for the Layer III frame at offset.
+    """
+    # Protection bit 0 means a 16-bit CRC follows the header
+    start = offset + 4 + (0 if data[offset + 1] & 1 else 2)
+    size = SIDE_INFO_SIZES[(header['version'] == 1, header['channels'] == 1)]
+    return int.from_bytes(data[start:start + size], 'big'), size * 8, start + size
+
+def read_info_tag(data, offset, header):
+    """
+    The Xing/Info frame that LAME and ffmpeg put first: frame count and,
+    from the LAME extension, encoder delay/padding, peak amplitude and
+    radio ReplayGain (dB). None when the first frame is plain audio.
+    """
+    if header['layer'] != 3:
+        return None
+    _, _, pos = _side_info(data, offset, header)
+    tag = data[pos:offset + header['length']]
+    if tag[:4] not in (b'Xing', b'Info'):
+        return None
+    flags = int.from_bytes(tag[4:8], 'big')
+    info = {'frames': None, 'delay': 0, 'padding': 0, 'peak': None, 'replay_gain': None}
+    p = 8
+    if flags & 1:
+        info['frames'] = int.from_bytes(tag[p:p + 4], 'big')
+        p += 4
+    # Byte count, 100-entry TOC, quality
+    p += (4 if flags & 2 else 0) + (100 if flags & 4 else 0) + (4 if flags & 8 else 0)
+    lame = tag[p:p + 36]
+    if len(lame) < 24 or not lame.startswith(LAME_ENCODERS):
+        return info
+    # Peak is fixed point with 23 fractional bits; 0 means "not computed"
+    peak = int.from_bytes(lame[11:15], 'big')
+    if peak:
+        info['peak'] = round(peak / (1 << 23), 4)
+    radio = int.from_bytes(lame[15:17], 'big')
+    if radio >> 13 == 1:
+        info['replay_gain'] = (radio & 0x1ff) / 10 * (-1 if radio & 0x200 else 1)
+    info['delay'] = lame[21] << 4 | lame[22] >> 4
+    info['padding'] = (lame[22] & 0x0f) << 8 | lame[23]
+    return info
+
+def index_track(path, seek_interval=SOUNDTRACK_SEEK_INTERVAL, segment_seconds=SOUNDTRACK_SEGMENT_SECONDS,
+                first_segment_seconds=SOUNDTRACK_FIRST_SEGMENT_SECONDS):
+    """
+    Walk the frame headers of one MP3 and describe it for streaming:
+    duration, bitrate, the byte offset every seek_interval seconds, and
+    frame-aligned segments [start s, first byte, end byte) of about
+    segment_seconds (the first one first_segment_seconds). Segments cover
+    the audio frames only: no ID3 tag (cover art) and no Info frame.
+    Loudness is only what the LAME tag records (ReplayGain, peak); headers
+    alone cannot tell how loud a track is.
+    """
+    with open(path, 'rb') as f:
+        data = f.read()
+    frames = list(mp3_frames(data, id3v2_size(data[:10])))
+    if not frames:
+        raise ValueError("no MPEG audio frames")
+    info = read_info_tag(data, *frames[0])
+    if info is not None:
+        frames = frames[1:]
+    if not frames:
+        raise ValueError("only an Info frame, no audio")
+    first = frames[0][1]
+    frame_seconds = first['samples'] / first['sample_rate']
+    audio_start = frames[0][0]
+    audio_end = frames[-1][0] + frames[-1][1]['length']
+    delay = info['delay'] if info else 0
+    padding = info['padding'] if info else 0
+
+    seek = [frames[min(len(frames) - 1, int(k * seek_interval / frame_seconds))][0]
+            for k in range(math.ceil(len(frames) * frame_seconds / seek_interval))]
+    bounds = [0]
+    next_time = first_segment_seconds
+    while True:
+        index = math.ceil(next_time / frame_seconds - 1e-9)
+        if index >= len(frames):
+            break
+        bounds.append(index)
+        next_time += segment_seconds
+    segments = [[round(start * frame_seconds, 3), frames[start][0],
+                 frames[end][0] if end < len(frames) else audio_end]
+                for start, end in zip(bounds, bounds[1:] + [len(frames)])]
+    return {
+        'bytes': len(data),
+        'audio_start': audio_start,
+        'audio_end': audio_end,
+        'duration': round((len(frames) * first['samples'] - delay - padding) / first['sample_rate'], 3),
+        'bitrate': round((audio_end - audio_start) * 8 / (len(frames) * frame_seconds) / 1000),
+        'vbr': len({header['bitrate'] for _, header in frames}) > 1,
+        'sample_rate': first['sample_rate'],
+        'channels': first['channels'],
+        'frames': len(frames),
+        'delay': delay,
+        'padding': padding,
+        'start_bytes': segments[0][2],
+        'seek': seek,
+        'segments': segments,
+        'loudness': {
+            'lufs': None,
+            'true_peak_db': None,
+            'replay_gain': info['replay_gain'] if info else None,
+            'peak': info['peak'] if info else None,
+        },
+    }
+
+def _ebur128_value(summary, label, unit):
+    match = re.search(r"%s:\s+(-?[\d.]+|-inf) %s" % (label, unit), summary)
+    if match is None or match.group(1) == '-inf':
+        return None
+    return float(match.group(1))
+
+def measure_loudness(ffmpeg, path):
+    """
+    (integrated loudness in LUFS, true peak in dBTP) from a full decode
+    through ffmpeg's EBU R128 filter; None for silence.
+    """
+    result = subprocess.run([ffmpeg, '-hide_banner', '-nostats', '-i', path, '-map', '0:a:0',
+                             '-af', 'ebur128=peak=true', '-f', 'null', '-'],
+                            check=True, capture_output=True, text=True)
+    summary = result.stderr[result.stderr.rfind('Summary:'):]
+    return _ebur128_value(summary, 'I', 'LUFS'), _ebur128_value(summary, 'Peak', 'dBFS')
+
+def low_bitrate_path(source_path, bitrate):
+    directory, name = os.path.split(source_path)
+    return os.path.join(directory, VARIANTS_DIRNAME, f"{os.path.splitext(name)[0]}-{bitrate}k.mp3")
+
+def encode_low_bitrate(ffmpeg, source_path, bitrate):
+    """
+    CBR re-encode for slow connections, without tags or cover art.
+    """
+    out_path = low_bitrate_path(source_path, bitrate)
+    os.makedirs(os.path.dirname(out_path), exist_ok=True)
+    tmp_path = f"{out_path}.tmp{os.getpid()}.mp3"
+    try:
+        subprocess.run([ffmpeg, '-v', 'error', '-y', '-i', source_path, '-map', '0:a:0', '-map_metadata', '-1',
+                        '-c:a', 'libmp3lame', '-b:a', f"{bitrate}k", tmp_path],
+                       check=True, capture_output=True, text=True)
+        os.replace(tmp_path, out_path)
+    finally:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+    return out_path
+
+def _url(path):
+    return '/' + os.path.relpath(path, PUBLIC_DIR).replace(os.sep, '/')
+
+def _soundtrack_task(task):
+    """
+    Process-pool worker: index one track, measure it with ffmpeg when
+    available (and make its low-bitrate copy). Returns (source, entry, outputs, error).
+    """
+    path, settings, ffmpeg, low_bitrate = task
+    try:
+        entry = index_track(path, **settings)
+        outputs = {}
+        if ffmpeg:
+            entry['loudness']['lufs'], entry['loudness']['true_peak_db'] = measure_loudness(ffmpeg, path)
+        if ffmpeg and low_bitrate:
+            low_path = encode_low_bitrate(ffmpeg, path, low_bitrate)
+            low = index_track(low_path, **settings)
+            entry['low'] = {key: low[key] for key in ('bytes', 'duration', 'bitrate', 'start_bytes', 'seek',
+                                                      'segments')}
+            entry['low']['url'] = _url(low_path)
+            outputs[low_path] = None
+    except subprocess.CalledProcessError as e:
+        return path, None, None, f"ffmpeg failed: {e.stderr.strip() or e.returncode}"
+    except (OSError, ValueError) as e:
+        return path, None, None, str(e)
+    return path, entry, outputs, None
+
+def level_tracks(tracks, max_cut=SOUNDTRACK_MAX_CUT_DB):
+    """
+    ({url: (gain dB, volume)}, level source) bringing every track down to
+    the quietest one, by at most max_cut dB (only attenuation:
+    HTMLAudioElement.volume stops at 1). Levels come from the EBU R128
+    measurement, or from ReplayGain when every track carries it; without
+    either, every track keeps gain 0 / volume 1 and the source is None.
+    """
+    levels = None
+    source = None
+    if tracks and all(t['loudness']['lufs'] is not None for t in tracks.values()):
+        levels = {url: t['loudness']['lufs'] for url, t in tracks.items()}
+        source = 'ebur128'
+    elif tracks and all(t['loudness']['replay_gain'] is not None for t in tracks.values()):
+        levels = {url: -t['loudness']['replay_gain'] for url, t in tracks.items()}
+        source = 'replay_gain'
+    quietest = min(levels.values()) if levels else 0.0
+    gains = {}
+    for url in tracks:
+        gain = max(-max_cut, quietest - levels[url]) if levels else 0.0
+        gains[url] = (round(gain, 2), round(10 ** (gain / 20), 3))
+    return gains, source
+
+def render_module(manifest):
+    """
+    TypeScript module with the soundtrack index, so the player can fetch
+    the first segment by Range and start before the rest has arrived.
+    """
+    lines = [MODULE_HEADER,
+             "/** [start seconds, first byte, end byte (exclusive)] */\n",
+             "export type SoundtrackSegment = [number, number, number];\n\n",
+             "export interface SoundtrackStream {\n  bytes: number;\n  duration: number;\n  bitrate: number;\n"
+             "  start_bytes: number;\n  seek: number[];\n  segments: SoundtrackSegment[];\n}\n\n",
+             "export interface SoundtrackTrack extends SoundtrackStream {\n  audio_start: number;\n"
+             "  audio_end: number;\n  vbr: boolean;\n  sample_rate: number;\n  channels: number;\n  frames: number;\n"
+             "  delay: number;\n  padding: number;\n  gain_db: number;\n  volume: number;\n"
+             "  loudness: { lufs: number | null; true_peak_db: number | null; replay_gain: number | null;"
+             " peak: number | null };\n  low?: SoundtrackStream & { url: string };\n}\n\n",
+             f"export const SEEK_INTERVAL = {json.dumps(manifest['seek_interval'])};\n\n",
+             "export const SOUNDTRACK: Record<string, SoundtrackTrack> = {\n"]
+    for url, track in sorted(manifest['tracks'].items()):
+        value = json.dumps(track, ensure_ascii=False, sort_keys=True)
+        lines.append(f"  {json.dumps(url, ensure_ascii=False)}: {value},\n")
+    lines.append("};\n\n")
+    lines.append("/** Byte offset of the frame playing at `seconds`, for a Range request. */\n")
+    lines.append("export function byteOffsetAt(path: string, seconds: number): number | undefined {\n")
+    lines.append("  const track = SOUNDTRACK[path];\n")
+    lines.append("  if (!track) return undefined;\n")
+    lines.append("  const index = Math.max(0, Math.min(track.seek.length - 1, Math.floor(seconds / SEEK_INTERVAL)));\n")
+    lines.append("  return track.seek[index];\n")
+    lines.append("}\n")
+    return ''.join(lines)
+
+def _scan(directory):
+    if not os.path.isdir(directory):
+        print(f"Directory does not exist: {directory}")
+        return []
+    with os.scandir(directory) as it:
+        return sorted(d.path for d in it if d.is_file() and d.name.lower().endswith('.mp3')
+                      and not FINGERPRINTED.search(d.name))
+
+def build_soundtrack(directory=SOUNDTRACK_DIR, seek_interval=SOUNDTRACK_SEEK_INTERVAL,
+                     segment_seconds=SOUNDTRACK_SEGMENT_SECONDS, first_segment_seconds=SOUNDTRACK_FIRST_SEGMENT_SECONDS,
+                     low_bitrate=SOUNDTRACK_LOW_BITRATE, jobs=1, use_cache=True, manifest_path=SOUNDTRACK_MANIFEST,
+                     module_path=SOUNDTRACK_MODULE):
+    """
+    Index every track whose content changed, then write the JSON manifest
+    (and TS module when module_path is set). Loudness measurement and
+    low-bitrate copies need ffmpeg on PATH. Returns the failures.
+    """
+    ffmpeg = shutil.which('ffmpeg')
+    settings = {'seek_interval': seek_interval, 'segment_seconds': segment_seconds,
+                'first_segment_seconds': first_segment_seconds}
+    # Installing ffmpeg later re-indexes everything, now with measured loudness
+    params = dict(settings, ffmpeg=bool(ffmpeg), low_bitrate=low_bitrate if ffmpeg else None, version=2)
+    cache = AssetManifest(SOUNDTRACK_CACHE)
+    sources = _scan(directory)
+    keys = {_url(path): path for path in sources}
+    for path in cache.prune(set(keys)):
+        # Track was deleted or renamed: its low-bitrate copy should not ship any more
+        if os.path.exists(path):
+            os.remove(path)
+
+    tracks = {}
+    tasks = []
+    for key, path in keys.items():
+        entry = cache.get(key)
+        if use_cache and entry is not None and cache.is_fresh(key, path, params):
+            tracks[key] = entry['data']
+        else:
+            tasks.append((path, settings, ffmpeg, low_bitrate))
+    print(f"{len(sources) - len(tasks)} up to date, {len(tasks)} to index"
+          + ('' if ffmpeg else ' (ffmpeg not found: no loudness levelling, no low-bitrate copies)'))
+
+    failures = []
+    try:
+        for source_path, entry, outputs, error in iter_results(_soundtrack_task, tasks, jobs):
+            if error is not None:
+                print(f"Error processing {source_path}: {error}")
+                failures.append((source_path, error))
+                continue
+            key = _url(source_path)
+            tracks[key] = entry
+            cache.record(key, source_path, params, outputs, data=entry)
+            minutes, seconds = divmod(round(entry['duration']), 60)
+            print(f"Indexed: {key} ({minutes}:{seconds:02d}, {entry['bitrate']} kbit/s "
+                  f"{'VBR' if entry['vbr'] else 'CBR'}, {len(entry['segments'])} segments, "
+                  f"first {(entry['start_bytes'] - entry['audio_start']) // 1024} KB)")
+    finally:
+        cache.save()
+
+    gains, source = level_tracks(tracks)
+    manifest = {'seek_interval': seek_interval, 'loudness_source': source, 'tracks': {}}
+    for key, track in tracks.items():
+        manifest['tracks'][key] = dict(track, gain_db=gains[key][0], volume=gains[key][1])
+    if write_if_changed(manifest_path, json.dumps(manifest, ensure_ascii=False, indent=1, sort_keys=True) + '\n'):
+        print(f"Manifest written: {manifest_path} ({len(tracks)} tracks)")
+    if module_path and write_if_changed(module_path, render_module(manifest)):
+        print(f"Module written: {module_path}")
+    return failures
+
+def main():
+    parser = argparse.ArgumentParser(description="Index the soundtrack for streaming: seek table, segments, loudness")
+    parser.add_argument('--seek-interval', type=float, default=SOUNDTRACK_SEEK_INTERVAL,
+                        help="seconds between seek table entries")
+    parser.add_argument('--segment', type=float, default=SOUNDTRACK_SEGMENT_SECONDS, help="segment length in seconds")
+    parser.add_argument('--first-segment', type=float, default=SOUNDTRACK_FIRST_SEGMENT_SECONDS,
+                        help="length of the first segment (what has to arrive before playback)")
+    parser.add_argument('--low-bitrate', type=int, default=SOUNDTRACK_LOW_BITRATE,
+                        help="kbit/s of the ffmpeg low-bitrate copies (0 = none)")
+    parser.add_argument('--no-module', action='store_true', help="only write the JSON manifest")
+    parser.add_argument('-j', '--jobs', type=int, default=os.cpu_count() or 1,
+                        help="worker processes to use (1 = serial, default: all cores)")
+    parser.add_argument('--force', action='store_true', help="re-index every track")
+    args = parser.parse_args()
+
+    if min(args.seek_interval, args.segment, args.first_segment) <= 0:
+        parser.error("--seek-interval, --segment and --first-segment must be positive")
+    failures = build_soundtrack(seek_interval=args.seek_interval, segment_seconds=args.segment,
+                                first_segment_seconds=args.first_segment, low_bitrate=args.low_bitrate,
+                                jobs=args.jobs, use_cache=not args.force,
+                                module_path=None if args.no_module else SOUNDTRACK_MODULE)
+    if failures:
+        sys.exit(1)
+
+if __name__ == "__main__":
+    main()
@@ -1,86 +1,233 @@
 import os
-import glob
+import json
+import argparse
+import shutil
+import sys
+import time
+from asset_config import CLEANUP_TRASH, load_directories
+
+IMAGE_EXTENSIONS = ['.jpg', '.jpeg', '.png', '.gif', '.bmp', '.tiff', '.webp']
+NORMALIZED_SUFFIX = '_normalized'
+PLAN_VERSION = 2
+
+def index_directory(directory):
+    """
+    One os.scandir pass: {stem: {extension: (path, size, mtime_ns)}} for the
+    images in directory, so sibling lookups are dict hits instead of stats.
+    """
+    index = {}
+    with os.scandir(directory) as it:
+        for dirent in it:
+            stem, ext = os.path.splitext(dirent.name)
+            if ext.lower() not in IMAGE_EXTENSIONS or not dirent.is_file():
+                continue
+            st = dirent.stat()
+            index.setdefault(stem, {})[ext] = (dirent.path, st.st_size, st.st_mtime_ns)
+    return index
+
+def _action(action, entry, reason, **extra):
+    path, size, mtime_ns = entry
+    return dict({'action': action, 'path': path, 'size': size, 'mtime_ns': mtime_ns, 'reason': reason}, **extra)
+
+def _first(variants):
+    # Same preference order the extension list has always had
+    for ext in sorted(variants, key=lambda e: IMAGE_EXTENSIONS.index(e.lower())):
+        return ext, variants[ext]
+
+def plan_directory(directory, rename=False):
+    """
+    Decide, without touching anything, what happens to every image in directory.
+    Originals with a normalized sibling are deleted; with rename=True the
+    normalized file then takes over the plain name.
+    """
+    index = index_directory(directory)
+    actions = []
+    for stem in sorted(index):
+        variants = index[stem]
+        if stem.endswith(NORMALIZED_SUFFIX):
+            plain = stem[:-len(NORMALIZED_SUFFIX)]
+            for ext, entry in sorted(variants.items()):
+                if not rename:
+                    actions.append(_action('keep', entry, 'normalized version'))
+                    continue
+                # An original under the plain name is always deleted first, so the name is free
+                reason = 'replaces the deleted original' if ext in index.get(plain, {}) else 'takes the plain name'
+                actions.append(_action('rename', entry, reason, target=os.path.join(directory, plain + ext)))
+            continue
+        normalized = index.get(stem + NORMALIZED_SUFFIX)
+        for ext, entry in sorted(variants.items()):
+            if normalized:
+                norm_ext, (norm_path, norm_size, norm_mtime_ns) = _first(normalized)
+                # The sibling is what makes the delete safe; apply_plan checks it again
+                sibling = {'path': norm_path, 'size': norm_size, 'mtime_ns': norm_mtime_ns}
+                actions.append(_action('delete', entry, f"{stem}{NORMALIZED_SUFFIX}{norm_ext} exists",
+                                       sibling=sibling))
+            else:
+                actions.append(_action('keep', entry, 'no normalized version'))
+    return actions
+
+def plan_cleanup(directories, rename=False):
+    """
+    Build a reviewable, JSON-serializable cleanup plan for directories.
+    """
+    actions = []
+    for directory in directories:
+        if not os.path.isdir(directory):
+            print(f"Directory does not exist: {directory}")
+            continue
+        actions.extend(plan_directory(directory, rename))
+    totals = {}
+    for action in actions:
+        total = totals.setdefault(action['action'], {'files': 0, 'bytes': 0})
+        total['files'] += 1
+        total['bytes'] += action['size']
+    return {'version': PLAN_VERSION, 'created': time.strftime('%Y-%m-%dT%H:%M:%S'),
+            'directories': list(directories), 'actions': actions, 'totals': totals}
+
+def _unchanged(action):
+    try:
+        st = os.stat(action['path'])
+    except OSError:
+        return False
+    return st.st_size == action['size'] and st.st_mtime_ns == action['mtime_ns']
+
+def _sibling_intact(action):
+    """
+    True if the normalized sibling that justified a delete is still there,
+    non-empty and exactly as it was when the plan was made.
+    """
+    sibling = action['sibling']
+    return sibling['size'] > 0 and _unchanged(sibling)
+
+def _move(src, dst):
+    try:
+        os.replace(src, dst)
+    except OSError:
+        # Trash on another filesystem
+        shutil.move(src, dst)
+
+def apply_plan(plan, trash_dir=CLEANUP_TRASH):
+    """
+    Carry out a plan: deletions first (moved into a fresh batch folder under
+    trash_dir, or removed for good when trash_dir is None), then renames.
+    Files changed since planning are skipped, and so is a delete whose
+    normalized sibling is gone or changed. Returns the journal.
+    """
+    if plan.get('version') != PLAN_VERSION:
+        raise ValueError(f"Unsupported plan version: {plan.get('version')}")
+    batch_dir = None
+    if trash_dir is not None:
+        batch_dir = os.path.join(trash_dir, time.strftime('%Y%m%d-%H%M%S') + f"-{os.getpid()}")
+        os.makedirs(batch_dir)
+    journal = {'version': PLAN_VERSION, 'batch': batch_dir, 'operations': []}
+    deletes = [a for a in plan['actions'] if a['action'] == 'delete']
+    renames = [a for a in plan['actions'] if a['action'] == 'rename']
+    try:
+        for number, action in enumerate(deletes):
+            if not _unchanged(action):
+                print(f"Skipped (changed since planning): {action['path']}")
+                continue
+            if not _sibling_intact(action):
+                print(f"Skipped (normalized version missing or changed): {action['path']}")
+                continue
+            if batch_dir is None:
+                os.remove(action['path'])
+                journal['operations'].append({'action': 'delete', 'path': action['path']})
+            else:
+                trash_path = os.path.join(batch_dir, f"{number:05d}-{os.path.basename(action['path'])}")
+                _move(action['path'], trash_path)
+                journal['operations'].append({'action': 'delete', 'path': action['path'], 'trash': trash_path})
+            print(f"Deleted: {action['path']}")
+        for action in renames:
+            if not _unchanged(action) or os.path.exists(action['target']):
+                print(f"Skipped rename (changed or target exists): {action['path']}")
+                continue
+            os.replace(action['path'], action['target'])
+            journal['operations'].append({'action': 'rename', 'path': action['path'], 'target': action['target']})
+            print(f"Renamed: {action['path']} -> {os.path.basename(action['target'])}")
+    finally:
+        if batch_dir is not None:
+            # Written even after a failure, so a partial run can still be reversed
+            with open(os.path.join(batch_dir, 'journal.json'), 'w', encoding='utf-8') as f:
+                json.dump(journal, f, ensure_ascii=False, indent=1)
+    return journal
+
+def restore(batch_dir):
+    """
+    Reverse an applied batch from its trash folder: undo renames, then put
+    the deleted files back. Returns the number of files restored.
+    """
+    with open(os.path.join(batch_dir, 'journal.json'), 'r', encoding='utf-8') as f:
+        journal = json.load(f)
+    restored = 0
+    for operation in reversed(journal['operations']):
+        if operation['action'] == 'rename':
+            if os.path.exists(operation['target']) and not os.path.exists(operation['path']):
+                os.replace(operation['target'], operation['path'])
+                restored += 1
+        elif 'trash' in operation:
+            if os.path.exists(operation['trash']) and not os.path.exists(operation['path']):
+                _move(operation['trash'], operation['path'])
+                restored += 1
+            else:
+                print(f"Cannot restore (occupied or missing): {operation['path']}")
+    print(f"Restored {restored} file(s) from {batch_dir}")
+    return restored
+
+def print_plan(plan):
+    for action in plan['actions']:
+        if action['action'] == 'rename':
+            print(f"rename {action['path']} -> {os.path.basename(action['target'])} ({action['reason']})")
+        elif action['action'] == 'delete' or action['reason'] != 'normalized version':
+            print(f"{action['action']} {action['path']} ({action['reason']})")
+    for name, total in sorted(plan['totals'].items()):
+        print(f"  {name}: {total['files']} files, {total['bytes'] / 1024:.0f} KB")
 
 def delete_original_images(directory):
     """
     Delete original images in a directory, keeping only the normalized versions.
     """
-    # Find all image files in the directory
-    image_extensions = ['*.jpg', '*.jpeg', '*.png', '*.gif', '*.bmp', '*.tiff', '*.webp']
-    image_files = []
-    
-    for ext in image_extensions:
-        image_files.extend(glob.glob(os.path.join(directory, ext)))
-    
-    deleted_count = 0
-    
-    for image_path in image_files:
-        filename = os.path.basename(image_path)
-        
-        # Check if it's a normalized version
-        name, ext = os.path.splitext(filename)
-        if name.endswith('_normalized'):
-            # This is a normalized version, keep it
-            continue
-        else:
-            # This is an original file, check if corresponding normalized version exists
-            # We need to check for any normalized version regardless of the original extension
-            name, orig_ext = os.path.splitext(filename)
-            # Look for normalized version with any image extension
-            found_normalized = False
-            for img_ext in ['.jpg', '.jpeg', '.png', '.gif', '.bmp', '.tiff', '.webp']:
-                normalized_name = name + '_normalized' + img_ext
-                normalized_path = os.path.join(directory, normalized_name)
-                if os.path.exists(normalized_path):
-                    # Delete the original file since normalized version exists
-                    os.remove(image_path)
-                    print(f"Deleted: {image_path}")
-                    deleted_count += 1
-                    found_normalized = True
-                    break
-            
-            if not found_normalized:
-                # Check if there's a PNG normalized version specifically
-                normalized_name = name + '_normalized.png'
-                normalized_path = os.path.join(directory, normalized_name)
-                
-                if os.path.exists(normalized_path):
-                    # Delete the original file since normalized version exists
-                    os.remove(image_path)
-                    print(f"Deleted: {image_path}")
-                    deleted_count += 1
-                else:
-                    # No normalized version exists, keep the original
-                    print(f"Kept (no normalized version): {image_path}")
-    
+    plan = plan_cleanup([directory])
+    for action in plan['actions']:
+        if action['action'] == 'keep' and action['reason'] == 'no normalized version':
+            print(f"Kept (no normalized version): {action['path']}")
+    deleted_count = sum(1 for op in apply_plan(plan, trash_dir=None)['operations'] if op['action'] == 'delete')
     print(f"Deleted {deleted_count} original images from {directory}")
     return deleted_count
 
 def main():
-    base_path = r"C:\Users\2ой пользователь\kpop 2 — копия (3)"
-    
-    # Directories to process
-    directories = [
-        os.path.join(base_path, "clothes", "accessory"),
-        os.path.join(base_path, "clothes", "bot"),
-        os.path.join(base_path, "clothes", "shoe"),
-        os.path.join(base_path, "clothes", "top"),
-        os.path.join(base_path, "avatars", "nptnorm"),
-        os.path.join(base_path, "faces", "notnorm"),
-        os.path.join(base_path, "gifts")
-    ]
-    
-    total_deleted = 0
-    
-    for dir_path in directories:
-        if os.path.exists(dir_path):
-            print(f"\nProcessing directory: {dir_path}")
-            deleted_count = delete_original_images(dir_path)
-            total_deleted += deleted_count
-        else:
-            print(f"Directory does not exist: {dir_path}")
-    
-    print(f"\nTotal images deleted: {total_deleted}")
+    parser = argparse.ArgumentParser(description="Plan, apply and undo removal of originals that have a normalized version")
+    parser.add_argument('directories', nargs='*', help="directories to clean (default: pipeline source directories)")
+    parser.add_argument('--rename', action='store_true', help="also give normalized files the original name")
+    parser.add_argument('--plan', help="write the plan to this JSON file for review")
+    parser.add_argument('--apply', metavar='PLAN', help="apply a reviewed plan file")
+    parser.add_argument('--yes', action='store_true', help="plan and apply in one go")
+    parser.add_argument('--restore', metavar='BATCH', help="undo an applied batch from its trash folder")
+    parser.add_argument('--trash', default=CLEANUP_TRASH, help="where deleted files are moved")
+    args = parser.parse_args()
+
+    if args.restore:
+        restore(args.restore)
+        return
+    if args.apply:
+        with open(args.apply, 'r', encoding='utf-8') as f:
+            plan = json.load(f)
+    else:
+        directories = args.directories or [entry['source'] for entry in load_directories()]
+        plan = plan_cleanup(directories, args.rename)
+        print_plan(plan)
+        if args.plan:
+            with open(args.plan, 'w', encoding='utf-8') as f:
+                json.dump(plan, f, ensure_ascii=False, indent=1)
+            print(f"Plan written: {args.plan}")
+        if not args.yes:
+            return
+    try:
+        journal = apply_plan(plan, args.trash)
+    except (OSError, ValueError) as e:
+        print(f"Error applying plan: {e}")
+        sys.exit(1)
+    print(f"\nApplied {len(journal['operations'])} operation(s); undo with --restore {journal['batch']}")
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    main()
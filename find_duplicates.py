@@ -0,0 +1,285 @@
+import os
+import json
+import argparse
+import math
+from PIL import Image
+from asset_cache import AssetManifest, file_digest
+from asset_config import DEDUP_INDEX, DEDUP_MASTERS, DEDUP_ROOTS, PUBLIC_DIR, resolve
+from normalize_images import SUPPORTED_FORMATS, iter_results
+from asset_paths import FINGERPRINTED
+
+# Index parameters; changing them invalidates every cached hash
+HASH_PARAMS = {'hash_size': 8, 'dct_size': 32, 'version': 1}
+
+# 1-D DCT-II basis for the low-frequency corner used by pHash
+_DCT = [[math.cos(math.pi * (2 * x + 1) * u / (2 * HASH_PARAMS['dct_size']))
+         for x in range(HASH_PARAMS['dct_size'])] for u in range(HASH_PARAMS['hash_size'])]
+
+def _bits_to_int(bits):
+    value = 0
+    for bit in bits:
+        value = (value << 1) | bit
+    return value
+
+# The hashes take a grayscale ('L') image, so tobytes() is one value per pixel
+def average_hash(img, size=8):
+    pixels = list(img.resize((size, size), Image.BOX).tobytes())
+    mean = sum(pixels) / len(pixels)
+    return _bits_to_int(p > mean for p in pixels)
+
+def difference_hash(img, size=8):
+    pixels = list(img.resize((size + 1, size), Image.BOX).tobytes())
+    return _bits_to_int(pixels[row * (size + 1) + col] > pixels[row * (size + 1) + col + 1]
+                        for row in range(size) for col in range(size))
+
+def perceptual_hash(img, size=8, dct_size=32):
+    """
+    pHash: sign of the low-frequency DCT coefficients against their median.
+    Only the size x size corner is computed, so pure Python stays cheap.
+    """
+    pixels = list(img.resize((dct_size, dct_size), Image.LANCZOS).tobytes())
+    rows = [pixels[y * dct_size:(y + 1) * dct_size] for y in range(dct_size)]
+    # Rows first (dct_size x size), then columns (size x size)
+    row_dct = [[sum(b * p for b, p in zip(basis, row)) for basis in _DCT] for row in rows]
+    coeffs = [sum(_DCT[v][y] * row_dct[y][u] for y in range(dct_size))
+              for v in range(size) for u in range(size)]
+    low = coeffs[1:]  # The DC term only carries overall brightness
+    median = sorted(low)[len(low) // 2]
+    return _bits_to_int(c > median for c in coeffs)
+
+def hamming(a, b):
+    return bin(a ^ b).count('1')
+
+def _hash_task(path):
+    """
+    Process-pool worker: content hash plus aHash/dHash/pHash of one image.
+    """
+    try:
+        digest = file_digest(path)
+        with Image.open(path) as img:
+            if img.mode in ('RGBA', 'LA', 'P'):
+                # Compare what the player sees: transparency flattened onto white
+                img = img.convert('RGBA')
+                background = Image.new('RGBA', img.size, (255, 255, 255, 255))
+                img = Image.alpha_composite(background, img)
+            gray = img.convert('L')
+            width, height = img.size
+        size = HASH_PARAMS['hash_size']
+        data = {
+            'ahash': f"{average_hash(gray, size):016x}",
+            'dhash': f"{difference_hash(gray, size):016x}",
+            'phash': f"{perceptual_hash(gray, size, HASH_PARAMS['dct_size']):016x}",
+            'width': width,
+            'height': height,
+        }
+    except Exception as e:
+        return path, str(e), None, None
+    return path, None, digest, data
+
+class BKTree:
+    """
+    Burkhard-Keller tree over integer hashes with Hamming distance.
+    Range queries visit only subtrees whose edge distance can still match,
+    so lookups stay well below a full pairwise scan.
+    """
+
+    def __init__(self):
+        self.root = None
+
+    def add(self, value, item):
+        node = self.root
+        if node is None:
+            self.root = [value, [item], {}]
+            return
+        while True:
+            distance = hamming(value, node[0])
+            if distance == 0:
+                node[1].append(item)
+                return
+            child = node[2].get(distance)
+            if child is None:
+                node[2][distance] = [value, [item], {}]
+                return
+            node = child
+
+    def search(self, value, radius):
+        """
+        Return the items whose hash is within radius of value.
+        """
+        found = []
+        stack = [self.root] if self.root is not None else []
+        while stack:
+            node = stack.pop()
+            distance = hamming(value, node[0])
+            if distance <= radius:
+                found.extend(node[1])
+            for edge, child in node[2].items():
+                if distance - radius <= edge <= distance + radius:
+                    stack.append(child)
+        return found
+
+def scan_images(roots):
+    paths = []
+    for root in roots:
+        if not os.path.isdir(root):
+            print(f"Directory does not exist: {root}")
+            continue
+        for dirpath, dirnames, filenames in os.walk(root):
+            # Generated derivatives are expected to look alike
+            dirnames[:] = [d for d in dirnames if not d.startswith(('_', '.'))]
+            # Hashed copies are byte-identical to their logical file by design
+            paths.extend(os.path.join(dirpath, f) for f in filenames
+                         if f.lower().endswith(SUPPORTED_FORMATS) and not FINGERPRINTED.search(f))
+    return sorted(set(paths))
+
+def build_index(paths, index_path=DEDUP_INDEX, jobs=1):
+    """
+    Load the persistent hash index and (re)hash only new or changed files.
+    Returns {path: entry} for every path.
+    """
+    index = AssetManifest(index_path)
+    index.prune({index.key_for(p) for p in paths})
+    pending = [p for p in paths if not index.is_fresh(index.key_for(p), p, HASH_PARAMS)]
+    if pending:
+        print(f"Hashing {len(pending)} of {len(paths)} images")
+    for path, error, digest, data in iter_results(_hash_task, pending, jobs):
+        if error is not None:
+            print(f"Error hashing {path}: {error}")
+            continue
+        index.record(index.key_for(path), path, HASH_PARAMS, {}, digest, data)
+    index.save()
+    return {p: index.get(index.key_for(p)) for p in paths if index.get(index.key_for(p))}
+
+def find_clusters(entries, threshold=6):
+    """
+    Group images into exact (same content) and near-duplicate (pHash within
+    threshold bits) clusters. Returns (exact, near) lists of path lists.
+    """
+    by_digest = {}
+    for path, entry in entries.items():
+        by_digest.setdefault(entry['source']['sha256'], []).append(path)
+    exact = [sorted(group) for group in by_digest.values() if len(group) > 1]
+
+    # Near duplicates: one representative per distinct content, union-find over BK-tree hits
+    representatives = [group[0] for group in by_digest.values()]
+    tree = BKTree()
+    parent = {}
+
+    def find(p):
+        while parent[p] != p:
+            parent[p] = parent[parent[p]]
+            p = parent[p]
+        return p
+
+    for path in representatives:
+        value = int(entries[path]['data']['phash'], 16)
+        parent[path] = path
+        for other in tree.search(value, threshold):
+            parent[find(other)] = find(path)
+        tree.add(value, path)
+
+    groups = {}
+    for path in representatives:
+        groups.setdefault(find(path), []).append(path)
+    near = []
+    for members in groups.values():
+        if len(members) > 1:
+            expanded = [p for m in members for p in by_digest[entries[m]['source']['sha256']]]
+            near.append(sorted(expanded))
+    return sorted(exact), sorted(near)
+
+def _keeper(group):
+    # Prefer the copy the game actually serves, then the shortest path
+    return min(group, key=lambda p: (not p.startswith(PUBLIC_DIR), len(p), p))
+
+def _url(path):
+    if not path.startswith(PUBLIC_DIR + os.sep):
+        return None
+    return '/' + os.path.relpath(path, PUBLIC_DIR).replace(os.sep, '/')
+
+def _is_master(path, masters):
+    return any(path == m or path.startswith(m + os.sep) for m in masters)
+
+def hardlink_exact(exact, masters=None):
+    """
+    Replace exact duplicates with hardlinks to the kept copy.
+    Files under a master directory are left alone: linking them would let a
+    write to the served copy change the master too.
+    Returns the bytes reclaimed.
+    """
+    masters = [resolve(m) for m in (DEDUP_MASTERS if masters is None else masters)]
+    reclaimed = 0
+    for group in exact:
+        group = [p for p in group if not _is_master(p, masters)]
+        if len(group) < 2:
+            continue
+        keep = _keeper(group)
+        keep_stat = os.stat(keep)
+        for path in group:
+            st = os.stat(path)
+            if path == keep or (st.st_ino == keep_stat.st_ino and st.st_dev == keep_stat.st_dev):
+                continue
+            tmp_path = f"{path}.link{os.getpid()}"
+            os.link(keep, tmp_path)
+            os.replace(tmp_path, path)
+            reclaimed += st.st_size
+            print(f"Linked: {path} -> {keep}")
+    return reclaimed
+
+def rewrite_list(clusters):
+    """
+    Reference rewrites that point every served duplicate at its kept copy.
+    Only pass exact clusters: near duplicates are different images.
+    """
+    rewrites = []
+    for group in clusters:
+        keep = _keeper(group)
+        keep_url = _url(keep)
+        if keep_url is None:
+            continue
+        for path in group:
+            url = _url(path)
+            if path != keep and url is not None:
+                rewrites.append({'from': url, 'to': keep_url})
+    return rewrites
+
+def report(title, clusters, entries):
+    total = 0
+    print(f"\n{title}: {len(clusters)} cluster(s)")
+    for group in clusters:
+        keep = _keeper(group)
+        savings = sum(entries[p]['source']['size'] for p in group if p != keep)
+        total += savings
+        print(f"  keep {os.path.relpath(keep)} ({savings / 1024:.1f} KB reclaimable)")
+        for path in group:
+            if path != keep:
+                print(f"    - {os.path.relpath(path)}")
+    print(f"  total reclaimable: {total / 1024 / 1024:.2f} MB")
+    return total
+
+def main():
+    parser = argparse.ArgumentParser(description="Find exact and near-duplicate images by perceptual hash")
+    parser.add_argument('roots', nargs='*', help="directories to scan (default: asset_config.DEDUP_ROOTS)")
+    parser.add_argument('-t', '--threshold', type=int, default=6, help="max pHash Hamming distance for near duplicates")
+    parser.add_argument('-j', '--jobs', type=int, default=os.cpu_count() or 1,
+                        help="worker processes to use (1 = serial, default: all cores)")
+    parser.add_argument('--hardlink', action='store_true', help="replace exact duplicates with hardlinks")
+    parser.add_argument('--rewrite-list', help="write a JSON list of {from, to} rewrites for exact duplicates")
+    args = parser.parse_args()
+
+    roots = [resolve(r) for r in (args.roots or DEDUP_ROOTS)]
+    entries = build_index(scan_images(roots), jobs=args.jobs)
+    exact, near = find_clusters(entries, args.threshold)
+    report("Exact duplicates", exact, entries)
+    report("Near duplicates", near, entries)
+
+    if args.hardlink:
+        reclaimed = hardlink_exact(exact)
+        print(f"\nHardlinked duplicates: {reclaimed / 1024 / 1024:.2f} MB reclaimed")
+    if args.rewrite_list:
+        with open(args.rewrite_list, 'w', encoding='utf-8') as f:
+            json.dump(rewrite_list(exact), f, ensure_ascii=False, indent=1)
+        print(f"Rewrite list written: {args.rewrite_list}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,198 @@
+import os
+import json
+import argparse
+import sys
+from asset_cache import AssetManifest, atomic_write_bytes, file_digest
+from asset_config import (FINGERPRINT_CACHE, FINGERPRINT_LENGTH, FINGERPRINT_MANIFEST, FINGERPRINT_MODULE,
+                          PUBLIC_DIR, REFERENCE_ROOTS, resolve)
+from asset_paths import ASSET_LITERAL, ASSET_ROOTS, FINGERPRINTED, PRECOMPRESSED, SOURCE_EXTENSIONS, logical_path
+from sync_assets import place_file, scan_tree
+
+MODULE_HEADER = "// Auto-generated by fingerprint_assets.py — do not edit, run it again to regenerate\n"
+
+def hashed_name(rel, digest, length=FINGERPRINT_LENGTH):
+    """
+    gifts/coffee.png + digest -> gifts/coffee.<first length hex chars>.png
+    """
+    stem, ext = os.path.splitext(rel)
+    return f"{stem}.{digest[:length]}{ext}"
+
+def _assets(public_dir):
+    """
+    Split the files under the public asset roots into logical assets and
+    hashed copies, each {relative posix path: DirEntry}.
+    """
+    assets = {}
+    hashed = {}
+    for rel, dirent in scan_tree(public_dir).items():
+        if rel.split('/', 1)[0] not in ASSET_ROOTS or rel.endswith(PRECOMPRESSED):
+            continue
+        if FINGERPRINTED.search(rel):
+            hashed[rel] = dirent
+        else:
+            assets[rel] = dirent
+    return assets, hashed
+
+def fingerprint(public_dir=PUBLIC_DIR, manifest_path=FINGERPRINT_MANIFEST, length=FINGERPRINT_LENGTH,
+                mode='reflink', use_cache=True, cache_path=FINGERPRINT_CACHE, prune=False):
+    """
+    Give every public asset a content-hashed sibling and write the
+    logical -> hashed manifest. Unchanged files keep their hash without
+    being re-read. Hashed copies are served as immutable, so they are
+    reflinked or copied by default: a hardlink (mode='link') would change
+    with any in-place edit of the logical file. Returns (manifest, stats).
+    """
+    assets, hashed = _assets(public_dir)
+    cache = AssetManifest(cache_path)
+    params = {'length': length}
+    stats = {'hashed': 0, 'unchanged': 0, 'pruned': 0}
+    manifest = {}
+    for rel, dirent in sorted(assets.items()):
+        key = cache.key_for(dirent.path)
+        entry = cache.get(key)
+        if use_cache and entry is not None and cache.is_fresh(key, dirent.path, params):
+            manifest['/' + rel] = entry['data']
+            stats['unchanged'] += 1
+            target = os.path.join(public_dir, *entry['data']['file'].lstrip('/').split('/'))
+            if mode != 'link' and os.path.samefile(dirent.path, target):
+                # Left hardlinked by an earlier run: give it bytes of its own
+                place_file(dirent.path, target, mode)
+            continue
+        digest = file_digest(dirent.path)
+        target_rel = hashed_name(rel, digest, length)
+        target = os.path.join(public_dir, *target_rel.split('/'))
+        place_file(dirent.path, target, mode)
+        data = {'file': '/' + target_rel, 'sha256': digest, 'size': dirent.stat().st_size}
+        cache.record(key, dirent.path, params, {target: digest}, source_digest=digest, data=data)
+        manifest['/' + rel] = data
+        stats['hashed'] += 1
+        print(f"Fingerprinted: {target_rel}")
+    cache.prune({cache.key_for(dirent.path) for dirent in assets.values()})
+    cache.save()
+
+    if prune:
+        # Older hashes stay until pruned so clients on the previous build keep working
+        current = {data['file'] for data in manifest.values()}
+        for rel, dirent in sorted(hashed.items()):
+            if '/' + rel not in current:
+                os.remove(dirent.path)
+                stats['pruned'] += 1
+                print(f"Pruned: {rel}")
+
+    write_if_changed(manifest_path, json.dumps(manifest, ensure_ascii=False, indent=1, sort_keys=True) + '\n')
+    return manifest, stats
+
+def write_if_changed(path, text):
+    """
+    Write text atomically unless the file already holds it (keeps dev servers from reloading).
+    Returns True when written.
+    """
+    data = text.encode('utf-8')
+    try:
+        with open(path, 'rb') as f:
+            if f.read() == data:
+                return False
+    except FileNotFoundError:
+        pass
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    atomic_write_bytes(path, data)
+    return True
+
+def render_module(manifest):
+    """
+    TypeScript lookup module: assetUrl('/gifts/coffee.png') -> hashed URL,
+    for paths built at runtime (template literals) that cannot be rewritten.
+    """
+    lines = [MODULE_HEADER, "export const ASSET_MANIFEST: Record<string, string> = {\n"]
+    for logical, data in sorted(manifest.items()):
+        lines.append(f"  {json.dumps(logical, ensure_ascii=False)}: {json.dumps(data['file'], ensure_ascii=False)},\n")
+    lines.append("};\n\n")
+    lines.append("export function assetUrl(path: string): string {\n")
+    lines.append("  return ASSET_MANIFEST[path] ?? path;\n")
+    lines.append("}\n")
+    return ''.join(lines)
+
+def _source_files(roots):
+    stack = [resolve(r) for r in roots]
+    while stack:
+        path = stack.pop()
+        if os.path.isdir(path):
+            with os.scandir(path) as it:
+                stack.extend(d.path for d in it if not d.name.startswith('.') and d.name != 'node_modules')
+        elif path.endswith(SOURCE_EXTENSIONS) and os.path.abspath(path) != os.path.abspath(FINGERPRINT_MODULE):
+            yield path
+
+def rewrite_references(manifest, roots=REFERENCE_ROOTS, dry_run=False, restore=False):
+    """
+    Point plain string literals in the sources at the hashed files (or,
+    with restore=True, back at the logical names). Template literals are
+    left alone and counted; they should go through assetUrl().
+    Returns {'files': n, 'literals': n, 'dynamic': n}.
+    """
+    stats = {'files': 0, 'literals': 0, 'dynamic': 0}
+    for path in sorted(_source_files(roots)):
+        with open(path, 'r', encoding='utf-8', newline='') as f:
+            text = f.read()
+        replaced = 0
+
+        def replace(match):
+            nonlocal replaced
+            if match.group(3) is not None:
+                stats['dynamic'] += 1
+                return match.group(0)
+            literal = match.group(2)
+            logical = logical_path(literal)
+            if restore:
+                target = logical
+            elif logical in manifest:
+                target = manifest[logical]['file']
+            else:
+                return match.group(0)
+            if target == literal:
+                return match.group(0)
+            replaced += 1
+            return match.group(1) + target + match.group(1)
+
+        new_text = ASSET_LITERAL.sub(replace, text)
+        if not replaced:
+            continue
+        stats['files'] += 1
+        stats['literals'] += replaced
+        print(f"{'Would rewrite' if dry_run else 'Rewrote'} {replaced} reference(s): {path}")
+        if not dry_run:
+            atomic_write_bytes(path, new_text.encode('utf-8'))
+    return stats
+
+def main():
+    parser = argparse.ArgumentParser(description="Write content-hashed copies of public assets and a manifest")
+    parser.add_argument('--public', default=PUBLIC_DIR, help="public directory to fingerprint")
+    parser.add_argument('--manifest', default=FINGERPRINT_MANIFEST, help="logical -> hashed JSON manifest to write")
+    parser.add_argument('--module', nargs='?', const=FINGERPRINT_MODULE,
+                        help=f"also generate the TS lookup module (default path: {FINGERPRINT_MODULE})")
+    parser.add_argument('--rewrite', action='store_true', help="point string literals in game/src at hashed files")
+    parser.add_argument('--restore', action='store_true', help="point rewritten literals back at logical names")
+    parser.add_argument('--dry-run', action='store_true', help="with --rewrite/--restore: only report")
+    parser.add_argument('--mode', choices=('link', 'reflink', 'copy'), default='reflink',
+                        help="how hashed copies are placed (see sync_assets.py); 'link' shares bytes "
+                             "with the logical file, so only use it if nothing edits files in place")
+    parser.add_argument('--prune', action='store_true', help="delete hashed copies no longer in the manifest")
+    parser.add_argument('--force', action='store_true', help="re-hash every file")
+    args = parser.parse_args()
+
+    try:
+        manifest, stats = fingerprint(args.public, args.manifest, mode=args.mode, use_cache=not args.force,
+                                      prune=args.prune)
+    except OSError as e:
+        print(f"Error fingerprinting: {e}")
+        sys.exit(1)
+    print(f"\nFingerprinted: {stats['hashed']}, unchanged: {stats['unchanged']}, pruned: {stats['pruned']}")
+    if args.module:
+        if write_if_changed(args.module, render_module(manifest)):
+            print(f"Module written: {args.module}")
+    if args.rewrite or args.restore:
+        result = rewrite_references(manifest, dry_run=args.dry_run, restore=args.restore)
+        print(f"References: {result['literals']} in {result['files']} file(s); "
+              f"{result['dynamic']} template literal(s) need assetUrl()")
+
+if __name__ == "__main__":
+    main()
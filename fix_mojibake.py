@@ -0,0 +1,229 @@
+import os
+import re
+import argparse
+import bisect
+import codecs
+import sys
+import unicodedata
+from asset_cache import atomic_write_bytes
+from asset_config import resolve
+from normalize_images import iter_results
+
+DEFAULT_ROOTS = ['game/src', 'bot/src']
+TEXT_EXTENSIONS = ('.ts', '.tsx', '.js', '.jsx', '.css', '.html', '.json', '.md', '.svg')
+
+# Single-byte code pages UTF-8 text is typically mis-read as, most likely first
+CODECS = ('cp1251', 'cp1252', 'latin-1')
+
+def _c1_bytes(error):
+    """
+    Encode error handler: a C1 control (U+0080..U+009F) goes back to the byte
+    of the same value. Windows decoders turn bytes a code page leaves
+    undefined into those controls, e.g. 0x98 (the second byte of "И") in
+    cp1251 becomes U+0098.
+    """
+    if isinstance(error, UnicodeEncodeError):
+        chunk = error.object[error.start:error.end]
+        if all('\x80' <= ch <= '\x9f' for ch in chunk):
+            return chunk.encode('latin-1'), error.end
+    raise error
+
+codecs.register_error('mojibake_c1', _c1_bytes)
+
+def _chars(codec, first, last):
+    """
+    Characters that bytes first..last decode to in codec; an undefined byte
+    stands for the C1 control of the same value (see _c1_bytes).
+    """
+    chars = []
+    for byte in range(first, last + 1):
+        try:
+            chars.append(bytes([byte]).decode(codec))
+        except UnicodeDecodeError:
+            chars.append(chr(byte))
+    return re.escape(''.join(chars))
+
+def _mojibake_regex(codec):
+    """
+    What a run of UTF-8 multi-byte sequences looks like after decoding with
+    codec: a lead byte (2-, 3- or 4-byte) followed by its continuation bytes.
+    """
+    cont = f"[{_chars(codec, 0x80, 0xBF)}]"
+    lead2 = f"[{_chars(codec, 0xC2, 0xDF)}]"
+    lead3 = f"[{_chars(codec, 0xE0, 0xEF)}]"
+    lead4 = f"[{_chars(codec, 0xF0, 0xF4)}]"
+    return re.compile(f"(?:{lead2}{cont}|{lead3}{cont}{{2}}|{lead4}{cont}{{3}})+")
+
+_PATTERNS = [(codec, _mojibake_regex(codec)) for codec in CODECS]
+
+# Punctuation that follows real words too ("«ПИАР»"), so "Р»" alone proves nothing
+_WORD_PUNCT = '«»…—–·°№‘’“”„‚•™©®§±\xa0\xad'
+
+# Leftovers of mojibake that lost bytes, reported instead of guessed at:
+# Cyrillic "Р"/"С" glued to a letter-like character only a UTF-8 continuation
+# byte yields (U+0098 included: "Р\x98" is "И" that was not repaired); "вЂ",
+# the start of every broken dash and quote; and "И" whose second byte was
+# dropped altogether, leaving "Р" inside a lowercase word or before two
+# consonants ("Рнстанс")
+_DAMAGED = re.compile("[РС][%s]|вЂ|(?<=[а-яё])Р(?=[а-яё])|(?<![А-Яа-яЁё])Р(?=[бвгджзклмнпрстфхцчшщ]{2})"
+                      % re.escape(''.join(c for c in bytes(range(0x80, 0xC0)).decode('cp1251', 'ignore')
+                                          if c not in _WORD_PUNCT) + '\x98'))
+
+def _plausible(ch):
+    """
+    Characters real source text is made of; anything else means the match
+    was ordinary text that only happened to form valid UTF-8.
+    """
+    code = ord(ch)
+    # Cyrillic as cp1251 has it; a twice-broken span passes through Ђ, Ѓ, ...
+    if 0x0400 <= code <= 0x045F or code in (0x0490, 0x0491):
+        return True
+    if 0x00A0 <= code <= 0x00FF or 0x2010 <= code <= 0x203A or code in (0x20AC, 0x2116, 0x2122):
+        return True
+    if 0x2190 <= code <= 0x2BFF or code >= 0x1F000:  # arrows, symbols, emoji
+        return True
+    return unicodedata.category(ch) == 'Mn'
+
+def _decode_span(span, codec):
+    """
+    What a matched span was written as, or None when the round trip fails or
+    gives characters real text is not made of.
+    """
+    try:
+        fixed = span.encode(codec, 'mojibake_c1').decode('utf-8')
+    except UnicodeError:
+        return None
+    if not all(_plausible(ch) for ch in fixed):
+        return None
+    if codec == 'cp1251' and max(fixed) <= '\xff':
+        # Real text like "ТВ»" also encodes to one Latin-1 symbol;
+        # broken Russian always yields Cyrillic somewhere in the span
+        return None
+    return fixed
+
+def _repair_codec(text, codec, pattern):
+    """
+    One pass for one codec. Returns (text, spans repaired).
+    A cp1251 span of one two-byte sequence ("Р»" -> "л") is as often real
+    Russian before a quote, so it is only repaired as a whole word
+    ("Рё" -> "и") on a line that also has longer mojibake; "Р\x98" never
+    occurs in real text and is always repaired.
+    """
+    spans = []
+    singles = []
+    for match in pattern.finditer(text):
+        fixed = _decode_span(match.group(0), codec)
+        if fixed is None:
+            continue
+        if codec == 'cp1251' and len(match.group(0)) == 2 and '\x98' not in match.group(0):
+            singles.append((match.start(), match.end(), fixed))
+        else:
+            spans.append((match.start(), match.end(), fixed))
+    if singles:
+        newlines = [m.start() for m in re.finditer('\n', text)]
+        broken_lines = {bisect.bisect(newlines, start) for start, _, _ in spans}
+        for start, end, fixed in singles:
+            whole_word = ((start == 0 or not text[start - 1].isalpha())
+                          and (end == len(text) or not text[end].isalpha()))
+            if whole_word and bisect.bisect(newlines, start) in broken_lines:
+                spans.append((start, end, fixed))
+        spans.sort()
+    if not spans:
+        return text, 0
+    parts = []
+    last = 0
+    for start, end, fixed in spans:
+        parts.append(text[last:start])
+        parts.append(fixed)
+        last = end
+    parts.append(text[last:])
+    return ''.join(parts), len(spans)
+
+def repair_text(text):
+    """
+    Round-trip every mis-decoded span back to what was written.
+    Returns (text, repaired spans, damaged spans left as they were).
+    """
+    repaired = 0
+    # Twice-broken text (mojibake of mojibake) is undone one layer per pass
+    for _ in range(3):
+        changed = 0
+        for codec, pattern in _PATTERNS:
+            text, count = _repair_codec(text, codec, pattern)
+            changed += count
+        repaired += changed
+        if not changed:
+            break
+    return text, repaired, len(_DAMAGED.findall(text))
+
+def _repair_task(task):
+    path, check_only = task
+    try:
+        with open(path, 'rb') as f:
+            data = f.read()
+        bom = data.startswith(b'\xef\xbb\xbf')
+        text = data.decode('utf-8-sig')
+        fixed, repaired, damaged = repair_text(text)
+        if repaired and not check_only:
+            atomic_write_bytes(path, (b'\xef\xbb\xbf' if bom else b'') + fixed.encode('utf-8'))
+    except (OSError, UnicodeDecodeError) as e:
+        return path, str(e), 0, 0
+    return path, None, repaired, damaged
+
+def scan_sources(roots):
+    paths = []
+    stack = [resolve(r) for r in roots]
+    while stack:
+        directory = stack.pop()
+        try:
+            it = os.scandir(directory)
+        except FileNotFoundError:
+            print(f"Directory does not exist: {directory}")
+            continue
+        with it:
+            for dirent in it:
+                if dirent.name.startswith('.') or dirent.name == 'node_modules':
+                    continue
+                if dirent.is_dir():
+                    stack.append(dirent.path)
+                elif dirent.name.endswith(TEXT_EXTENSIONS):
+                    paths.append(dirent.path)
+    return sorted(paths)
+
+def repair_tree(roots=DEFAULT_ROOTS, check_only=False, jobs=1):
+    """
+    Repair (or only count) mojibake in every text file below roots.
+    Returns {path: (repaired, damaged)} for files with findings, and failures.
+    """
+    findings = {}
+    failures = []
+    tasks = [(p, check_only) for p in scan_sources(roots)]
+    for path, error, repaired, damaged in iter_results(_repair_task, tasks, jobs):
+        if error is not None:
+            print(f"Error reading {path}: {error}")
+            failures.append((path, error))
+            continue
+        if repaired or damaged:
+            findings[path] = (repaired, damaged)
+            action = 'mojibake spans' if check_only else 'repaired'
+            print(f"{os.path.relpath(path)}: {repaired} {action}, {damaged} damaged (needs manual fix)")
+    return findings, failures
+
+def main():
+    parser = argparse.ArgumentParser(description="Find and repair UTF-8 text mis-decoded as cp1251/latin-1")
+    parser.add_argument('roots', nargs='*', help=f"directories to scan (default: {', '.join(DEFAULT_ROOTS)})")
+    parser.add_argument('--check', action='store_true', help="only report; exit 1 if anything is found (for CI)")
+    parser.add_argument('-j', '--jobs', type=int, default=os.cpu_count() or 1,
+                        help="worker processes to use (1 = serial, default: all cores)")
+    args = parser.parse_args()
+
+    findings, failures = repair_tree(args.roots or DEFAULT_ROOTS, args.check, args.jobs)
+    repaired = sum(r for r, _ in findings.values())
+    damaged = sum(d for _, d in findings.values())
+    verb = 'found' if args.check else 'repaired'
+    print(f"\nFiles with mojibake: {len(findings)}, spans {verb}: {repaired}, damaged spans: {damaged}")
+    if failures or (args.check and findings):
+        sys.exit(1)
+
+if __name__ == "__main__":
+    main()
@@ -1,87 +1,380 @@
+import io
 import os
-from PIL import Image
+import argparse
+from concurrent.futures import ProcessPoolExecutor
+from PIL import Image, ImageChops
 import sys
+import asset_metrics as metrics
+from asset_cache import AssetManifest, atomic_write_bytes, bytes_digest
+from asset_config import NORMALIZE_PROFILES, load_directories
 
-def normalize_image(input_path, output_path, target_size=(512, 512)):
+# Supported image formats
+SUPPORTED_FORMATS = ('.png', '.jpg', '.jpeg', '.gif', '.bmp', '.tiff', '.webp')
+
+# Everything that changes the output bytes; recorded per entry in the build cache
+DEFAULT_PARAMS = {
+    'target_size': [512, 512],
+    'background': [255, 255, 255],
+    'resample': 'LANCZOS',
+}
+
+def profile_params(name='default', overrides=None):
     """
-    Normalize an image by resizing it to target dimensions while maintaining aspect ratio.
+    Build parameters for a NORMALIZE_PROFILES entry: the profile over
+    DEFAULT_PARAMS, then overrides (e.g. optimize/low_memory) on top.
     """
-    try:
-        # Open and convert image to RGB (to handle RGBA, P, etc.)
-        img = Image.open(input_path)
-        
-        # Convert to RGB if necessary (to handle RGBA, P mode images)
-        if img.mode in ('RGBA', 'LA', 'P'):
-            # Create white background for images with transparency
-            background = Image.new('RGB', img.size, (255, 255, 255))
+    if name not in NORMALIZE_PROFILES:
+        raise ValueError(f"Unknown normalization profile: {name}")
+    return dict(DEFAULT_PARAMS, **NORMALIZE_PROFILES[name], **(overrides or {}))
+
+def trim_margins(img, tolerance=8):
+    """
+    Crop away transparent margins, or, for opaque images, margins within
+    tolerance of the top-left pixel colour. Returns img unchanged when
+    there is nothing to trim (or nothing but margin).
+    """
+    if 'A' in img.getbands() and img.getchannel('A').getextrema()[0] < 255:
+        mask = img.getchannel('A').point(lambda a: 255 if a > tolerance else 0)
+    else:
+        rgb = img.convert('RGB') if img.mode != 'RGB' else img
+        diff = ImageChops.difference(rgb, Image.new('RGB', rgb.size, rgb.getpixel((0, 0))))
+        # Largest channel difference per pixel
+        r, g, b = diff.split()
+        mask = ImageChops.lighter(ImageChops.lighter(r, g), b).point(lambda v: 255 if v > tolerance else 0)
+    bbox = mask.getbbox()
+    if bbox is None or bbox == (0, 0) + img.size:
+        return img
+    return img.crop(bbox)
+
+def _canvas(img, target_size, background, pad):
+    """
+    Centre img on a target_size canvas: background colour, or transparent
+    when background is None. Without pad the fitted image is returned as is.
+    """
+    if not pad:
+        return img
+    if background is None:
+        new_img = Image.new('RGBA', target_size, (0, 0, 0, 0))
+        mask = None
+    else:
+        new_img = Image.new('RGB', target_size, background)
+        # An RGBA/LA image is its own mask: no per-band split() copies
+        mask = img if img.mode in ('RGBA', 'LA') else None
+    paste_x = (target_size[0] - img.size[0]) // 2
+    paste_y = (target_size[1] - img.size[1]) // 2
+    new_img.paste(img, (paste_x, paste_y), mask)
+    return new_img
+
+def _reduce_in_strips(img, factor, mode, rows=64):
+    """
+    Integer-reduce img by factor, converting to mode strip by strip so no
+    full-size converted (or premultiplied) copy is ever allocated.
+    """
+    width, height = img.size
+    reduced = Image.new(mode, (-(-width // factor), -(-height // factor)))
+    step = factor * rows
+    for top in range(0, height, step):
+        strip = img.crop((0, top, width, min(height, top + step)))
+        if strip.mode != mode:
+            strip = strip.convert(mode)
+        reduced.paste(strip.reduce(factor), (0, top // factor))
+    return reduced
+
+def shrink_then_flatten(img, target_size, background, resample, trim=None, pad=True):
+    """
+    Low-memory path: downscale first, flatten alpha at target resolution.
+    JPEG is already decoded at a reduced DCT scale (see encode_normalized)
+    and other formats are shrunk by an integer reduce() before the final
+    resample, so apart from the decoded source no buffer is larger than
+    ~4x the output. background None keeps alpha (RGBA result).
+    """
+    with metrics.stage('convert'):
+        if background is None:
+            mode = 'RGBA'
+        elif img.mode in ('RGB', 'RGBA', 'L', 'LA'):
+            mode = img.mode
+        else:
+            has_alpha = 'A' in img.getbands() or 'transparency' in img.info
+            mode = 'RGBA' if has_alpha else 'RGB'
+        # Integer box reduction down to ~2x the target keeps LANCZOS quality
+        factor = min(img.size[0] // (target_size[0] * 2), img.size[1] // (target_size[1] * 2))
+        if factor > 1 and img.mode in ('RGB', 'L'):
+            # No conversion or premultiplication needed: reduce in one go
+            img = img.reduce(factor)
+        elif factor > 1:
+            img = _reduce_in_strips(img, factor, mode)
+        elif img.mode != mode:
+            img = img.convert(mode)
+    if trim is not None:
+        with metrics.stage('trim'):
+            img = trim_margins(img, trim)
+    with metrics.stage('thumbnail'):
+        img.thumbnail(target_size, resample)
+
+    with metrics.stage('paste'):
+        if not pad and background is not None and img.mode in ('RGBA', 'LA'):
+            # Tight fit but no alpha wanted: flatten at the fitted size
+            return _canvas(img, img.size, background, True)
+        return _canvas(img, target_size, background, pad)
+
+def encode_normalized(data, target_size=(512, 512), background=(255, 255, 255),
+                      resample='LANCZOS', optimize=False, low_memory=False, trim=None, pad=True):
+    """
+    Resize and flatten encoded image bytes; returns the normalized PNG bytes.
+    With optimize, the PNG goes through the optimize_png search instead of
+    Pillow's default encoder settings. low_memory selects the
+    decode-small-then-flatten path for very large sources.
+    background None keeps transparency (RGBA output), trim crops margins
+    within that tolerance before resizing, and pad=False skips the square
+    canvas (see NORMALIZE_PROFILES).
+    """
+    target_size = tuple(target_size)
+    background = tuple(background) if background is not None else None
+
+    # Open and convert image to RGB (to handle RGBA, P, etc.)
+    with metrics.stage('decode'):
+        img = Image.open(io.BytesIO(data))
+        metrics.count(in_pixels=img.size[0] * img.size[1], out_pixels=target_size[0] * target_size[1])
+        if low_memory and img.format == 'JPEG':
+            img.draft('RGB', target_size)
+        img.load()
+
+    if low_memory:
+        new_img = shrink_then_flatten(img, target_size, background, getattr(Image.Resampling, resample),
+                                       trim, pad)
+        return _encode_png(new_img, optimize)
+
+    # Convert to RGB if necessary (to handle RGBA, P mode images)
+    with metrics.stage('convert'):
+        if background is None:
+            # Keep transparency; the padding around the image stays see-through
+            if img.mode != 'RGBA':
+                img = img.convert('RGBA')
+        elif img.mode in ('RGBA', 'LA', 'P'):
+            # Create background for images with transparency
+            background_img = Image.new('RGB', img.size, background)
             if img.mode == 'P':
                 img = img.convert('RGBA')
             if img.mode in ('RGBA', 'LA'):
-                background.paste(img, mask=img.split()[-1])  # Use alpha channel as mask
+                background_img.paste(img, mask=img.split()[-1])  # Use alpha channel as mask
             else:
-                background.paste(img)
-            img = background
+                background_img.paste(img)
+            img = background_img
         elif img.mode != 'RGB':
             img = img.convert('RGB')
-        
-        # Calculate new dimensions maintaining aspect ratio
-        img.thumbnail(target_size, Image.LANCZOS)
-        
-        # Create a new image with target size and paste the resized image centered
-        new_img = Image.new('RGB', target_size, (255, 255, 255))
-        paste_x = (target_size[0] - img.size[0]) // 2
-        paste_y = (target_size[1] - img.size[1]) // 2
-        new_img.paste(img, (paste_x, paste_y))
-        
+
+    if trim is not None:
+        with metrics.stage('trim'):
+            img = trim_margins(img, trim)
+
+    # Calculate new dimensions maintaining aspect ratio
+    with metrics.stage('thumbnail'):
+        img.thumbnail(target_size, getattr(Image.Resampling, resample))
+
+    # Create a new image with target size and paste the resized image centered
+    with metrics.stage('paste'):
+        new_img = _canvas(img, target_size, background, pad)
+    return _encode_png(new_img, optimize)
+
+def _encode_png(new_img, optimize=False):
+    with metrics.stage('encode'):
+        if optimize:
+            from optimize_png import encode_best
+            return encode_best(new_img)[0]
+
         # Save as PNG to preserve quality
-        new_img.save(output_path, 'PNG', quality=95)
+        out = io.BytesIO()
+        new_img.save(out, 'PNG', quality=95)
+        return out.getvalue()
+
+def _normalize(input_path, output_path, **params):
+    """
+    Normalize one file and write the result atomically; raises on any failure.
+    Returns the (source, output) content hashes for the build cache.
+    """
+    metrics.begin('normalize', input_path)
+    try:
+        with metrics.stage('read'):
+            with open(input_path, 'rb') as f:
+                data = f.read()
+        encoded = encode_normalized(data, **params)
+        with metrics.stage('write'):
+            atomic_write_bytes(output_path, encoded)
+        metrics.count(in_bytes=len(data), out_bytes=len(encoded))
+    except Exception as e:
+        metrics.end(error=str(e))
+        raise
+    metrics.end()
+    return bytes_digest(data), bytes_digest(encoded)
+
+def normalize_image(input_path, output_path, target_size=(512, 512)):
+    """
+    Normalize an image by resizing it to target dimensions while maintaining aspect ratio.
+    Returns None on success or the error message on failure.
+    """
+    try:
+        _normalize(input_path, output_path, target_size=target_size)
         print(f"Normalized: {input_path} -> {output_path}")
     except Exception as e:
         print(f"Error processing {input_path}: {str(e)}")
+        return str(e)
+    return None
 
-def normalize_images_in_directory(input_dir, output_dir=None):
+def iter_results(func, tasks, jobs=1):
     """
-    Normalize all images in a directory and save to the same or output directory.
+    Yield func(task) for every task in submission order.
+    With jobs > 1 the work is spread over a bounded process pool.
+    """
+    if jobs <= 1 or len(tasks) <= 1:
+        yield from map(func, tasks)
+        return
+    with ProcessPoolExecutor(max_workers=jobs) as executor:
+        # Small chunks keep every worker busy without queueing the whole corpus per process
+        chunksize = max(1, len(tasks) // (jobs * 4))
+        yield from executor.map(func, tasks, chunksize=chunksize)
+
+def _normalize_task(task):
+    """
+    Process-pool worker: normalize one (input_path, output_path, params) task.
+    Printing is left to the parent so output stays in submission order.
+    """
+    input_path, output_path, params = task
+    try:
+        digests = _normalize(input_path, output_path, **params)
+    except Exception as e:
+        return input_path, output_path, str(e), None
+    return input_path, output_path, None, digests
+
+def list_directory_tasks(input_dir, output_dir=None, params=None):
+    """
+    Build the (input_path, output_path, params) tasks for every image in a directory.
     """
     if output_dir is None:
         output_dir = input_dir
-    
-    # Create output directory if it doesn't exist
-    os.makedirs(output_dir, exist_ok=True)
-    
-    # Supported image formats
-    supported_formats = ('.png', '.jpg', '.jpeg', '.gif', '.bmp', '.tiff', '.webp')
-    
-    for filename in os.listdir(input_dir):
-        if filename.lower().endswith(supported_formats):
-            input_path = os.path.join(input_dir, filename)
+    if params is None:
+        params = DEFAULT_PARAMS
+
+    tasks = []
+    for filename in sorted(os.listdir(input_dir)):
+        if filename.lower().endswith(SUPPORTED_FORMATS):
             # Change extension to png for consistency
             name, ext = os.path.splitext(filename)
+            if name.endswith('_normalized'):
+                # Output of an earlier run, not a source
+                continue
+            input_path = os.path.join(input_dir, filename)
             output_filename = f"{name}_normalized.png"
-            output_path = os.path.join(output_dir, output_filename)
-            
-            normalize_image(input_path, output_path)
+            tasks.append((input_path, os.path.join(output_dir, output_filename), params))
+    return tasks
 
-def main():
-    base_path = r"C:\Users\2ой пользователь\kpop 2 — копия (3)"
-    
-    # Directories to process
-    directories = [
-        os.path.join(base_path, "clothes", "accessory"),
-        os.path.join(base_path, "clothes", "bot"),
-        os.path.join(base_path, "clothes", "shoe"),
-        os.path.join(base_path, "clothes", "top"),
-        os.path.join(base_path, "avatars", "nptnorm"),
-        os.path.join(base_path, "faces", "notnorm"),
-        os.path.join(base_path, "gifts")
-    ]
-    
-    for dir_path in directories:
+def _filter_cached(tasks, manifests):
+    """
+    Split tasks into those that need work and a count of cache hits.
+    """
+    pending = []
+    skipped = 0
+    for task in tasks:
+        input_path, output_path, params = task
+        out_dir = os.path.dirname(output_path)
+        manifest = manifests.get(out_dir)
+        if manifest is None:
+            manifest = manifests[out_dir] = AssetManifest.for_directory(out_dir)
+        if manifest.is_fresh(manifest.key_for(input_path), input_path, params):
+            skipped += 1
+        else:
+            pending.append(task)
+    return pending, skipped
+
+def run_tasks(tasks, jobs=1, use_cache=True):
+    """
+    Normalize every task, in parallel when jobs > 1.
+    With use_cache, inputs whose content and parameters match the build
+    cache are skipped without being decoded.
+    Results are reported in submission order; returns the list of
+    (input_path, error) failures.
+    """
+    failures = []
+    manifests = {}
+    if use_cache:
+        tasks, skipped = _filter_cached(tasks, manifests)
+        if skipped:
+            print(f"Up to date: {skipped} image(s)")
+    task_params = {input_path: params for input_path, _, params in tasks}
+    try:
+        for input_path, output_path, error, digests in iter_results(_normalize_task, tasks, jobs):
+            if error is None:
+                print(f"Normalized: {input_path} -> {output_path}")
+                if use_cache:
+                    source_digest, output_digest = digests
+                    manifest = manifests[os.path.dirname(output_path)]
+                    manifest.record(manifest.key_for(input_path), input_path, task_params[input_path],
+                                    {output_path: output_digest}, source_digest)
+            else:
+                print(f"Error processing {input_path}: {error}")
+                failures.append((input_path, error))
+    finally:
+        for manifest in manifests.values():
+            manifest.save()
+    return failures
+
+def normalize_images_in_directory(input_dir, output_dir=None, jobs=1, use_cache=True, params=None):
+    """
+    Normalize all images in a directory and save to the same or output directory.
+    Returns the list of (input_path, error) failures.
+    """
+    if output_dir is None:
+        output_dir = input_dir
+
+    # Create output directory if it doesn't exist
+    os.makedirs(output_dir, exist_ok=True)
+
+    return run_tasks(list_directory_tasks(input_dir, output_dir, params), jobs, use_cache)
+
+def normalize_directories(directories, jobs=1, use_cache=True, params=None):
+    """
+    Normalize several directories through one shared worker pool.
+    Each entry is a path (normalized with params) or a (path, params) pair.
+    Returns the list of (input_path, error) failures.
+    """
+    tasks = []
+    for entry in directories:
+        dir_path, dir_params = entry if isinstance(entry, tuple) else (entry, params)
         if os.path.exists(dir_path):
             print(f"Processing directory: {dir_path}")
-            normalize_images_in_directory(dir_path)
+            tasks.extend(list_directory_tasks(dir_path, params=dir_params))
         else:
             print(f"Directory does not exist: {dir_path}")
+    return run_tasks(tasks, jobs, use_cache)
+
+def parse_args(argv=None):
+    """
+    Parse the options shared by the normalize scripts.
+    """
+    parser = argparse.ArgumentParser(description="Normalize images to 512x512 PNG")
+    parser.add_argument('-j', '--jobs', type=int, default=os.cpu_count() or 1,
+                        help="worker processes to use (1 = serial, default: all cores)")
+    parser.add_argument('--force', action='store_true',
+                        help="ignore the build cache and re-normalize every image")
+    parser.add_argument('--low-memory', action='store_true',
+                        help="decode large sources at reduced scale and flatten at target size")
+    metrics.add_arguments(parser)
+    return parser.parse_args(argv)
+
+def main():
+    args = parse_args()
+    overrides = {'low_memory': True} if args.low_memory else None
+
+    # The pipeline's source directories, each with its configured profile;
+    # normalized copies are written next to the originals as *_normalized.png
+    directories = [(entry['source'], profile_params(entry['profile'], overrides)) for entry in load_directories()]
+
+    with metrics.from_args(args):
+        failures = normalize_directories(directories, args.jobs, use_cache=not args.force)
+    if failures:
+        print(f"\n{len(failures)} image(s) failed:")
+        for input_path, error in failures:
+            print(f"  - {input_path}: {error}")
+        sys.exit(1)
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    main()
@@ -0,0 +1,179 @@
+import io
+import os
+import json
+import argparse
+import math
+import shutil
+import sys
+import time
+from PIL import Image, ImageChops, ImageStat
+from asset_cache import atomic_write_bytes
+from asset_config import PUBLIC_DIR
+from normalize_images import iter_results
+from asset_paths import FINGERPRINTED
+
+# zlib strategies tried per image (Pillow passes compress_type straight to deflateInit2)
+STRATEGIES = {'default': 0, 'filtered': 1, 'huffman': 2, 'rle': 3}
+
+# Palette reduction is kept only when it is at least this faithful (dB)
+DEFAULT_MIN_PSNR = 45.0
+
+def psnr(a, b):
+    """
+    Peak signal-to-noise ratio between two same-sized images (inf when identical).
+    """
+    diff = ImageChops.difference(a, b)
+    if diff.getbbox() is None:
+        return math.inf
+    stat = ImageStat.Stat(diff)
+    pixels = a.size[0] * a.size[1]
+    mse = sum(stat.sum2) / (pixels * len(stat.sum2))
+    return 10 * math.log10(255 * 255 / mse)
+
+def _is_gray(img):
+    r, g, b = img.split()[:3]
+    return ImageChops.difference(r, g).getbbox() is None and ImageChops.difference(g, b).getbbox() is None
+
+def candidates(img, min_psnr=DEFAULT_MIN_PSNR):
+    """
+    Yield (label, image) encodings worth trying: lossless mode reductions
+    first, then a 256-colour palette when it stays above min_psnr. An image
+    with at most 256 colours still has to pass: the quantizers are not exact
+    on RGBA, and an exact round-trip scores inf anyway.
+    """
+    if img.mode not in ('RGB', 'RGBA', 'L', 'LA', 'P'):
+        img = img.convert('RGBA' if 'A' in img.getbands() else 'RGB')
+    if img.mode == 'P':
+        yield 'palette', img
+        img = img.convert('RGBA' if 'transparency' in img.info else 'RGB')
+    if img.mode == 'RGBA' and img.getchannel('A').getextrema() == (255, 255):
+        # Alpha channel carries nothing
+        img = img.convert('RGB')
+    if img.mode == 'RGB' and _is_gray(img):
+        img = img.convert('L')
+    yield img.mode.lower(), img
+
+    if img.mode in ('RGB', 'RGBA'):
+        method = Image.Quantize.FASTOCTREE if img.mode == 'RGBA' else Image.Quantize.MEDIANCUT
+        colors = img.getcolors(256)
+        palette = img.quantize(len(colors) if colors else 256, method=method, dither=Image.Dither.NONE)
+        if psnr(img, palette.convert(img.mode)) >= min_psnr:
+            yield 'palette', palette
+
+def _encode(img, level, strategy):
+    out = io.BytesIO()
+    img.save(out, 'PNG', compress_level=level, compress_type=strategy, icc_profile=None)
+    return out.getvalue()
+
+def encode_best(img, strategies=STRATEGIES, min_psnr=DEFAULT_MIN_PSNR):
+    """
+    Pick the smallest candidate with a quick encode, then search the zlib
+    strategies at level 9 for that candidate only.
+    Ancillary chunks (ICC, text, exif, dpi) are not written.
+    Returns (png_bytes, label).
+    """
+    label, candidate = min(candidates(img, min_psnr), key=lambda c: len(_encode(c[1], 6, 0)))
+    best = None
+    for name, strategy in strategies.items():
+        data = _encode(candidate, 9, strategy)
+        if best is None or len(data) < len(best[0]):
+            best = (data, f"{label}/{name}")
+    return best
+
+def optimize_file(path, output_path=None, min_psnr=DEFAULT_MIN_PSNR, dry_run=False):
+    """
+    Optimize one PNG; the result is written only when it is smaller.
+    Returns a stats dict (before/after bytes, encode seconds, winning encoding).
+    """
+    output_path = output_path or path
+    before = os.path.getsize(path)
+    start = time.perf_counter()
+    with Image.open(path) as img:
+        img.load()
+        data, label = encode_best(img, min_psnr=min_psnr)
+    seconds = time.perf_counter() - start
+    smaller = len(data) < before
+    if not dry_run:
+        if smaller:
+            atomic_write_bytes(output_path, data)
+        elif output_path != path:
+            shutil.copyfile(path, output_path)
+    return {'path': path, 'before': before, 'after': len(data) if smaller else before,
+            'seconds': round(seconds, 4), 'encoding': label if smaller else 'original'}
+
+def _optimize_task(task):
+    path, min_psnr, dry_run = task
+    try:
+        return optimize_file(path, min_psnr=min_psnr, dry_run=dry_run), None
+    except Exception as e:
+        return {'path': path}, str(e)
+
+def optimize_tree(roots, min_psnr=DEFAULT_MIN_PSNR, jobs=1, dry_run=False):
+    """
+    Optimize every PNG below roots. Returns (file_stats, failures).
+    """
+    paths = []
+    for root in roots:
+        for dirpath, dirnames, filenames in os.walk(root):
+            # Hashed copies are immutable once published; their logical file is optimized instead
+            paths.extend(os.path.join(dirpath, f) for f in sorted(filenames)
+                         if f.lower().endswith('.png') and not FINGERPRINTED.search(f))
+    stats = []
+    failures = []
+    for result, error in iter_results(_optimize_task, [(p, min_psnr, dry_run) for p in paths], jobs):
+        if error is not None:
+            print(f"Error optimizing {result['path']}: {error}")
+            failures.append((result['path'], error))
+            continue
+        saved = result['before'] - result['after']
+        print(f"{result['path']}: {result['before']} -> {result['after']} bytes "
+              f"(-{saved * 100 / max(1, result['before']):.1f}%, {result['encoding']}, {result['seconds']}s)")
+        stats.append(result)
+    return stats, failures
+
+def summarize(stats):
+    """
+    Per-directory totals of bytes before/after and encode time.
+    """
+    directories = {}
+    for item in stats:
+        total = directories.setdefault(os.path.dirname(item['path']),
+                                       {'files': 0, 'before': 0, 'after': 0, 'seconds': 0.0})
+        total['files'] += 1
+        total['before'] += item['before']
+        total['after'] += item['after']
+        total['seconds'] += item['seconds']
+    return directories
+
+def main():
+    parser = argparse.ArgumentParser(description="Losslessly (or visually losslessly) shrink PNG assets")
+    parser.add_argument('roots', nargs='*', help=f"directories to optimize (default: {PUBLIC_DIR})")
+    parser.add_argument('--min-psnr', type=float, default=DEFAULT_MIN_PSNR,
+                        help="minimum PSNR in dB for accepting palette quantization")
+    parser.add_argument('-j', '--jobs', type=int, default=os.cpu_count() or 1,
+                        help="worker processes to use (1 = serial, default: all cores)")
+    parser.add_argument('--dry-run', action='store_true', help="report savings without writing files")
+    parser.add_argument('--report', help="write per-file and per-directory stats to this JSON file")
+    args = parser.parse_args()
+
+    stats, failures = optimize_tree(args.roots or [PUBLIC_DIR], args.min_psnr, args.jobs, args.dry_run)
+    directories = summarize(stats)
+    print("\nPer directory:")
+    for directory, total in sorted(directories.items()):
+        saved = total['before'] - total['after']
+        print(f"  {directory}: {total['files']} files, {total['before'] / 1024:.0f} KB -> "
+              f"{total['after'] / 1024:.0f} KB (-{saved * 100 / max(1, total['before']):.1f}%), "
+              f"{total['seconds']:.2f}s")
+    before = sum(t['before'] for t in directories.values())
+    after = sum(t['after'] for t in directories.values())
+    print(f"\nTotal: {before / 1024 / 1024:.2f} MB -> {after / 1024 / 1024:.2f} MB")
+
+    if args.report:
+        with open(args.report, 'w', encoding='utf-8') as f:
+            json.dump({'files': stats, 'directories': directories}, f, ensure_ascii=False, indent=1)
+        print(f"Report written: {args.report}")
+    if failures:
+        sys.exit(1)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,305 @@
+import os
+import re
+import json
+import argparse
+import difflib
+import sys
+import time
+from asset_cache import atomic_write_bytes, bytes_digest
+from asset_config import ROOT_DIR, resolve
+
+# Original contents of every patched file, stored by sha256, plus an apply log
+SNAPSHOT_DIR = os.path.join(ROOT_DIR, '.patch_snapshots')
+SNAPSHOT_LOG = os.path.join(SNAPSHOT_DIR, 'log.json')
+
+BOM = '\ufeff'
+
+class PatchError(Exception):
+    pass
+
+def load_patches(path):
+    """
+    Read a JSON list of patches:
+      {"name": ..., "target": "game/src/context/GameContext.tsx",
+       "find": "literal anchor" | "regex": "pattern",
+       "replace": "text (\\1 / \\g<name> allowed for regex)", "count": 1}
+    A patch whose replacement keeps its anchor is skipped once it is in place.
+    """
+    with open(path, 'r', encoding='utf-8') as f:
+        patches = json.load(f)
+    for number, patch in enumerate(patches):
+        patch.setdefault('name', f"patch-{number}")
+        patch.setdefault('count', 1)
+        if ('find' in patch) == ('regex' in patch) or 'replace' not in patch or 'target' not in patch:
+            raise PatchError(f"{patch['name']}: needs target, replace and exactly one of find/regex")
+    return patches
+
+def _pattern(patch, newline):
+    if 'regex' in patch:
+        return patch['regex']
+    return re.escape(patch['find'].replace('\n', newline))
+
+# Pieces of regex syntax that name or number a group, plus escapes and
+# character classes, which are copied through untouched
+_SYNTAX = re.compile(r"\\[0-7]{3}|\\([1-9][0-9]?)|\\.|\[\^?\]?(?:\\.|[^\]\\])*\]"
+                     r"|\(\?P<(\w+)>|\(\?P=(\w+)\)|\(\?\((\w+)\)", re.S)
+_GLOBAL_FLAGS = re.compile(r"\(\?([aiLmsux]+)\)")
+
+def _namespaced(source, i, offset):
+    """
+    Rewrite one patch's pattern so it can sit in a combined regex next to the
+    others: named groups get a _p<i>_ prefix, numbered back-references move
+    up by the groups of the patterns before it, and leading global flags
+    become a scoped group.
+    """
+    def rename(m):
+        if m.group(1):
+            return f"(?:\\{int(m.group(1)) + offset})"
+        if m.group(2):
+            return f"(?P<_p{i}_{m.group(2)}>"
+        if m.group(3):
+            return f"(?P=_p{i}_{m.group(3)})"
+        if m.group(4):
+            ref = m.group(4)
+            return f"(?({int(ref) + offset})" if ref.isdigit() else f"(?(_p{i}_{ref})"
+        return m.group(0)
+
+    flags = ''
+    while (m := _GLOBAL_FLAGS.match(source)):
+        flags += m.group(1)
+        source = source[m.end():]
+    source = _SYNTAX.sub(rename, source)
+    return f"(?{flags}:{source})" if flags else f"(?:{source})"
+
+def locate(text, patches, newline='\n'):
+    """
+    Find every patch in one scan of text.
+    A single combined regex stops only where at least one anchor starts;
+    there each patch's own pattern is re-matched, so anchors that share a
+    start position are all seen and each match keeps its own groups.
+    Matches of one patch do not overlap each other.
+    Returns {patch index: [(start, end, match)]}.
+    """
+    singles = [re.compile(_pattern(p, newline)) for p in patches]
+    parts = []
+    offset = 0
+    for i, single in enumerate(singles):
+        parts.append(_namespaced(single.pattern, i, offset))
+        offset += single.groups
+    combined = re.compile('|'.join(parts))
+    found = {i: [] for i in range(len(patches))}
+    resume = [0] * len(patches)
+    position = 0
+    while position <= len(text):
+        hit = combined.search(text, position)
+        if hit is None:
+            break
+        start = hit.start()
+        for i, single in enumerate(singles):
+            if start < resume[i]:
+                continue
+            match = single.match(text, start)
+            if match is not None:
+                found[i].append((start, match.end(), match))
+                # Zero-width matches would otherwise be found again in place
+                resume[i] = max(match.end(), start + 1)
+        position = start + 1
+    return found
+
+def _in_place(text, start, end, replacement):
+    """
+    True if the replacement already surrounds the match at text[start:end],
+    i.e. a patch whose replacement contains its own anchor has been applied.
+    """
+    anchor = text[start:end]
+    if not anchor:
+        return False
+    offset = replacement.find(anchor)
+    while offset >= 0:
+        if start >= offset and text.startswith(replacement, start - offset):
+            return True
+        offset = replacement.find(anchor, offset + 1)
+    return False
+
+def plan_file(text, patches):
+    """
+    Resolve all patches for one file's text.
+    Returns (new_text, applied names, skipped names); raises PatchError on a
+    missing, ambiguous or overlapping anchor.
+    """
+    newline = '\r\n' if '\r\n' in text else '\n'
+    found = locate(text, patches, newline)
+    edits = []
+    applied, skipped = [], []
+    for i, patch in enumerate(patches):
+        pending = []
+        done = 0
+        for start, end, match in found[i]:
+            if 'regex' in patch:
+                replacement = match.expand(patch['replace'])
+            else:
+                replacement = patch['replace'].replace('\n', newline)
+            if _in_place(text, start, end, replacement):
+                done += 1
+            else:
+                pending.append((start, end, replacement))
+        if not pending:
+            replacement = patch['replace'].replace('\n', newline)
+            if done or ('find' in patch and replacement and replacement in text):
+                skipped.append(patch['name'])
+                continue
+            raise PatchError(f"{patch['name']}: anchor not found")
+        if len(pending) != patch['count']:
+            lines = ', '.join(str(text.count('\n', 0, start) + 1) for start, _, _ in pending)
+            raise PatchError(f"{patch['name']}: expected {patch['count']} match(es), found {len(pending)} (lines {lines})")
+        for start, end, replacement in pending:
+            edits.append((start, end, replacement, patch['name']))
+        applied.append(patch['name'])
+
+    edits.sort(key=lambda e: (e[0], e[1]))
+    for (s1, e1, _, n1), (s2, e2, _, n2) in zip(edits, edits[1:]):
+        if s2 < e1 or (s1 == s2 == e1 == e2):
+            raise PatchError(f"{n1} and {n2} overlap at line {text.count(chr(10), 0, s2) + 1}")
+
+    parts = []
+    position = 0
+    for start, end, replacement, _ in edits:
+        parts.append(text[position:start])
+        parts.append(replacement)
+        position = end
+    parts.append(text[position:])
+    return ''.join(parts), applied, skipped
+
+def _read(path):
+    with open(path, 'rb') as f:
+        data = f.read()
+    text = data.decode('utf-8')
+    # Keep a byte-order mark out of the anchors' way and put it back on write
+    bom = text.startswith(BOM)
+    return data, text[1:] if bom else text, bom
+
+def snapshot(data):
+    """
+    Store data under its sha256 (once) and return the digest.
+    """
+    digest = bytes_digest(data)
+    path = os.path.join(SNAPSHOT_DIR, digest)
+    if not os.path.exists(path):
+        os.makedirs(SNAPSHOT_DIR, exist_ok=True)
+        atomic_write_bytes(path, data)
+    return digest
+
+def _load_log():
+    if not os.path.exists(SNAPSHOT_LOG):
+        return []
+    with open(SNAPSHOT_LOG, 'r', encoding='utf-8') as f:
+        return json.load(f)
+
+def _save_log(log):
+    atomic_write_bytes(SNAPSHOT_LOG, json.dumps(log, ensure_ascii=False, indent=1).encode('utf-8'))
+
+def apply_patches(patches, dry_run=False, show_diff=False):
+    """
+    Patch every target with one read and (at most) one write per file.
+    Nothing is written unless every patch in every file resolves cleanly.
+    Returns {target: (applied, skipped)}.
+    """
+    by_target = {}
+    for patch in patches:
+        by_target.setdefault(resolve(patch['target']), []).append(patch)
+
+    planned = {}
+    errors = []
+    for target, file_patches in by_target.items():
+        try:
+            data, text, bom = _read(target)
+            new_text, applied, skipped = plan_file(text, file_patches)
+        except (OSError, UnicodeDecodeError, PatchError, re.error) as e:
+            errors.append(f"{os.path.relpath(target, ROOT_DIR)}: {e}")
+            continue
+        planned[target] = (data, text, new_text, bom, applied, skipped)
+    if errors:
+        raise PatchError('\n'.join(errors))
+
+    for target, (data, text, new_text, bom, applied, skipped) in planned.items():
+        rel = os.path.relpath(target, ROOT_DIR).replace(os.sep, '/')
+        if show_diff and new_text != text:
+            sys.stdout.writelines(difflib.unified_diff(text.splitlines(True), new_text.splitlines(True),
+                                                       f"a/{rel}", f"b/{rel}"))
+        for name in skipped:
+            print(f"Already applied: {rel}: {name}")
+    if dry_run:
+        return {t: p[4:] for t, p in planned.items()}
+
+    log = _load_log()
+    batch = time.time_ns()
+    written = []
+    try:
+        for target, (data, text, new_text, bom, applied, skipped) in planned.items():
+            if new_text == text:
+                continue
+            before = snapshot(data)
+            new_data = ((BOM if bom else '') + new_text).encode('utf-8')
+            atomic_write_bytes(target, new_data)
+            written.append((target, data))
+            log.append({'batch': batch, 'time': time.strftime('%Y-%m-%dT%H:%M:%S'),
+                        'target': os.path.relpath(target, ROOT_DIR).replace(os.sep, '/'),
+                        'before': before, 'after': bytes_digest(new_data), 'patches': applied})
+            print(f"Patched: {os.path.relpath(target, ROOT_DIR)} ({', '.join(applied)})")
+    except OSError:
+        # Put back the files already written so the batch stays all-or-nothing
+        for target, data in written:
+            atomic_write_bytes(target, data)
+        raise
+    _save_log(log)
+    return {t: p[4:] for t, p in planned.items()}
+
+def undo_last():
+    """
+    Restore the files changed by the most recent apply from their snapshots.
+    A file edited since then is left alone.
+    """
+    log = _load_log()
+    if not log:
+        print("Nothing to undo")
+        return False
+    last = log[-1]['batch']
+    batch = [entry for entry in log if entry['batch'] == last]
+    ok = True
+    for entry in batch:
+        target = resolve(entry['target'])
+        with open(target, 'rb') as f:
+            current = bytes_digest(f.read())
+        if current != entry['after']:
+            print(f"Changed since patching, not restored: {entry['target']}")
+            ok = False
+            continue
+        with open(os.path.join(SNAPSHOT_DIR, entry['before']), 'rb') as f:
+            atomic_write_bytes(target, f.read())
+        print(f"Restored: {entry['target']}")
+    _save_log([entry for entry in log if entry['batch'] != last])
+    return ok
+
+def main():
+    parser = argparse.ArgumentParser(description="Apply anchor-based source patches in one pass per file")
+    parser.add_argument('patch_files', nargs='*', help="JSON patch lists to apply together")
+    parser.add_argument('--dry-run', action='store_true', help="check and show the diff without writing")
+    parser.add_argument('--diff', action='store_true', help="print a unified diff of the changes")
+    parser.add_argument('--undo', action='store_true', help="restore the files changed by the last apply")
+    args = parser.parse_args()
+
+    if args.undo:
+        sys.exit(0 if undo_last() else 1)
+    if not args.patch_files:
+        parser.error("no patch files given")
+    patches = []
+    try:
+        for path in args.patch_files:
+            patches.extend(load_patches(path))
+        apply_patches(patches, dry_run=args.dry_run, show_diff=args.diff or args.dry_run)
+    except PatchError as e:
+        print(f"Patch failed, nothing written:\n{e}")
+        sys.exit(1)
+
+if __name__ == "__main__":
+    main()
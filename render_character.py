@@ -0,0 +1,237 @@
+import io
+import os
+import re
+import json
+import argparse
+import hashlib
+import sys
+from collections import OrderedDict
+from functools import lru_cache
+from PIL import Image, ImageChops
+from asset_cache import atomic_write_bytes
+from asset_config import (COMPOSITE_CACHE_DIR, COMPOSITE_CATALOG, COMPOSITE_FACES_DIR, COMPOSITE_LAYOUT,
+                          COMPOSITE_LRU_SIZE, PUBLIC_DIR, ROOT_DIR)
+from normalize_images import shrink_then_flatten, iter_results
+
+# clothes.ts category -> layout slot
+SLOTS = {'top': 'top', 'bottom': 'bottom', 'shoes': 'shoes', 'accessory': 'accessory'}
+# Shown when a slot is empty, like the base outfit in the game
+BASE_LAYERS = {
+    'top': os.path.join(ROOT_DIR, 'clothes', 'base', 'base top.png'),
+    'bottom': os.path.join(ROOT_DIR, 'clothes', 'base', 'base bot.png'),
+    'shoes': os.path.join(ROOT_DIR, 'clothes', 'base', 'base shoes.png'),
+}
+FORMATS = {'png': ('PNG', {'compress_level': 6}), 'webp': ('WEBP', {'quality': 90, 'method': 4})}
+WHITE = (255, 255, 255)
+
+_ITEM = re.compile(r"\{\s*id:\s*'([^']+)'[^}]*?category:\s*'([^']+)'[^}]*?img:\s*(?:'([^']*)'|null)")
+
+def load_catalog(path=COMPOSITE_CATALOG):
+    """
+    {item id: (slot, image path)} parsed from data/clothes.ts.
+    """
+    with open(path, 'r', encoding='utf-8') as f:
+        text = f.read()
+    catalog = {}
+    for item_id, category, img in _ITEM.findall(text):
+        if img and category in SLOTS:
+            catalog[item_id] = (SLOTS[category], os.path.join(PUBLIC_DIR, *img.lstrip('/').split('/')))
+    return catalog
+
+def canonical_spec(spec):
+    """
+    Normalized outfit spec: {'face', 'top', 'bottom', 'shoes', 'accessories'}.
+    Accessories are sorted so the same outfit always has the same key.
+    """
+    return {
+        'face': spec.get('face'),
+        'top': spec.get('top'),
+        'bottom': spec.get('bottom'),
+        'shoes': spec.get('shoes'),
+        'accessories': sorted(spec.get('accessories') or []),
+    }
+
+@lru_cache(maxsize=256)
+def _layer(path, box_w, box_h, mtime_ns):
+    """
+    One layer shrunk into its box and flattened onto white (decoded once
+    per path, size and file version).
+    """
+    with Image.open(path) as img:
+        img.load()
+    return shrink_then_flatten(img, (box_w, box_h), WHITE, Image.Resampling.LANCZOS)
+
+class CompositeRenderer:
+    """
+    Render an outfit card: the character's figure next to the garments and
+    accessories it wears, each in its own box.
+
+    The "face" assets are full-body chibi figures drawn in their own
+    clothes, so garments cannot be layered onto them; the card shows the
+    figure and the chosen items side by side instead. Normalized layers
+    are opaque on white and are multiplied onto a white canvas, so no
+    alpha masks are needed. Results are cached in a bounded LRU and on
+    disk under a hash of (spec, size, format, layout, layer files).
+    """
+
+    def __init__(self, catalog=None, layout=None, cache_dir=COMPOSITE_CACHE_DIR, lru_size=COMPOSITE_LRU_SIZE,
+                 faces_dir=COMPOSITE_FACES_DIR):
+        self.catalog = catalog if catalog is not None else load_catalog()
+        self.layout = layout or COMPOSITE_LAYOUT
+        self.cache_dir = cache_dir
+        self.faces_dir = faces_dir
+        self.lru_size = lru_size
+        self.lru = OrderedDict()
+
+    def layers(self, spec):
+        """
+        [(slot, box index, path)] in paint order; unknown ids raise KeyError.
+        """
+        spec = canonical_spec(spec)
+        layers = []
+        for slot in ('top', 'bottom', 'shoes'):
+            item = spec[slot]
+            if item is None:
+                if os.path.exists(BASE_LAYERS[slot]):
+                    layers.append((slot, 0, BASE_LAYERS[slot]))
+                continue
+            item_slot, path = self.catalog[item]
+            if item_slot != slot:
+                raise KeyError(f"{item} is a {item_slot} item, not {slot}")
+            layers.append((slot, 0, path))
+        if spec['face']:
+            layers.append(('figure', 0, os.path.join(self.faces_dir, f"{spec['face']}.png")))
+        for index, item in enumerate(spec['accessories'][:len(self.layout['accessory'])]):
+            layers.append(('accessory', index, self.catalog[item][1]))
+        return layers
+
+    def cache_key(self, spec, size, fmt):
+        """
+        Content address of a render: changes whenever the spec, output
+        settings, layout or any layer file (size/mtime) changes.
+        """
+        stamps = []
+        for slot, index, path in self.layers(spec):
+            st = os.stat(path)
+            stamps.append([slot, index, os.path.relpath(path, ROOT_DIR), st.st_size, st.st_mtime_ns])
+        payload = json.dumps([canonical_spec(spec), list(size), fmt, self.layout, stamps], sort_keys=True)
+        return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
+    def _disk_path(self, key, fmt):
+        return os.path.join(self.cache_dir, key[:2], f"{key}.{fmt}")
+
+    def compose(self, spec, size):
+        """
+        Build the outfit card (no caching).
+        """
+        width, height = size
+        canvas = Image.new('RGB', (width, height), WHITE)
+        for slot, index, path in self.layers(spec):
+            left, top, box_w, box_h = self.layout[slot][index]
+            box = (max(1, round(box_w * width)), max(1, round(box_h * height)))
+            layer = _layer(path, box[0], box[1], os.stat(path).st_mtime_ns)
+            x, y = round(left * width), round(top * height)
+            region = canvas.crop((x, y, x + box[0], y + box[1]))
+            canvas.paste(ImageChops.multiply(region, layer.crop((0, 0) + region.size)), (x, y))
+        return canvas
+
+    def render(self, spec, size=(256, 384), fmt='png'):
+        """
+        Encoded card bytes, from the LRU, the disk cache or a fresh render.
+        """
+        size = tuple(size)
+        key = self.cache_key(spec, size, fmt)
+        data = self.lru.get(key)
+        if data is not None:
+            self.lru.move_to_end(key)
+            return data
+        path = self._disk_path(key, fmt)
+        if os.path.exists(path):
+            with open(path, 'rb') as f:
+                data = f.read()
+        else:
+            image_format, options = FORMATS[fmt]
+            out = io.BytesIO()
+            self.compose(spec, size).save(out, image_format, **options)
+            data = out.getvalue()
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            atomic_write_bytes(path, data)
+        self.lru[key] = data
+        if len(self.lru) > self.lru_size:
+            self.lru.popitem(last=False)
+        return data
+
+    def render_path(self, spec, size=(256, 384), fmt='png'):
+        """
+        Path of the cached card on disk (rendered first when needed),
+        for servers that send files rather than bytes.
+        """
+        self.render(spec, size, fmt)
+        return self._disk_path(self.cache_key(spec, size, fmt), fmt)
+
+_worker_renderer = None
+
+def _prerender_task(task):
+    global _worker_renderer
+    spec, size, fmt, cache_dir = task
+    if _worker_renderer is None or _worker_renderer.cache_dir != cache_dir:
+        _worker_renderer = CompositeRenderer(cache_dir=cache_dir, lru_size=0)
+    try:
+        return spec, _worker_renderer.render_path(spec, size, fmt), None
+    except (OSError, KeyError) as e:
+        return spec, None, str(e)
+
+def prerender(specs, size=(256, 384), fmt='png', jobs=1, cache_dir=COMPOSITE_CACHE_DIR):
+    """
+    Render many outfits into the disk cache (e.g. the Top5 or the most
+    worn combinations). Returns [(spec, path or None, error or None)].
+    """
+    tasks = [(canonical_spec(spec), tuple(size), fmt, cache_dir) for spec in specs]
+    return list(iter_results(_prerender_task, tasks, jobs))
+
+def main():
+    parser = argparse.ArgumentParser(description="Render an outfit card (character figure + garments) into one image")
+    parser.add_argument('--face', help="character figure id from public/faces, e.g. lbb")
+    parser.add_argument('--top', help="clothes item id for the top slot")
+    parser.add_argument('--bottom', help="clothes item id for the bottom slot")
+    parser.add_argument('--shoes', help="clothes item id for the shoes slot")
+    parser.add_argument('--accessory', action='append', default=[], help="accessory item id (repeatable)")
+    parser.add_argument('--size', default='256x384', help="output WIDTHxHEIGHT")
+    parser.add_argument('--format', choices=sorted(FORMATS), default='png', help="output format")
+    parser.add_argument('-o', '--output', help="write the image here (default: print the cache path)")
+    parser.add_argument('--batch', help="JSON list of specs to pre-render into the cache")
+    parser.add_argument('-j', '--jobs', type=int, default=os.cpu_count() or 1,
+                        help="worker processes for --batch")
+    args = parser.parse_args()
+
+    size = tuple(int(v) for v in args.size.lower().split('x'))
+    if args.batch:
+        with open(args.batch, 'r', encoding='utf-8') as f:
+            specs = json.load(f)
+        failed = 0
+        for spec, path, error in prerender(specs, size, args.format, args.jobs):
+            if error is not None:
+                failed += 1
+                print(f"Error rendering {json.dumps(spec, ensure_ascii=False)}: {error}")
+            else:
+                print(f"Rendered: {path}")
+        print(f"\nPre-rendered {len(specs) - failed} of {len(specs)} outfit(s)")
+        if failed:
+            sys.exit(1)
+        return
+
+    spec = {'face': args.face, 'top': args.top, 'bottom': args.bottom, 'shoes': args.shoes,
+            'accessories': args.accessory}
+    renderer = CompositeRenderer()
+    try:
+        if args.output:
+            atomic_write_bytes(args.output, renderer.render(spec, size, args.format))
+            print(f"Written: {args.output}")
+        else:
+            print(renderer.render_path(spec, size, args.format))
+    except (OSError, KeyError) as e:
+        print(f"Error rendering: {e}")
+        sys.exit(1)
+
+if __name__ == "__main__":
+    main()
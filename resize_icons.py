@@ -1,35 +1,153 @@
 from PIL import Image
+import io
 import os
+import argparse
+import sys
 from pathlib import Path
+import asset_metrics as metrics
+from asset_cache import AssetManifest, atomic_write_bytes, bytes_digest, file_digest
+from asset_config import ICON_CACHE, ICON_MASTERS_DIR, ICON_OUTPUT_DIR, ICON_SIZES
+from normalize_images import profile_params, trim_margins
 
-# Папка с иконками
-icons_dir = r"c:\Users\2ой пользователь\kpop 1.4\game\public\teamicons"
-
-# Получить список всех PNG файлов
-png_files = list(Path(icons_dir).glob("*.png"))
-
-print(f"Найдено {len(png_files)} иконок для обработки")
-
-for png_file in png_files:
-    try:
-        # Открыть изображение
-        img = Image.open(png_file)
-        
-        # Получить текущий размер
-        width, height = img.size
-        
-        # Уменьшить на 15% (оставить 85%)
-        new_width = int(width * 0.85)
-        new_height = int(height * 0.85)
-        
-        # Изменить размер с высоким качеством
-        resized_img = img.resize((new_width, new_height), Image.Resampling.LANCZOS)
-        
-        # Сохранить обратно
-        resized_img.save(png_file, quality=95)
-        
-        print(f"✓ {png_file.name}: {width}x{height} → {new_width}x{new_height}")
-    except Exception as e:
-        print(f"✗ Ошибка при обработке {png_file.name}: {e}")
-
-print("\nВсе иконки обработаны!")
+# Всё, что влияет на байты результата; хранится в кэше сборки.
+# Фильтр и обрезка полей берутся из профиля 'teamicons' (NORMALIZE_PROFILES)
+_PROFILE = profile_params('teamicons')
+ICON_PARAMS = {'resample': _PROFILE['resample'], 'compress_level': 9, 'trim': _PROFILE.get('trim')}
+
+def resize_icons(icons_dir, scale=0.85):
+    """
+    Уменьшить все PNG иконки в папке на месте. Возвращает число обработанных файлов.
+    Каждый запуск снова уменьшает иконки; для сборки используйте build_icons.
+    """
+    # Получить список всех PNG файлов
+    png_files = list(Path(icons_dir).glob("*.png"))
+
+    print(f"Найдено {len(png_files)} иконок для обработки")
+
+    processed = 0
+    for png_file in png_files:
+        try:
+            # Открыть изображение
+            img = Image.open(png_file)
+
+            # Получить текущий размер
+            width, height = img.size
+
+            # Уменьшить на 15% (оставить 85%)
+            new_width = int(width * scale)
+            new_height = int(height * scale)
+
+            # Изменить размер с высоким качеством
+            resized_img = img.resize((new_width, new_height), Image.Resampling.LANCZOS)
+
+            # Сохранить обратно
+            resized_img.save(png_file, quality=95)
+            processed += 1
+
+            print(f"✓ {png_file.name}: {width}x{height} → {new_width}x{new_height}")
+        except Exception as e:
+            print(f"✗ Ошибка при обработке {png_file.name}: {e}")
+
+    print("\nВсе иконки обработаны!")
+    return processed
+
+def icon_output_name(filename, size, primary):
+    stem = os.path.splitext(filename)[0]
+    return f"{stem}.png" if primary else f"{stem}@{size}.png"
+
+def render_icon(img, size):
+    """
+    Вписать иконку в квадрат size x size (без увеличения) и закодировать
+    детерминированно: одинаковый мастер всегда даёт одинаковые байты.
+    """
+    with metrics.stage('convert'):
+        img = img.convert('RGBA' if img.mode in ('RGBA', 'LA', 'P') else 'RGB')
+    if ICON_PARAMS['trim'] is not None:
+        # Прозрачные поля мастера не должны занимать место в квадрате
+        with metrics.stage('trim'):
+            img = trim_margins(img, ICON_PARAMS['trim'])
+    with metrics.stage('thumbnail'):
+        if max(img.size) > size:
+            scale = size / max(img.size)
+            new_size = (max(1, round(img.size[0] * scale)), max(1, round(img.size[1] * scale)))
+            img = img.resize(new_size, getattr(Image.Resampling, ICON_PARAMS['resample']))
+    metrics.count(out_pixels=img.size[0] * img.size[1])
+    with metrics.stage('encode'):
+        out = io.BytesIO()
+        # Без ICC/текстовых чанков и с фиксированным уровнем сжатия
+        img.save(out, 'PNG', compress_level=ICON_PARAMS['compress_level'], icc_profile=None)
+    return out.getvalue()
+
+def build_icons(masters_dir=ICON_MASTERS_DIR, output_dir=ICON_OUTPUT_DIR, sizes=None, use_cache=True,
+                cache_path=ICON_CACHE):
+    """
+    Сгенерировать иконки нужных размеров из нетронутых мастеров.
+    Повторный запуск ничего не перезаписывает, если мастер и параметры не менялись.
+    Возвращает список (файл, ошибка) для неудачных иконок.
+    """
+    sizes = sizes or ICON_SIZES
+    params = dict(ICON_PARAMS, sizes=sizes)
+    os.makedirs(output_dir, exist_ok=True)
+    cache = AssetManifest(cache_path)
+
+    masters = sorted(p for p in Path(masters_dir).glob("*.png"))
+    cache.prune({cache.key_for(str(p)) for p in masters})
+    print(f"Найдено {len(masters)} мастеров иконок")
+
+    failures = []
+    skipped = 0
+    for master in masters:
+        key = cache.key_for(str(master))
+        if use_cache and cache.is_fresh(key, str(master), params):
+            skipped += 1
+            continue
+        metrics.begin('resize_icons', str(master))
+        try:
+            with metrics.stage('decode'), Image.open(master) as img:
+                img.load()
+            metrics.count(in_bytes=master.stat().st_size, in_pixels=img.size[0] * img.size[1])
+            outputs = {}
+            for index, size in enumerate(sizes):
+                data = render_icon(img, size)
+                out_path = os.path.join(output_dir, icon_output_name(master.name, size, index == 0))
+                digest = bytes_digest(data)
+                metrics.count(out_bytes=len(data))
+                # Байты совпали — файл не трогаем (mtime тоже остаётся прежним)
+                with metrics.stage('write'):
+                    if not (os.path.exists(out_path) and file_digest(out_path) == digest):
+                        atomic_write_bytes(out_path, data)
+                        print(f"✓ {master.name} → {os.path.basename(out_path)} ({size}px)")
+                outputs[out_path] = digest
+            cache.record(key, str(master), params, outputs)
+            metrics.end()
+        except Exception as e:
+            metrics.end(error=str(e))
+            print(f"✗ Ошибка при обработке {master.name}: {e}")
+            failures.append((str(master), str(e)))
+    cache.save()
+
+    print(f"\nАктуальны: {skipped}, обработано: {len(masters) - skipped - len(failures)}, ошибок: {len(failures)}")
+    return failures
+
+def main():
+    parser = argparse.ArgumentParser(description="Сгенерировать иконки команд из мастеров")
+    parser.add_argument('--masters', default=ICON_MASTERS_DIR, help="папка с нетронутыми мастерами")
+    parser.add_argument('--output', default=ICON_OUTPUT_DIR, help="папка для готовых иконок")
+    parser.add_argument('--sizes', help=f"размеры через запятую (по умолчанию: {ICON_SIZES})")
+    parser.add_argument('--force', action='store_true', help="пересобрать все иконки")
+    parser.add_argument('--in-place-scale', type=float,
+                        help="старый режим: уменьшить иконки в --output на месте в заданное число раз")
+    metrics.add_arguments(parser)
+    args = parser.parse_args()
+
+    if args.in_place_scale:
+        resize_icons(args.output, args.in_place_scale)
+        return
+    sizes = [int(s) for s in args.sizes.split(',')] if args.sizes else None
+    with metrics.from_args(args):
+        failures = build_icons(args.masters, args.output, sizes, use_cache=not args.force)
+    if failures:
+        sys.exit(1)
+
+if __name__ == "__main__":
+    main()
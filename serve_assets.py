@@ -0,0 +1,414 @@
+import os
+import json
+import argparse
+import asyncio
+import gzip
+import mimetypes
+import sys
+import time
+from email.utils import formatdate
+from http import HTTPStatus
+from urllib.parse import unquote, urlsplit
+from asset_cache import atomic_write_bytes
+from asset_config import (FINGERPRINT_MANIFEST, PUBLIC_DIR, SERVE_GZIP_MIN_SIZE, SERVE_GZIP_RATIO, SERVE_HOST,
+                          SERVE_PORT, SERVE_PRECOMPRESS)
+from asset_paths import FINGERPRINTED, PRECOMPRESSED
+from sync_assets import scan_tree
+
+# Hashed copies never change under the same name; everything else revalidates by ETag
+IMMUTABLE = 'public, max-age=31536000, immutable'
+REVALIDATE = 'no-cache'
+CONTENT_TYPES = {
+    '.mp3': 'audio/mpeg',
+    '.wav': 'audio/wav',
+    '.webp': 'image/webp',
+    '.svg': 'image/svg+xml',
+    '.json': 'application/json',
+}
+MAX_HEADERS = 100
+
+def precompress(public_dir=PUBLIC_DIR, extensions=SERVE_PRECOMPRESS, min_size=SERVE_GZIP_MIN_SIZE,
+                ratio=SERVE_GZIP_RATIO, force=False):
+    """
+    Write name.ext.gz next to every text asset that is missing one or whose
+    .gz is older than the source, and remove .gz files whose source is gone.
+    Output is deterministic (no timestamp in the gzip header).
+    Returns {'written', 'unchanged', 'skipped', 'pruned'} counts.
+    """
+    stats = {'written': 0, 'unchanged': 0, 'skipped': 0, 'pruned': 0}
+    tree = scan_tree(public_dir)
+    for rel, dirent in sorted(tree.items()):
+        if rel.endswith(PRECOMPRESSED):
+            source = rel[:-len(PRECOMPRESSED)]
+            if source not in tree or not source.lower().endswith(extensions):
+                os.remove(dirent.path)
+                stats['pruned'] += 1
+                print(f"Pruned: {rel}")
+            continue
+        if not rel.lower().endswith(extensions):
+            continue
+        st = dirent.stat()
+        gz = tree.get(rel + PRECOMPRESSED)
+        if gz is not None and not force and gz.stat().st_mtime_ns >= st.st_mtime_ns:
+            stats['unchanged'] += 1
+            continue
+        if st.st_size < min_size:
+            stats['skipped'] += 1
+            continue
+        with open(dirent.path, 'rb') as f:
+            data = f.read()
+        packed = gzip.compress(data, 9, mtime=0)
+        if len(packed) > len(data) * ratio:
+            # Not worth a second representation; drop an outdated one
+            if gz is not None:
+                os.remove(gz.path)
+            stats['skipped'] += 1
+            continue
+        atomic_write_bytes(dirent.path + PRECOMPRESSED, packed)
+        stats['written'] += 1
+        print(f"Compressed: {rel} ({len(data)} -> {len(packed)} bytes)")
+    return stats
+
+def parse_range(header, size):
+    """
+    Inclusive (start, end) for a single "bytes=" range, or None to send the
+    whole file (no header, a malformed one or several ranges).
+    Raises ValueError when the range lies outside the file.
+    """
+    if not header or not header.startswith('bytes=') or ',' in header:
+        return None
+    first, sep, last = header[6:].strip().partition('-')
+    if not sep or not (first or last) or (first and not first.isdigit()) or (last and not last.isdigit()):
+        return None
+    if not first:
+        # "bytes=-500": the last 500 bytes
+        suffix = int(last)
+        if suffix == 0 or size == 0:
+            raise ValueError(header)
+        return max(0, size - suffix), size - 1
+    start = int(first)
+    if start >= size:
+        raise ValueError(header)
+    end = int(last) if last else size - 1
+    if end < start:
+        return None
+    return start, min(end, size - 1)
+
+def accepts_gzip(header):
+    """
+    True when Accept-Encoding allows gzip (explicitly or via "*", without q=0).
+    """
+    allowed = {}
+    for part in (header or '').split(','):
+        coding, _, params = part.strip().partition(';')
+        q = 1.0
+        for param in params.split(';'):
+            key, _, value = param.strip().partition('=')
+            if key == 'q':
+                try:
+                    q = float(value)
+                except ValueError:
+                    q = 0.0
+        allowed[coding.strip().lower()] = q
+    q = allowed.get('gzip', allowed.get('x-gzip', allowed.get('*', 0.0)))
+    return q > 0
+
+def etag_matches(header, etag):
+    """
+    Weak comparison for If-None-Match: "W/" prefixes are ignored, "*" matches anything.
+    """
+    if not header:
+        return False
+    if header.strip() == '*':
+        return True
+    bare = etag[2:] if etag.startswith('W/') else etag
+    return any((tag.strip()[2:] if tag.strip().startswith('W/') else tag.strip()) == bare
+               for tag in header.split(','))
+
+def content_type(path):
+    ext = os.path.splitext(path)[1].lower()
+    if ext in CONTENT_TYPES:
+        return CONTENT_TYPES[ext]
+    guessed, _ = mimetypes.guess_type(path)
+    return guessed or 'application/octet-stream'
+
+class AssetServer:
+    """
+    Production-like static server for game/public.
+
+    Hashed copies get immutable caching and every asset known to the
+    fingerprint manifest a strong ETag (its sha256); other files fall back
+    to a weak size/mtime ETag. Single byte ranges are honoured for audio
+    seeking, fresh .gz siblings are sent to clients that accept gzip, and
+    bodies go out through loop.sendfile (zero-copy where the platform has
+    it). rate (bytes/s per connection) and delay (s per request) emulate a
+    mobile link; with a rate, bodies are paced writes instead of sendfile.
+    """
+
+    def __init__(self, public_dir=PUBLIC_DIR, manifest_path=FINGERPRINT_MANIFEST, rate=0, delay=0.0, quiet=False):
+        self.public_dir = public_dir
+        self.manifest_path = manifest_path
+        self.rate = rate
+        self.delay = delay
+        self.quiet = quiet
+        self._manifest_stamp = None
+        self._etags = {}
+        self.latencies = []
+        self.statuses = {}
+        self.bytes_sent = 0
+        self.started = time.perf_counter()
+
+    def _load_etags(self):
+        """
+        {url: (sha256, size)} for logical and hashed paths; reloaded whenever
+        fingerprint_assets.py rewrites the manifest.
+        """
+        try:
+            st = os.stat(self.manifest_path)
+        except FileNotFoundError:
+            self._manifest_stamp, self._etags = None, {}
+            return self._etags, 0
+        if self._manifest_stamp != st.st_mtime_ns:
+            with open(self.manifest_path, 'r', encoding='utf-8') as f:
+                manifest = json.load(f)
+            etags = {}
+            for logical, data in manifest.items():
+                etags[logical] = etags[data['file']] = (data['sha256'], data['size'])
+            self._manifest_stamp, self._etags = st.st_mtime_ns, etags
+        return self._etags, self._manifest_stamp
+
+    def etag_for(self, url, st):
+        etags, stamp = self._load_etags()
+        known = etags.get(url)
+        # A logical file edited after fingerprinting no longer has the recorded hash
+        if known is not None and known[1] == st.st_size and (FINGERPRINTED.search(url) or st.st_mtime_ns <= stamp):
+            return f'"{known[0]}"'
+        return f'W/"{st.st_size:x}-{st.st_mtime_ns:x}"'
+
+    def resolve(self, target):
+        """
+        Request target -> (url path, file path), or None when it tries to
+        leave the public directory.
+        """
+        url = unquote(urlsplit(target).path)
+        parts = [p for p in url.split('/') if p not in ('', '.')]
+        if any(p == '..' or '\\' in p or '\0' in p or ':' in p for p in parts):
+            return None
+        path = os.path.join(self.public_dir, *parts)
+        if os.path.isdir(path):
+            parts.append('index.html')
+            path = os.path.join(path, 'index.html')
+        return '/' + '/'.join(parts), path
+
+    async def handle(self, reader, writer):
+        try:
+            while True:
+                request_line = await reader.readline()
+                if not request_line:
+                    break
+                start = time.perf_counter()
+                headers = {}
+                for _ in range(MAX_HEADERS):
+                    line = await reader.readline()
+                    if line in (b'\r\n', b'\n', b''):
+                        break
+                    name, _, value = line.decode('latin-1').partition(':')
+                    headers[name.strip().lower()] = value.strip()
+                try:
+                    method, target, version = request_line.decode('latin-1').split()
+                except ValueError:
+                    await self._send_head(writer, 400, {}, 0, False)
+                    self._log('-', request_line.decode('latin-1').strip(), 400, 0, start, '')
+                    break
+                length = int(headers.get('content-length') or 0)
+                if length:
+                    await reader.readexactly(length)
+                connection = headers.get('connection', '').lower()
+                keep_alive = connection == 'keep-alive' if version == 'HTTP/1.0' else connection != 'close'
+                status, sent, note = await self.respond(writer, method, target, headers, keep_alive)
+                self._log(method, target, status, sent, start, note)
+                if not keep_alive:
+                    break
+        except (ConnectionError, asyncio.IncompleteReadError, ValueError):
+            pass
+        except asyncio.CancelledError:
+            # Server shutting down with the connection still open
+            pass
+        finally:
+            writer.close()
+            try:
+                await writer.wait_closed()
+            except (ConnectionError, asyncio.CancelledError):
+                pass
+
+    async def respond(self, writer, method, target, request, keep_alive):
+        """
+        Answer one request. Returns (status, body bytes sent, log note).
+        """
+        if self.delay:
+            await asyncio.sleep(self.delay)
+        if method not in ('GET', 'HEAD'):
+            body = b'Method not allowed\n'
+            await self._send_head(writer, 405, {'Allow': 'GET, HEAD'}, len(body), keep_alive)
+            writer.write(body)
+            return 405, len(body), ''
+        resolved = self.resolve(target)
+        try:
+            url, path = resolved if resolved is not None else (None, None)
+            st = os.stat(path) if path is not None else None
+        except OSError:
+            st = None
+        if st is None:
+            body = b'Not found\n'
+            await self._send_head(writer, 404, {}, len(body), keep_alive)
+            if method == 'GET':
+                writer.write(body)
+            return 404, len(body) if method == 'GET' else 0, ''
+
+        etag = self.etag_for(url, st)
+        headers = {
+            'Content-Type': content_type(path),
+            'Last-Modified': formatdate(st.st_mtime, usegmt=True),
+            'Cache-Control': IMMUTABLE if FINGERPRINTED.search(url) else REVALIDATE,
+            'Accept-Ranges': 'bytes',
+        }
+        send_path, offset, count, status, note = path, 0, st.st_size, 200, ''
+        if url.lower().endswith(SERVE_PRECOMPRESS):
+            headers['Vary'] = 'Accept-Encoding'
+            # Ranges address the identity bytes (audio players never ask for gzip anyway)
+            if 'range' not in request and accepts_gzip(request.get('accept-encoding')):
+                try:
+                    gz = os.stat(path + PRECOMPRESSED)
+                except OSError:
+                    gz = None
+                if gz is not None and gz.st_mtime_ns >= st.st_mtime_ns:
+                    send_path, count, note = path + PRECOMPRESSED, gz.st_size, ' gzip'
+                    headers['Content-Encoding'] = 'gzip'
+                    etag = etag[:-1] + '-gz"'
+        headers['ETag'] = etag
+
+        if etag_matches(request.get('if-none-match'), etag):
+            await self._send_head(writer, 304, headers, None, keep_alive)
+            return 304, 0, note
+
+        # If-Range needs a strong validator: a weak ETag never matches
+        if_range = request.get('if-range')
+        if 'range' in request and (if_range is None or if_range == headers['Last-Modified']
+                                   or (if_range == etag and not etag.startswith('W/'))):
+            try:
+                byte_range = parse_range(request['range'], st.st_size)
+            except ValueError:
+                await self._send_head(writer, 416, {'Content-Range': f"bytes */{st.st_size}"}, 0, keep_alive)
+                return 416, 0, ''
+            if byte_range is not None:
+                offset, end = byte_range
+                count = end - offset + 1
+                status = 206
+                headers['Content-Range'] = f"bytes {offset}-{end}/{st.st_size}"
+                note = f" range {offset}-{end}/{st.st_size}"
+
+        await self._send_head(writer, status, headers, count, keep_alive)
+        if method == 'HEAD' or count == 0:
+            return status, 0, note
+        await self._send_body(writer, send_path, offset, count)
+        return status, count, note
+
+    async def _send_head(self, writer, status, headers, length, keep_alive):
+        lines = [f"HTTP/1.1 {status} {HTTPStatus(status).phrase}",
+                 f"Date: {formatdate(usegmt=True)}",
+                 "Server: serve_assets.py",
+                 # Lets the game on the Vite port fetch() assets and read Resource Timing
+                 "Access-Control-Allow-Origin: *",
+                 "Timing-Allow-Origin: *",
+                 f"Connection: {'keep-alive' if keep_alive else 'close'}"]
+        lines.extend(f"{name}: {value}" for name, value in headers.items())
+        if length is not None:
+            lines.append(f"Content-Length: {length}")
+        writer.write(('\r\n'.join(lines) + '\r\n\r\n').encode('latin-1'))
+        await writer.drain()
+
+    async def _send_body(self, writer, path, offset, count):
+        loop = asyncio.get_running_loop()
+        with open(path, 'rb') as f:
+            if not self.rate:
+                # os.sendfile on plain sockets; asyncio falls back to reads elsewhere
+                await loop.sendfile(writer.transport, f, offset, count)
+                return
+            f.seek(offset)
+            # Tenth-of-a-second slices keep the pacing smooth
+            chunk_size = max(1024, self.rate // 10)
+            left = count
+            while left:
+                chunk = f.read(min(chunk_size, left))
+                if not chunk:
+                    raise ConnectionError("file shrank while sending")
+                writer.write(chunk)
+                await writer.drain()
+                left -= len(chunk)
+                await asyncio.sleep(len(chunk) / self.rate)
+
+    def _log(self, method, target, status, sent, start, note):
+        elapsed = (time.perf_counter() - start) * 1000
+        self.latencies.append(elapsed)
+        self.statuses[status] = self.statuses.get(status, 0) + 1
+        self.bytes_sent += sent
+        if not self.quiet:
+            print(f"{status} {method} {target} {sent} B {elapsed:.1f} ms{note}")
+
+    def summary(self):
+        """
+        Request count, status mix, bytes, throughput and latency percentiles so far.
+        """
+        if not self.latencies:
+            return "No requests served"
+        ordered = sorted(self.latencies)
+
+        def pct(p):
+            return ordered[min(len(ordered) - 1, int(len(ordered) * p))]
+
+        elapsed = time.perf_counter() - self.started
+        statuses = ', '.join(f"{code}: {n}" for code, n in sorted(self.statuses.items()))
+        return (f"{len(ordered)} request(s) ({statuses}), {self.bytes_sent / 1e6:.1f} MB "
+                f"({self.bytes_sent / 1e6 / elapsed:.2f} MB/s over {elapsed:.0f} s); latency ms "
+                f"p50 {pct(0.5):.1f}, p95 {pct(0.95):.1f}, p99 {pct(0.99):.1f}, max {ordered[-1]:.1f}")
+
+async def serve(server, host=SERVE_HOST, port=SERVE_PORT):
+    listener = await asyncio.start_server(server.handle, host, port)
+    print(f"Serving {server.public_dir} at http://{host}:{port}/ (Ctrl-C to stop)")
+    async with listener:
+        await listener.serve_forever()
+
+def main():
+    parser = argparse.ArgumentParser(description="Serve game/public like production: ETags, ranges, gzip siblings")
+    parser.add_argument('--public', default=PUBLIC_DIR, help="directory to serve")
+    parser.add_argument('--manifest', default=FINGERPRINT_MANIFEST, help="fingerprint manifest with the ETags")
+    parser.add_argument('--host', default=SERVE_HOST, help="address to listen on")
+    parser.add_argument('--port', type=int, default=SERVE_PORT, help="port to listen on")
+    parser.add_argument('--precompress', action='store_true', help="build .gz siblings for text assets first")
+    parser.add_argument('--no-serve', action='store_true', help="with --precompress: exit after building")
+    parser.add_argument('--rate', type=float, default=0,
+                        help="emulate a slow link: KB/s per connection (0 = unthrottled, uses sendfile)")
+    parser.add_argument('--delay', type=float, default=0, help="emulate latency: ms added to every request")
+    parser.add_argument('-q', '--quiet', action='store_true', help="no per-request lines, only the summary")
+    args = parser.parse_args()
+
+    if args.precompress:
+        stats = precompress(args.public)
+        print(f"Precompressed: {stats['written']}, unchanged: {stats['unchanged']}, "
+              f"skipped: {stats['skipped']}, pruned: {stats['pruned']}")
+        if args.no_serve:
+            return
+    server = AssetServer(args.public, args.manifest, rate=int(args.rate * 1024), delay=args.delay / 1000,
+                         quiet=args.quiet)
+    try:
+        asyncio.run(serve(server, args.host, args.port))
+    except KeyboardInterrupt:
+        pass
+    except OSError as e:
+        print(f"Error starting server: {e}")
+        sys.exit(1)
+    finally:
+        print(f"\n{server.summary()}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,221 @@
+import os
+import re
+import argparse
+import fnmatch
+import shutil
+import sys
+from asset_cache import file_digest
+from asset_config import PUBLIC_DIR, REFERENCE_ROOTS, SYNC_MAPPINGS, resolve
+from asset_paths import ASSET_LITERAL, FINGERPRINTED, PRECOMPRESSED, SOURCE_EXTENSIONS, logical_path
+
+# ${...} placeholders inside template literals
+_PLACEHOLDER = re.compile(r"\$\{[^}]*\}")
+
+# Generated alongside the synced assets by other stages; never pruned
+_GENERATED = ('_variants', 'atlases')
+
+FICLONE = 0x40049409
+
+class ReferenceIndex:
+    """
+    Every public asset path mentioned in the game sources.
+    Plain literals are exact paths; template literals and string prefixes
+    that end in "/" become single-directory wildcard patterns.
+    """
+
+    def __init__(self):
+        self.exact = set()
+        self.patterns = set()
+
+    def add(self, literal):
+        if '${' in literal:
+            self.patterns.add(_PLACEHOLDER.sub('*', literal))
+        elif literal.endswith('/'):
+            # '/faces/' + name: anything directly inside that folder
+            self.patterns.add(literal + '*')
+        else:
+            # A rewritten reference still needs its logical file synced
+            self.exact.add(logical_path(literal))
+
+    def compile(self):
+        regexes = []
+        for pattern in sorted(self.patterns):
+            # "*" must not cross directory boundaries
+            regex = fnmatch.translate(pattern).replace('.*', '[^/]*')
+            regexes.append(regex)
+        self._matcher = re.compile('|'.join(regexes)) if regexes else None
+
+    def __contains__(self, url):
+        if url in self.exact:
+            return True
+        return self._matcher is not None and self._matcher.match(url) is not None
+
+def build_reference_index(roots=REFERENCE_ROOTS):
+    """
+    Read every source file once and collect the asset paths it mentions.
+    """
+    index = ReferenceIndex()
+    stack = [resolve(r) for r in roots]
+    while stack:
+        path = stack.pop()
+        if os.path.isdir(path):
+            with os.scandir(path) as it:
+                stack.extend(d.path for d in it if not d.name.startswith('.') and d.name != 'node_modules')
+            continue
+        if not path.endswith(SOURCE_EXTENSIONS):
+            continue
+        with open(path, 'r', encoding='utf-8', errors='replace') as f:
+            text = f.read()
+        for match in ASSET_LITERAL.finditer(text):
+            index.add(match.group(2) or match.group(3))
+    index.compile()
+    return index
+
+def scan_tree(root):
+    """
+    One os.scandir walk: {relative posix path: DirEntry} for every file.
+    """
+    files = {}
+    stack = [(root, '')]
+    while stack:
+        directory, prefix = stack.pop()
+        try:
+            it = os.scandir(directory)
+        except FileNotFoundError:
+            continue
+        with it:
+            for dirent in it:
+                if dirent.name.startswith('.'):
+                    continue
+                rel = prefix + dirent.name
+                if dirent.is_dir():
+                    stack.append((dirent.path, rel + '/'))
+                elif dirent.is_file():
+                    files[rel] = dirent
+    return files
+
+def _same_content(src, dst):
+    s, d = src.stat(), dst.stat()
+    if (s.st_ino, s.st_dev) == (d.st_ino, d.st_dev):
+        return True
+    if s.st_size != d.st_size:
+        return False
+    if s.st_mtime_ns == d.st_mtime_ns:
+        # copy2 preserves mtime, so equal size + mtime means an earlier sync
+        return True
+    return file_digest(src.path) == file_digest(dst.path)
+
+def _reflink(src, tmp_path):
+    try:
+        import fcntl
+    except ImportError:
+        return False
+    with open(src, 'rb') as s, open(tmp_path, 'wb') as d:
+        try:
+            fcntl.ioctl(d.fileno(), FICLONE, s.fileno())
+        except OSError:
+            return False
+    shutil.copystat(src, tmp_path)
+    return True
+
+def place_file(src, dst, mode='link'):
+    """
+    Put src at dst atomically: hardlink, then reflink, then a plain copy.
+    Returns the method that worked.
+    """
+    os.makedirs(os.path.dirname(dst), exist_ok=True)
+    tmp_path = f"{dst}.sync{os.getpid()}"
+    try:
+        method = 'copy'
+        if mode == 'link':
+            try:
+                os.link(src, tmp_path)
+                method = 'hardlink'
+            except OSError:
+                method = 'copy'
+        if method == 'copy' and mode in ('link', 'reflink') and _reflink(src, tmp_path):
+            method = 'reflink'
+        if method == 'copy':
+            shutil.copy2(src, tmp_path)
+        os.replace(tmp_path, dst)
+    finally:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+    return method
+
+def sync(mappings=SYNC_MAPPINGS, public_dir=PUBLIC_DIR, index=None, mode='link', prune=False, dry_run=False):
+    """
+    Copy referenced, changed files into public_dir and report the rest.
+    Returns a stats dict.
+    """
+    index = index or build_reference_index()
+    public = scan_tree(public_dir)
+    stats = {'copied': 0, 'unchanged': 0, 'unreferenced_sources': 0, 'pruned': 0, 'missing': []}
+    synced = set()
+    for src_rel, dst_rel in mappings:
+        src_root = resolve(src_rel)
+        if not os.path.isdir(src_root):
+            print(f"Source not found: {src_root}")
+            continue
+        for rel, dirent in sorted(scan_tree(src_root).items()):
+            public_rel = f"{dst_rel}/{rel}"
+            if '/' + public_rel not in index:
+                stats['unreferenced_sources'] += 1
+                continue
+            synced.add(public_rel)
+            existing = public.get(public_rel)
+            if existing is not None and _same_content(dirent, existing):
+                stats['unchanged'] += 1
+                continue
+            dst = os.path.join(public_dir, *public_rel.split('/'))
+            if dry_run:
+                print(f"Would copy: {dirent.path} -> {dst}")
+            else:
+                method = place_file(dirent.path, dst, mode)
+                print(f"Synced ({method}): {public_rel}")
+            stats['copied'] += 1
+
+    # Referenced literals that exist nowhere are broken images in the UI
+    for url in sorted(index.exact):
+        if url[1:] not in public and url[1:] not in synced:
+            stats['missing'].append(url)
+
+    prefixes = tuple(dst_rel + '/' for _, dst_rel in mappings)
+    for rel in sorted(public):
+        if not rel.startswith(prefixes) or any(part in _GENERATED for part in rel.split('/')):
+            continue
+        if FINGERPRINTED.search(rel):
+            # Hashed copies are fingerprint_assets.py's to prune
+            continue
+        if rel.endswith(PRECOMPRESSED):
+            # So are serve_assets.py's .gz siblings
+            continue
+        if '/' + rel in index:
+            continue
+        if prune and not dry_run:
+            os.remove(os.path.join(public_dir, *rel.split('/')))
+            stats['pruned'] += 1
+            print(f"Pruned: {rel}")
+        else:
+            print(f"Unreferenced: {rel}")
+    return stats
+
+def main():
+    parser = argparse.ArgumentParser(description="Sync referenced assets into game/public")
+    parser.add_argument('--mode', choices=('link', 'reflink', 'copy'), default='link',
+                        help="how to place files: hardlink (falls back to reflink/copy), reflink or copy")
+    parser.add_argument('--prune', action='store_true', help="delete unreferenced files from synced folders")
+    parser.add_argument('--dry-run', action='store_true', help="only report what would change")
+    args = parser.parse_args()
+
+    stats = sync(mode=args.mode, prune=args.prune, dry_run=args.dry_run)
+    print(f"\nSynced: {stats['copied']}, unchanged: {stats['unchanged']}, "
+          f"unreferenced sources skipped: {stats['unreferenced_sources']}, pruned: {stats['pruned']}")
+    if stats['missing']:
+        print("Referenced but missing:")
+        for url in stats['missing']:
+            print(f"  - {url}")
+        sys.exit(2)
+
+if __name__ == "__main__":
+    main()
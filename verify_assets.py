@@ -0,0 +1,351 @@
+import os
+import re
+import argparse
+import fnmatch
+import struct
+import sys
+import time
+import wave
+import zlib
+import xml.etree.ElementTree as ET
+from concurrent.futures import ThreadPoolExecutor
+from PIL import Image
+from asset_cache import AssetManifest
+from asset_config import PUBLIC_DIR, VERIFY_CACHE, VERIFY_RULES
+from asset_paths import logical_path
+from sync_assets import scan_tree
+
+PNG_SIGNATURE = b'\x89PNG\r\n\x1a\n'
+PNG_IEND = b'\x00\x00\x00\x00IEND\xaeB`\x82'
+# IHDR colour type -> Pillow mode
+PNG_MODES = {0: 'L', 2: 'RGB', 3: 'P', 4: 'LA', 6: 'RGBA'}
+PIL_EXTENSIONS = ('.jpg', '.jpeg', '.webp', '.gif')
+
+# MPEG audio tables: bitrates in kbit/s by (version is MPEG-1, layer), sample rates by version bits
+MP3_BITRATES = {
+    (True, 1): [0, 32, 64, 96, 128, 160, 192, 224, 256, 288, 320, 352, 384, 416, 448],
+    (True, 2): [0, 32, 48, 56, 64, 80, 96, 112, 128, 160, 192, 224, 256, 320, 384],
+    (True, 3): [0, 32, 40, 48, 56, 64, 80, 96, 112, 128, 160, 192, 224, 256, 320],
+    (False, 1): [0, 32, 48, 56, 64, 80, 96, 112, 128, 144, 160, 176, 192, 224, 256],
+    (False, 2): [0, 8, 16, 24, 32, 40, 48, 56, 64, 80, 96, 112, 128, 144, 160],
+    (False, 3): [0, 8, 16, 24, 32, 40, 48, 56, 64, 80, 96, 112, 128, 144, 160],
+}
+MP3_SAMPLE_RATES = {3: [44100, 48000, 32000], 2: [22050, 24000, 16000], 0: [11025, 12000, 8000]}
+
+class AssetError(Exception):
+    """
+    A file that would not load in the game. Messages read "kind: detail" or
+    "kind (detail)"; the kind groups the report.
+    """
+
+def _compile_rules(rules):
+    compiled = []
+    for pattern, allowed in rules:
+        # "*" must not cross directory boundaries
+        compiled.append((re.compile(fnmatch.translate(pattern).replace('.*', '[^/]*')), pattern, allowed))
+    return compiled
+
+def _read_ends(path, head, tail):
+    with open(path, 'rb') as f:
+        start = f.read(head)
+        size = f.seek(0, os.SEEK_END)
+        f.seek(max(0, size - tail))
+        return start, f.read(tail), size
+
+def check_png(path, full=False):
+    """
+    Signature, IHDR (with CRC) and the IEND trailer; a full check also
+    verifies every chunk CRC and decodes the pixels.
+    """
+    head, tail, _ = _read_ends(path, 33, 12)
+    if head[:8] != PNG_SIGNATURE:
+        raise AssetError("not a PNG (bad signature)")
+    length, chunk = struct.unpack('>I4s', head[8:16])
+    if chunk != b'IHDR' or length != 13:
+        raise AssetError("missing IHDR")
+    if zlib.crc32(head[12:29]) != struct.unpack('>I', head[29:33])[0]:
+        raise AssetError("corrupt IHDR (CRC mismatch)")
+    width, height, _, color_type = struct.unpack('>IIBB', head[16:26])
+    if tail != PNG_IEND:
+        raise AssetError("truncated (no IEND trailer)")
+    if full:
+        _full_decode(path)
+    return (width, height), PNG_MODES.get(color_type, '?')
+
+def _full_decode(path):
+    try:
+        with Image.open(path) as img:
+            img.verify()
+        with Image.open(path) as img:
+            img.load()
+    except Exception as e:
+        raise AssetError(f"decode failed: {e}")
+
+def check_image(path, full=False):
+    """
+    Other raster formats: Pillow's header parse, and a full decode when asked.
+    """
+    try:
+        with Image.open(path) as img:
+            size, mode = img.size, img.mode
+    except Exception as e:
+        raise AssetError(f"unreadable header: {e}")
+    if full:
+        _full_decode(path)
+    return size, mode
+
+def check_svg(path, full=False):
+    head, tail, _ = _read_ends(path, 4096, 256)
+    if b'<svg' not in head:
+        raise AssetError("no <svg> element in the first 4 KB")
+    if b'</svg>' not in tail:
+        raise AssetError("truncated (no closing </svg>)")
+    if full:
+        try:
+            ET.parse(path)
+        except ET.ParseError as e:
+            raise AssetError(f"invalid XML: {e}")
+    return None, None
+
+def wav_info(path):
+    """
+    Walk the RIFF chunk headers (no sample data is read).
+    Returns {'channels', 'sample_rate', 'bits', 'duration'}.
+    """
+    with open(path, 'rb') as f:
+        riff, riff_size, wave_id = struct.unpack('<4sI4s', f.read(12))
+        if riff != b'RIFF' or wave_id != b'WAVE':
+            raise AssetError("not a RIFF/WAVE file")
+        size = f.seek(0, os.SEEK_END)
+        if riff_size + 8 > size:
+            raise AssetError(f"truncated (RIFF says {riff_size + 8} bytes, file has {size})")
+        offset = 12
+        fmt = data_size = None
+        while offset + 8 <= size:
+            f.seek(offset)
+            chunk, length = struct.unpack('<4sI', f.read(8))
+            if chunk == b'fmt ':
+                fmt = struct.unpack('<HHIIHH', f.read(16))
+            elif chunk == b'data':
+                if offset + 8 + length > size:
+                    raise AssetError("truncated (data chunk runs past the end)")
+                data_size = length
+            offset += 8 + length + (length & 1)
+    if fmt is None or data_size is None:
+        raise AssetError("missing fmt or data chunk")
+    audio_format, channels, sample_rate, byte_rate, _, bits = fmt
+    if audio_format not in (1, 3, 0xFFFE) or not channels or not sample_rate or not byte_rate:
+        raise AssetError(f"unsupported WAV format {audio_format}")
+    return {'channels': channels, 'sample_rate': sample_rate, 'bits': bits, 'duration': data_size / byte_rate}
+
+def check_wav(path, full=False):
+    info = wav_info(path)
+    if full and info['bits'] in (8, 16, 24, 32):
+        try:
+            with wave.open(path, 'rb') as w:
+                w.readframes(w.getnframes())
+        except (wave.Error, EOFError) as e:
+            raise AssetError(f"decode failed: {e}")
+    return None, f"{info['channels']}ch/{info['sample_rate']}Hz"
+
+def id3v2_size(header):
+    """
+    Bytes taken by an ID3v2 tag starting at header (10+ bytes), 0 when there is none.
+    """
+    if len(header) < 10 or header[:3] != b'ID3':
+        return 0
+    size = (header[6] & 0x7f) << 21 | (header[7] & 0x7f) << 14 | (header[8] & 0x7f) << 7 | (header[9] & 0x7f)
+    footer = 10 if header[5] & 0x10 else 0
+    return 10 + size + footer
+
+def mp3_frame_header(data, offset=0):
+    """
+    Parse the 4-byte MPEG audio frame header at offset. Returns a dict with
+    'version' (1, 2 or 2.5), 'layer', 'bitrate' (kbit/s), 'sample_rate',
+    'channels', 'samples' (per frame) and 'length' (bytes), or None when
+    the bytes are not a valid header.
+    """
+    if offset + 4 > len(data):
+        return None
+    b1, b2, b3 = data[offset + 1], data[offset + 2], data[offset + 3]
+    if data[offset] != 0xFF or b1 & 0xE0 != 0xE0:
+        return None
+    version_bits, layer_bits = (b1 >> 3) & 3, (b1 >> 1) & 3
+    bitrate_index, rate_index = b2 >> 4, (b2 >> 2) & 3
+    if version_bits == 1 or layer_bits == 0 or bitrate_index in (0, 15) or rate_index == 3:
+        # Reserved values, or free format (which the game never ships)
+        return None
+    mpeg1 = version_bits == 3
+    layer = 4 - layer_bits
+    bitrate = MP3_BITRATES[(mpeg1, layer)][bitrate_index]
+    sample_rate = MP3_SAMPLE_RATES[version_bits][rate_index]
+    padding = (b2 >> 1) & 1
+    if layer == 1:
+        samples = 384
+        length = (12 * bitrate * 1000 // sample_rate + padding) * 4
+    else:
+        samples = 1152 if mpeg1 or layer == 2 else 576
+        length = samples // 8 * bitrate * 1000 // sample_rate + padding
+    return {
+        'version': {3: 1, 2: 2, 0: 2.5}[version_bits],
+        'layer': layer,
+        'bitrate': bitrate,
+        'sample_rate': sample_rate,
+        'channels': 1 if b3 >> 6 == 3 else 2,
+        'samples': samples,
+        'length': length,
+    }
+
+def mp3_frames(data, start=0):
+    """
+    Yield (offset, header) for consecutive frames from start until the
+    sync is lost; the caller decides whether what is left is a tag or damage.
+    """
+    offset = start
+    while True:
+        header = mp3_frame_header(data, offset)
+        if header is None or offset + header['length'] > len(data):
+            return
+        yield offset, header
+        offset += header['length']
+
+def check_mp3(path, full=False):
+    """
+    Header check: the first frame after any ID3v2 tag, and the frame right
+    after it (two in a row rules out a stray sync pattern). A full check
+    walks every frame to the end, allowing only an ID3v1/APE tag after them.
+    """
+    with open(path, 'rb') as f:
+        head = f.read(10)
+        start = id3v2_size(head)
+        f.seek(start)
+        if full:
+            data = f.read()
+            first = mp3_frame_header(data)
+        else:
+            data = f.read(4)
+            first = mp3_frame_header(data)
+            if first is not None:
+                # Just enough for the next header, whatever the layer and bitrate
+                data += f.read(first['length'])
+    if first is None:
+        raise AssetError("no MPEG frame after the ID3 tag")
+    after = data[first['length']:first['length'] + 4]
+    if mp3_frame_header(data, first['length']) is None and len(after) == 4 and not after.startswith((b'TAG', b'APET')):
+        raise AssetError("frame sync lost: right after the first frame")
+    if full:
+        end = 0
+        count = 0
+        for offset, header in mp3_frames(data):
+            end = offset + header['length']
+            count += 1
+        rest = data[end:]
+        if rest and not (rest.startswith((b'TAG', b'APETAGEX')) or len(rest) < 4):
+            raise AssetError(f"frame sync lost: {len(rest)} bytes left after {count} frames")
+    return None, f"{first['bitrate']}kbps/{first['sample_rate']}Hz"
+
+CHECKS = {'.png': check_png, '.svg': check_svg, '.wav': check_wav, '.mp3': check_mp3}
+CHECKS.update({ext: check_image for ext in PIL_EXTENSIONS})
+
+def _check_task(task):
+    """
+    Thread-pool worker: header check of one file (plus full decode when asked).
+    Returns (rel, error or None).
+    """
+    rel, path, full, rules = task
+    try:
+        if os.path.getsize(path) == 0:
+            raise AssetError("empty file")
+        size, mode = CHECKS[os.path.splitext(path)[1].lower()](path, full)
+        logical = logical_path(rel)
+        for regex, pattern, allowed in rules:
+            if not regex.match(logical):
+                continue
+            if not any((want_size is None or tuple(want_size) == size) and (want_mode is None or want_mode == mode)
+                       for want_size, want_mode in allowed):
+                got = f"{size[0]}x{size[1]} {mode}" if size else mode
+                wanted = ' or '.join(f"{s[0]}x{s[1]} {m}" if s else f"any size {m}" for s, m in allowed)
+                raise AssetError(f"wrong geometry: {got}, expected {wanted} ({pattern})")
+            break
+    except AssetError as e:
+        return rel, str(e)
+    except struct.error:
+        # A header cut off in the middle
+        return rel, "truncated (incomplete header)"
+    except OSError as e:
+        return rel, f"unreadable: {e}"
+    return rel, None
+
+def verify(public_dir=PUBLIC_DIR, rules=VERIFY_RULES, full=False, jobs=None, use_cache=True,
+           cache_path=VERIFY_CACHE):
+    """
+    Check every asset under public_dir. Files that changed since their last
+    clean full decode (or all files, with full=True) get the full check;
+    with use_cache=False nothing is loaded or remembered and only full=True
+    decodes. Returns (problems as [(rel, message)], stats).
+    """
+    start = time.perf_counter()
+    compiled = _compile_rules(rules)
+    files = {rel: d.path for rel, d in scan_tree(public_dir).items()
+             if os.path.splitext(rel)[1].lower() in CHECKS}
+    cache = AssetManifest(cache_path) if use_cache else None
+    params = {'version': 1}
+    tasks = []
+    for rel, path in sorted(files.items()):
+        needs_full = full or (cache is not None and not cache.is_fresh(rel, path, params))
+        tasks.append((rel, path, needs_full, compiled))
+
+    workers = jobs or min(32, (os.cpu_count() or 1) * 4)
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        results = list(pool.map(_check_task, tasks))
+
+    problems = []
+    for (rel, path, was_full, _), (_, error) in zip(tasks, results):
+        if error is not None:
+            problems.append((rel, error))
+            if cache is not None:
+                cache.forget(rel)
+        elif was_full and cache is not None:
+            cache.record(rel, path, params, {})
+    if cache is not None:
+        cache.prune(set(files))
+        cache.save()
+    stats = {'files': len(tasks), 'full': sum(1 for t in tasks if t[2]),
+             'seconds': time.perf_counter() - start}
+    return problems, stats
+
+def print_report(problems, stats, limit=5):
+    """
+    One line per kind of problem with a few example paths.
+    """
+    print(f"Checked {stats['files']} files ({stats['full']} fully decoded) in {stats['seconds']:.2f}s")
+    if not problems:
+        print("All assets OK")
+        return
+    kinds = {}
+    for rel, message in problems:
+        kinds.setdefault(message.split(' (')[0].split(':')[0], []).append((rel, message))
+    print(f"{len(problems)} problem(s):")
+    for kind, items in sorted(kinds.items(), key=lambda kv: -len(kv[1])):
+        print(f"  {kind}: {len(items)}")
+        for rel, message in items[:limit]:
+            print(f"    {rel}: {message}")
+        if len(items) > limit:
+            print(f"    ... and {len(items) - limit} more")
+
+def main():
+    parser = argparse.ArgumentParser(description="Check that every asset in game/public is valid")
+    parser.add_argument('--public', default=PUBLIC_DIR, help="directory to check")
+    parser.add_argument('--full', action='store_true', help="fully decode every file, not only changed ones")
+    parser.add_argument('--no-cache', action='store_true', help="neither read nor update the decode cache (header checks only unless --full)")
+    parser.add_argument('-j', '--jobs', type=int, help="threads to use (default: 4 per core, at most 32)")
+    parser.add_argument('--all', action='store_true', help="list every failing file, not only examples")
+    args = parser.parse_args()
+
+    problems, stats = verify(args.public, full=args.full, jobs=args.jobs, use_cache=not args.no_cache)
+    print_report(problems, stats, limit=len(problems) if args.all else 5)
+    if problems:
+        sys.exit(1)
+
+if __name__ == "__main__":
+    main()
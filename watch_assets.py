@@ -0,0 +1,204 @@
+import os
+import argparse
+import ctypes
+import ctypes.util
+import select
+import struct
+import sys
+import time
+from asset_config import (PUBLIC_DIR, ROOT_DIR, SYNC_MAPPINGS, WATCH_DEBOUNCE, WATCH_POLL_INTERVAL,
+                          load_directories)
+from asset_pipeline import run_pipeline
+from normalize_images import SUPPORTED_FORMATS
+from sync_assets import place_file
+
+# inotify(7) constants
+IN_NONBLOCK = 0o4000
+IN_CLOEXEC = 0o2000000
+IN_CLOSE_WRITE = 0x008
+IN_MOVED_TO = 0x080
+IN_Q_OVERFLOW = 0x4000
+_EVENT = struct.Struct('iIII')
+
+class InotifyWatcher:
+    """
+    Linux inotify through ctypes: reports files that were closed after
+    writing or moved into a watched directory (atomic saves), nothing else.
+    """
+
+    def __init__(self, directories):
+        libc = ctypes.CDLL(ctypes.util.find_library('c'), use_errno=True)
+        self.fd = libc.inotify_init1(IN_NONBLOCK | IN_CLOEXEC)
+        if self.fd < 0:
+            raise OSError(ctypes.get_errno(), "inotify_init1 failed")
+        self.dirs = {}
+        for directory in directories:
+            wd = libc.inotify_add_watch(self.fd, os.fsencode(directory), IN_CLOSE_WRITE | IN_MOVED_TO)
+            if wd < 0:
+                raise OSError(ctypes.get_errno(), f"inotify_add_watch failed: {directory}")
+            self.dirs[wd] = directory
+
+    def wait(self, timeout):
+        """
+        Block up to timeout seconds; return the set of changed paths.
+        None means the kernel queue overflowed and everything must be rescanned.
+        """
+        ready, _, _ = select.select([self.fd], [], [], timeout)
+        if not ready:
+            return set()
+        changed = set()
+        while True:
+            try:
+                buf = os.read(self.fd, 64 * 1024)
+            except BlockingIOError:
+                return changed
+            offset = 0
+            while offset < len(buf):
+                wd, mask, _, length = _EVENT.unpack_from(buf, offset)
+                name = buf[offset + _EVENT.size:offset + _EVENT.size + length].rstrip(b'\0')
+                offset += _EVENT.size + length
+                if mask & IN_Q_OVERFLOW:
+                    return None
+                if wd in self.dirs and name:
+                    changed.add(os.path.join(self.dirs[wd], os.fsdecode(name)))
+
+    def close(self):
+        os.close(self.fd)
+
+class PollingWatcher:
+    """
+    Fallback for platforms without inotify: one os.scandir per directory
+    per interval, comparing size and mtime with the previous scan.
+    """
+
+    def __init__(self, directories, interval=WATCH_POLL_INTERVAL):
+        self.directories = directories
+        self.interval = interval
+        self.state = self._scan()
+
+    def _scan(self):
+        state = {}
+        for directory in self.directories:
+            with os.scandir(directory) as it:
+                for dirent in it:
+                    if dirent.is_file():
+                        st = dirent.stat()
+                        state[dirent.path] = (st.st_size, st.st_mtime_ns)
+        return state
+
+    def wait(self, timeout):
+        time.sleep(min(timeout, self.interval) if timeout is not None else self.interval)
+        state = self._scan()
+        changed = {path for path, sig in state.items() if self.state.get(path) != sig}
+        self.state = state
+        return changed
+
+    def close(self):
+        pass
+
+def open_watcher(directories, polling=False):
+    if not polling and sys.platform.startswith('linux'):
+        try:
+            return InotifyWatcher(directories)
+        except (OSError, AttributeError) as e:
+            print(f"inotify unavailable ({e}), falling back to polling")
+    return PollingWatcher(directories)
+
+def public_targets(path):
+    """
+    game/public locations a pipeline output is served from (per SYNC_MAPPINGS).
+    """
+    rel = os.path.relpath(path, ROOT_DIR).replace(os.sep, '/')
+    targets = []
+    for src_rel, dst_rel in SYNC_MAPPINGS:
+        if rel.startswith(src_rel + '/'):
+            targets.append(os.path.join(PUBLIC_DIR, *dst_rel.split('/'), *rel[len(src_rel) + 1:].split('/')))
+    return targets
+
+def publish(written):
+    for final in written:
+        for target in public_targets(final):
+            # Same temp-file + rename swap as sync_assets, so Vite never serves half a file
+            place_file(final, target, mode='copy')
+            print(f"Published: {os.path.relpath(target, ROOT_DIR)}")
+
+def _mtime(path):
+    try:
+        return os.stat(path).st_mtime_ns
+    except OSError:
+        return None
+
+def process(changed, directories, params, publish_outputs=True, ignore=None):
+    """
+    Run the pipeline for the changed images only and publish what it wrote.
+    ignore maps paths to the mtime they had when this process wrote them;
+    those echo events are dropped. Returns the written final paths.
+    """
+    ignore = ignore or {}
+    images = {p for p in changed if p.lower().endswith(SUPPORTED_FORMATS) and os.path.isfile(p)
+              and ignore.get(p, -1) != _mtime(p)}
+    affected = [e for e in directories if any(os.path.dirname(p) == e['source'] for p in images)]
+    if not affected:
+        return []
+    start = time.perf_counter()
+    written = []
+    failures = run_pipeline(affected, jobs=1, params=params, only=images, written=written)
+    if publish_outputs:
+        publish(written)
+    print(f"Processed {len(images)} file(s) in {time.perf_counter() - start:.2f}s"
+          + (f", {len(failures)} failed" if failures else ''))
+    return written
+
+def watch(directories, params=None, debounce=WATCH_DEBOUNCE, polling=False, publish_outputs=True):
+    """
+    Watch the source directories until interrupted.
+    Events are collected until debounce seconds pass without a new one.
+    params override the per-directory normalization profiles.
+    """
+    sources = [e['source'] for e in directories if os.path.isdir(e['source'])]
+    watcher = open_watcher(sources, polling)
+    print(f"Watching {len(sources)} directories ({type(watcher).__name__}), Ctrl+C to stop")
+    pending = set()
+    recent = {}
+    try:
+        while True:
+            changed = watcher.wait(debounce if pending else None)
+            if changed is None:
+                # Lost events: let the cache sort out what actually changed
+                written = []
+                run_pipeline(directories, params=params, written=written)
+                if publish_outputs:
+                    publish(written)
+                continue
+            if changed:
+                pending |= changed
+                continue
+            if pending:
+                written = process(pending, directories, params, publish_outputs, recent)
+                recent = {p: _mtime(p) for p in written}
+                pending = set()
+    except KeyboardInterrupt:
+        print("\nStopped")
+    finally:
+        watcher.close()
+
+def main():
+    parser = argparse.ArgumentParser(description="Re-normalize and publish assets as soon as they change")
+    parser.add_argument('--config', help="JSON file with the directory list (default: asset_config.py)")
+    parser.add_argument('--poll', action='store_true', help="scan periodically instead of using inotify")
+    parser.add_argument('--debounce', type=float, default=WATCH_DEBOUNCE,
+                        help="seconds of quiet before a burst of changes is processed")
+    parser.add_argument('--no-publish', action='store_true', help="do not copy results into game/public")
+    parser.add_argument('--skip-initial', action='store_true', help="do not catch up on changes made while stopped")
+    args = parser.parse_args()
+
+    directories = load_directories(args.config)
+    if not args.skip_initial:
+        written = []
+        run_pipeline(directories, jobs=os.cpu_count() or 1, written=written)
+        if not args.no_publish:
+            publish(written)
+    watch(directories, debounce=args.debounce, polling=args.poll, publish_outputs=not args.no_publish)
+
+if __name__ == "__main__":
+    main()